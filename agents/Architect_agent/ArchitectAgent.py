@@ -1,13 +1,24 @@
+import asyncio
 import json
 import os
+import time
 import yaml
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.messages import TextMessage
-from get_embedding_function import get_embedding_function
-
+from get_embedding_function import embedding_provider_stats, get_embedding_function
+from retrieval_cache import get_retrieval_cache
+
+from checkpoints import CheckpointStore, hash_inputs
+from json_repair import parse_llm_json
+from llm_cache import CachedChatCompletionClient, current_step, llm_step, model_identity
+from prompt_budget import PromptBudget, count_tokens, join_chunks
+from streaming import JSONDocumentDetector, StreamBudgetExceeded, stream_structured
+from timing import StageTimer
+from view_validation import validate_views_structure
 from utils import (
-    clean_raw_json,
     load_knowledge,
+    load_knowledge_chunks,
+    store_fingerprint,
     extract_driver_keywords,
     generate_architecture_yaml
 )
@@ -19,6 +30,24 @@ database_step4 ="chroma/chroma_component"
 
 save_log = "output"
 
+ARCHITECT_SYSTEM_MESSAGE = """
+            You are a senior software architect applying Attribute-Driven Design (ADD).
+            Your task is to generate architectural artifacts according to ADD steps.
+            Strictly follow JSON schemas.
+            Do NOT hallucinate or add fields not specified.
+            """
+
+# Token massimi (stimati) per risposta in modalità streaming: oltre questa
+# soglia la generazione è considerata fuori controllo e viene interrotta.
+DEFAULT_STREAM_BUDGETS = {
+    "step1": 4096,
+    "step2": 4096,
+    "step3": 6144,
+    "step4": 6144,
+    "step4_validation": 1024,
+    "step5": 3072,
+}
+
 STEP1_PROMPT_TEMPLATE ="""You are a senior software architect applying Attribute-Driven Design (ADD).
 
 IMPORTANT CONTEXT USAGE RULE:
@@ -371,6 +400,74 @@ SCHEMA:
 }}
 """
 
+STEP5_BATCH_PROMPT_TEMPLATE = """You are a senior software architect applying Attribute-Driven Design (ADD).
+
+=== ARCHITECTURAL DRIVERS ===
+{drivers}
+
+=== ARCHITECTURAL VIEWS (one entry per architecture) ===
+{views}
+
+=== KNOWLEDGE BASE (ADD, ISO/IEC/IEEE 42010, QA evaluation) ===
+{context}
+
+TASK:
+Evaluate EACH architecture above, independently, against the architectural drivers.
+
+For each architecture you MUST:
+1. Verify that all architectural drivers (functional drivers, quality attributes, constraints) are addressed.
+2. Identify any trade-offs between quality attributes.
+3. Highlight potential risks and limitations.
+4. Suggest refinements or mitigation tactics if drivers are not fully satisfied.
+
+RULES:
+- Use ONLY the provided drivers, views, and context.
+- Do NOT propose new components or technologies.
+- Base reasoning on ADD principles and ISO/IEC/IEEE 42010.
+- Return exactly one evaluation per architecture, with architecture_id exactly one of: {architecture_ids}
+- Output MUST be valid JSON following the schema below.
+
+SCHEMA:
+{{
+  "evaluations": [
+    {{
+      "architecture_id": "Architecture_name",
+      "name": "Architecture Name",
+      "driver_coverage": [
+        {{
+          "driver_id": "FD-01",
+          "description": "...",
+          "satisfied": "yes | partially | no",
+          "rationale": "..."
+        }}
+      ],
+      "quality_attribute_tradeoffs": [
+        {{
+          "attributes_involved": ["Attribute1", "Attribute2"],
+          "tradeoff_description": "...",
+          "impact": "high | medium | low"
+        }}
+      ],
+      "risks_and_limitations": [
+        {{
+          "description": "...",
+          "severity": "high | medium | low"
+        }}
+      ],
+      "recommended_refinements": [
+        {{
+          "description": "...",
+          "driver_ids": ["FD-01", "FD-02"]
+        }}
+      ]
+    }}
+  ]
+}}
+"""
+
+# Token di risposta stimati per ogni architettura valutata nello Step 5 batch
+STEP5_COMPLETION_TOKENS_PER_ARCH = 1024
+
 class ArchitectAgent:
     """
     ArchitectAgent implementato come agente AutoGen.
@@ -378,20 +475,81 @@ class ArchitectAgent:
     L’agente deve produrre output JSON rigoroso.
     """
 
-    def __init__(self, model_client):
+    def __init__(
+        self,
+        model_client,
+        max_concurrency: int = 1,
+        context_length: int | None = None,
+        completion_reserve: int = 2048,
+        checkpoint_dir: str | None = None,
+        streaming: bool = False,
+        stream_budgets: dict[str, int] | None = None,
+        batch_evaluation: bool = False,
+        validate_structure: bool = True,
+        warm_up_embeddings: bool = False,
+        log_dir: str = save_log,
+        retrieval_cache: bool = True,
+        embedding_cache: bool = True
+    ):
         """
         Inizializza l’agente AutoGen con sistema e modello.
+
+        max_concurrency > 1 abilita l'esecuzione concorrente degli step
+        per-architettura: ogni task usa un AssistantAgent isolato e il
+        semaforo limita le richieste contemporanee al modello.
+
+        context_length (default: model_info["context_length"] del client)
+        abilita il PromptBudget: il CONTEXT dei prompt STEPn viene riempito
+        per rilevanza lasciando completion_reserve token alla risposta.
+
+        checkpoint_dir abilita il ricalcolo incrementale: l'output di ogni
+        step (e di ogni architettura negli step 3–5) è salvato sotto l'hash
+        dei suoi input e riusato se gli input non cambiano.
+
+        streaming=True chiama il modello in streaming e interrompe la
+        risposta appena il documento JSON è completo; stream_budgets
+        (default DEFAULT_STREAM_BUDGETS) limita i token per step.
+
+        batch_evaluation=True valuta le architetture dello Step 5 in un'unica
+        richiesta (o in gruppi entro la context length) invece che una per una.
+
+        validate_structure=False disattiva la validazione strutturale locale
+        delle viste dello Step 4 (es. per rigiocare output registrati prima
+        della sua introduzione).
+
+        L'embedding model è caricato al primo retrieval; con
+        warm_up_embeddings=True il caricamento parte subito su un thread in
+        background, in parallelo alla preparazione del primo prompt.
+
+        log_dir è la cartella dei prompt e degli output raw di ogni step
+        (stepN_prompt.txt / stepN_output_raw.txt). retrieval_cache=False e
+        embedding_cache=False disattivano la RetrievalCache persistente e la
+        cache degli embedding delle query (es. per misure ripetibili).
         """
-        self.agent = AssistantAgent(
-            name="ArchitectAgent",
-            system_message="""
-            You are a senior software architect applying Attribute-Driven Design (ADD).
-            Your task is to generate architectural artifacts according to ADD steps.
-            Strictly follow JSON schemas.
-            Do NOT hallucinate or add fields not specified.
-            """,
-            model_client=model_client
+        init_start = time.perf_counter()
+        self.model_client = model_client
+        self.max_concurrency = max(1, max_concurrency)
+        self.agent = self._new_agent()
+
+        if context_length is None:
+            model_info = getattr(model_client, "model_info", None) or {}
+            context_length = model_info.get("context_length")
+        self.prompt_budget = (
+            PromptBudget(context_length, completion_reserve) if context_length else None
         )
+        # Report del budget per step: token usati e chunk scartati
+        self.budget_reports: dict[str, dict] = {}
+
+        self.checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+
+        self.streaming = streaming
+        self.batch_evaluation = batch_evaluation
+        self.validate_structure = validate_structure
+        # Tempi cumulati per step e per fase (retrieval, prompt, llm, parse)
+        self.timer = StageTimer()
+        self.stream_budgets = {**DEFAULT_STREAM_BUDGETS, **(stream_budgets or {})}
+        # Report dello streaming per step: chiamate, arresti anticipati, token stimati
+        self.stream_reports: dict[str, dict] = {}
 
         # Memoria interna simile alla versione classica
         self.memory = {
@@ -405,12 +563,221 @@ class ArchitectAgent:
             "architecture_evaluation": []
         }
 
-        self.embedding_function = get_embedding_function()
+        self.log_dir = log_dir
+        self.use_retrieval_cache = retrieval_cache
+        # Provider condiviso; senza cache si interroga direttamente il modello (lazy)
+        self.embedding_provider = get_embedding_function()
+        self.embedding_function = (
+            self.embedding_provider if embedding_cache else self.embedding_provider.base
+        )
+        if warm_up_embeddings:
+            self.embedding_provider.warm_up()
+
+        # Errori dello Step 4 per architettura
+        self.view_failures: dict[str, str] = {}
+        # Tentativi dello Step 4 respinti dal validatore strutturale (senza chiamare il reviewer LLM)
+        self.structural_rejections = 0
+
+        self.init_seconds = time.perf_counter() - init_start
+        # Riparazioni JSON applicate per step: step -> [riparazioni]
+        self.json_repairs: dict[str, list[str]] = {}
+
+    def startup_report(self) -> dict:
+        """
+        Tempi di avvio: costruzione dell'agente e caricamento dell'embedding model
+        (None se il modello non è ancora stato caricato).
+        """
+        load_seconds = getattr(self.embedding_provider.base, "load_seconds", None)
+        return {
+            "agent_init_s": round(self.init_seconds, 3),
+            "embedding_model_loaded": getattr(self.embedding_provider.base, "loaded", True),
+            "embedding_model_load_s": round(load_seconds, 3) if load_seconds is not None else None
+        }
+
+    def _new_agent(self) -> AssistantAgent:
+        """
+        Crea un AssistantAgent con il system message dell'ArchitectAgent.
+        Usato per l'agente principale e per i task concorrenti, così
+        on_reset di un task non interferisce con gli altri.
+        """
+        return AssistantAgent(
+            name="ArchitectAgent",
+            system_message=ARCHITECT_SYSTEM_MESSAGE,
+            model_client=self.model_client
+        )
+
+    def _build_prompt(
+        self,
+        step: str,
+        template: str,
+        fields: dict,
+        slots: dict[str, list],
+        suffix: str = "",
+        budget: PromptBudget | None = None
+    ) -> str:
+        """
+        Compone il prompt di uno step inserendo i chunk recuperati negli slot
+        CONTEXT del template, entro il budget di token se configurato
+        (budget sostituisce self.prompt_budget per questo prompt).
+        """
+        budget = budget or self.prompt_budget
+        if budget is None:
+            contexts = {slot: join_chunks(chunks) for slot, chunks in slots.items()}
+            return template.format(**fields, **contexts) + suffix
+
+        with self.timer.measure("prompt"):
+            prompt, report = budget.fill(template, fields, slots, suffix=suffix)
+        self.budget_reports[step] = report
+        if report["dropped_chunks"]:
+            print(
+                f"✂️ {step}: scartati {report['dropped_chunks']} chunk "
+                f"({report['dropped_tokens']} token), prompt ~{report['prompt_tokens']} token"
+            )
+        return prompt
+
+    async def _complete(
+        self,
+        agent: AssistantAgent,
+        prompt: str,
+        expect: type | tuple = dict,
+        max_tokens: int | None = None
+    ) -> str:
+        """
+        Invia il prompt al modello e restituisce l'output testuale.
+
+        Senza streaming usa agent.run (con reset del contesto); con
+        streaming chiama direttamente il model client e si ferma appena
+        l'output contiene un documento JSON completo del tipo atteso.
+        max_tokens sostituisce il budget dello step corrente; se viene
+        superato solleva StreamBudgetExceeded invece di restituire il
+        testo troncato.
+        """
+        if not self.streaming:
+            with self.timer.measure("llm"):
+                response = await agent.run(task=TextMessage(content=prompt, source="user"))
+                await agent.on_reset(cancellation_token=None)
+            return response.messages[-1].content
+
+        step = current_step() or "unknown"
+        max_tokens = max_tokens or self.stream_budgets.get(step)
+        with self.timer.measure("llm"):
+            text, report = await stream_structured(
+                self.model_client,
+                ARCHITECT_SYSTEM_MESSAGE,
+                prompt,
+                JSONDocumentDetector(expect),
+                max_tokens=max_tokens
+            )
+
+        totals = self.stream_reports.setdefault(
+            step, {"calls": 0, "early_stops": 0, "budget_exceeded": 0, "estimated_tokens": 0}
+        )
+        totals["calls"] += 1
+        totals["early_stops"] += report["early_stop"]
+        totals["budget_exceeded"] += report["budget_exceeded"]
+        totals["estimated_tokens"] += report["estimated_tokens"]
+        if report["budget_exceeded"]:
+            # output troncato: niente riparazione JSON né checkpoint
+            print(f"⛔ {step}: generazione interrotta oltre {max_tokens} token")
+            raise StreamBudgetExceeded(step, max_tokens, text)
+        return text
+
+    def _retrieve_chunks(self, chroma_path: str, query: str, k: int) -> list:
+        with self.timer.measure("retrieval"):
+            return load_knowledge_chunks(
+                self.embedding_function, chroma_path, query, k=k, use_cache=self.use_retrieval_cache
+            )
+
+    def _parse_json(self, step: str, raw_output: str, expect: type | tuple = dict):
+        """
+        Estrae il documento JSON dall'output del modello con parse_llm_json,
+        registrando le eventuali riparazioni locali applicate.
+        Solleva json.JSONDecodeError se l'output non è recuperabile.
+        """
+        with self.timer.measure("parse"):
+            parsed, repairs = parse_llm_json(raw_output, expect=expect)
+        if repairs:
+            self.json_repairs.setdefault(step, []).extend(repairs)
+            print(f"🩹 {step}: JSON riparato ({', '.join(repairs)})")
+        return parsed
+
+    def _checkpoint_key(self, chroma_path: str, *inputs) -> str | None:
+        """
+        Hash degli input di uno step: modello e parametri di sampling del
+        client, fingerprint della KB interrogata, configurazione del budget
+        e input espliciti (drivers, architettura, prompt template, ...).
+        None se i checkpoint sono disabilitati.
+        """
+        if self.checkpoints is None:
+            return None
+
+        budget = (
+            (self.prompt_budget.context_length, self.prompt_budget.completion_reserve)
+            if self.prompt_budget else None
+        )
+        return hash_inputs(
+            model_identity(self.model_client),
+            store_fingerprint(self.embedding_function, chroma_path),
+            budget,
+            *inputs
+        )
+
+    def _step5_checkpoint_key(self, drivers: dict, views: dict) -> str | None:
+        """
+        Chiave del checkpoint Step 5 di una singola architettura, uguale in
+        modalità singola e batch: una valutazione salvata da una modalità
+        (o dal fallback singolo del batch) viene riusata dall'altra.
+        Dipende da entrambi i template, così cambiarne uno invalida i checkpoint.
+        """
+        return self._checkpoint_key(
+            database_step4, drivers, views, STEP5_PROMPT_TEMPLATE, STEP5_BATCH_PROMPT_TEMPLATE
+        )
+
+    def _load_checkpoint(self, step: str, key: str | None):
+        if key is None:
+            return None
+        value = self.checkpoints.get(step, key)
+        if value is not None:
+            print(f"♻️ {step}: riuso checkpoint {key[:12]}")
+        return value
+
+    def _save_checkpoint(self, step: str, key: str | None, value) -> None:
+        if key is not None and value is not None:
+            self.checkpoints.put(step, key, value)
+
+    def _drivers(self) -> dict:
+        return {
+            "functional_drivers": self.memory["architectural_drivers"],
+            "quality_attribute_scenarios": self.memory["quality_attribute_scenarios"],
+            "constraints": self.memory["constraints"],
+            "stakeholders": self.memory["stakeholders"]
+        }
+
+    def _store_drivers(self, result_json: dict) -> None:
+        self.memory["architectural_drivers"] = result_json.get("functional_drivers", [])
+        self.memory["quality_attribute_scenarios"] = result_json.get("quality_attribute_scenarios", [])
+        self.memory["constraints"] = result_json.get("constraints", [])
+        self.memory["stakeholders"] = result_json.get("stakeholders", [])
+
+    async def _gather_isolated(self, items: list, worker) -> list:
+        """
+        Esegue worker(agent, item) per ogni item in modo concorrente,
+        con un agente isolato per task e al massimo max_concurrency task attivi.
+        I risultati rispettano l'ordine di items.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_isolated(item):
+            async with semaphore:
+                return await worker(self._new_agent(), item)
+
+        return await asyncio.gather(*(run_isolated(item) for item in items))
 
 
     # ==================================================
     # STEP 1 – identify functional drivers
     # ==================================================
+    @llm_step("step1")
     async def identify_drivers(self, rad_text: str) -> dict:
         """
         Step 1 – Identificazione dei driver architetturali.
@@ -419,6 +786,12 @@ class ArchitectAgent:
         if not rad_text:
             raise ValueError("❌ RAD text is required for Step 1")
 
+        checkpoint_key = self._checkpoint_key(database_step1, rad_text, STEP1_PROMPT_TEMPLATE)
+        cached = self._load_checkpoint("step1", checkpoint_key)
+        if cached is not None:
+            self._store_drivers(cached)
+            return cached
+
         # ---------------------------------------------------------
         # 1️⃣ Recupera conoscenza rilevante dalla KB (RAG)
         # ---------------------------------------------------------
@@ -427,59 +800,62 @@ class ArchitectAgent:
         Functional requirements that force architectural decisions, quality attributes, constraints.
         Exclude CRUD/UI-level requirements.
         """
-        context_text, sources = load_knowledge(self.embedding_function, database_step1, retrieval_query, k=13)
+        context_chunks = self._retrieve_chunks(database_step1, retrieval_query, k=13)
 
-        if not context_text:
+        if not context_chunks:
             raise RuntimeError("❌ Nessun documento recuperato da Chroma")
 
         # ---------------------------------------------------------
         # 2️⃣ Costruisci prompt per l’agente AutoGen
         # ---------------------------------------------------------
-        prompt_content = STEP1_PROMPT_TEMPLATE.format(
-            context=context_text,
-            rad_text=rad_text
+        prompt_content = self._build_prompt(
+            "step1",
+            STEP1_PROMPT_TEMPLATE,
+            {"rad_text": rad_text},
+            {"context": context_chunks}
         )
 
-        prompt = TextMessage(content=prompt_content, source="user")  # <- obbligatorio source
-
         # ---------------------------------------------------------
         # 3️⃣ Invia il prompt all’agente
         # ---------------------------------------------------------
-        response = await self.agent.run(task=prompt)
-        await self.agent.on_reset(cancellation_token=None)
-        raw_output = response.messages[-1].content
+        raw_output = await self._complete(self.agent, prompt_content)
 
         # Salva log per debug
         import os
-        os.makedirs(save_log, exist_ok=True)
-        with open(os.path.join(save_log, "step1_prompt.txt"), "w", encoding="utf-8") as f:
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(os.path.join(self.log_dir, "step1_prompt.txt"), "w", encoding="utf-8") as f:
             f.write(prompt_content)
-        with open(os.path.join(save_log, "step1_output_raw.txt"), "w", encoding="utf-8") as f:
+        with open(os.path.join(self.log_dir, "step1_output_raw.txt"), "w", encoding="utf-8") as f:
             f.write(raw_output)
 
         # ---------------------------------------------------------
         # 4️⃣ Parsing JSON robusto
         # ---------------------------------------------------------
         try:
-            result_json = json.loads(clean_raw_json(raw_output))
+            result_json = self._parse_json("step1", raw_output)
         except json.JSONDecodeError:
             raise ValueError("❌ Output non valido JSON dallo Step 1")
 
         # Aggiorna memoria interna
-        self.memory["architectural_drivers"] = result_json.get("functional_drivers", [])
-        self.memory["quality_attribute_scenarios"] = result_json.get("quality_attribute_scenarios", [])
-        self.memory["constraints"] = result_json.get("constraints", [])
-        self.memory["stakeholders"] = result_json.get("stakeholders", [])
+        self._store_drivers(result_json)
+        self._save_checkpoint("step1", checkpoint_key, result_json)
 
         return result_json
     
     # ==================================================
     # STEP 2 – Candidate Architectures
     # ==================================================
+    @llm_step("step2")
     async def generate_candidate_architectures(self) -> dict:
         if not self.memory["architectural_drivers"]:
             raise ValueError("❌ Step 1 non eseguito")
-        
+
+        checkpoint_key = self._checkpoint_key(database_step2, self._drivers(), STEP2_PROMPT_TEMPLATE)
+        cached = self._load_checkpoint("step2", checkpoint_key)
+        if cached is not None:
+            self.memory["candidate_architectures"] = cached
+            return cached
+
         # --- Estrai driver keywords ---
         driver_keywords = extract_driver_keywords({
             "functional_drivers": self.memory["architectural_drivers"],
@@ -496,39 +872,33 @@ class ArchitectAgent:
             architectural styles
             risks and limitations
         """
-        context_text, sources = load_knowledge(self.embedding_function, database_step2, retrieval_query, k=20)
-        print("NUMERO BLOCCHI CONTEXT:", len(sources))
+        context_chunks = self._retrieve_chunks(database_step2, retrieval_query, k=20)
+        print("NUMERO BLOCCHI CONTEXT:", len(context_chunks))
 
         # --- Costruisci prompt ---
-        prompt_content = STEP2_PROMPT_TEMPLATE.format(
-            drivers=json.dumps(driver_keywords, indent=2),
-            context=context_text
+        prompt_content = self._build_prompt(
+            "step2",
+            STEP2_PROMPT_TEMPLATE,
+            {"drivers": json.dumps(driver_keywords, indent=2)},
+            {"context": context_chunks}
         )
 
         # --- Invoca AutoGen ---
-        prompt_msg = TextMessage(content=prompt_content, source="user")
-        response = await self.agent.run(task=prompt_msg)
-        # Reset opzionale del contesto AutoGen
-        if hasattr(self.agent, "on_reset"):
-            await self.agent.on_reset(cancellation_token=None)
-
-        raw_output = response.messages[-1].content  # AutoGen restituisce TaskResult
+        raw_output = await self._complete(self.agent, prompt_content, expect=(dict, list))
 
         # --- Salva prompt/output per debug ---
-        os.makedirs(save_log, exist_ok=True)
-        with open(os.path.join(save_log, "prompt_final_step2.txt"), "w", encoding="utf-8") as f:
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(os.path.join(self.log_dir, "prompt_final_step2.txt"), "w", encoding="utf-8") as f:
             f.write(prompt_content)
-        with open(os.path.join(save_log, "step2_output_raw.txt"), "w", encoding="utf-8") as f:
+        with open(os.path.join(self.log_dir, "step2_output_raw.txt"), "w", encoding="utf-8") as f:
             f.write(raw_output)
 
         # Parsing JSON robusto
         try:
-            parsed = json.loads(clean_raw_json(raw_output))
+            parsed = self._parse_json("step2", raw_output, expect=(dict, list))
         except json.JSONDecodeError:
             raise ValueError("❌ Output non valido JSON dallo Step 2")
 
-        parsed = json.loads(clean_raw_json(raw_output))
-
         # Assicuriamoci che archs sia sempre una lista di dict
         if isinstance(parsed, dict) and "candidate_architectures" in parsed:
             archs = [a for a in parsed["candidate_architectures"] if isinstance(a, dict)]
@@ -544,15 +914,27 @@ class ArchitectAgent:
         if not archs:
             raise RuntimeError("❌ Step 2 non ha prodotto candidate architectures valide")
 
+        self._save_checkpoint("step2", checkpoint_key, archs)
+        return archs
+
 
     # ==================================================
     # STEP 3 – Component Decomposition
     # ==================================================
-    async def decompose_architectures(self) -> list:
+    @llm_step("step3")
+    async def decompose_architectures(self, concurrent: bool | None = None) -> list:
+        """
+        Step 3 – Scomposizione in componenti di ogni candidate architecture.
+
+        Le architetture sono indipendenti: con concurrent=True (default se
+        max_concurrency > 1) vengono scomposte in parallelo, ciascuna con un
+        agente isolato; l'ordine dei risultati resta quello delle candidate.
+        """
         if not self.memory["candidate_architectures"]:
             raise ValueError("❌ Nessuna candidate architecture disponibile (Step 2)")
 
-        decompositions = []
+        if concurrent is None:
+            concurrent = self.max_concurrency > 1
 
         # Drivers per lo Step 3
         drivers = {
@@ -569,7 +951,7 @@ class ArchitectAgent:
             UML component view
             SEI ADD
         """
-        context_general, sources = load_knowledge(self.embedding_function, database_step3, retrieval_query_general, k=9)
+        context_general = self._retrieve_chunks(database_step3, retrieval_query_general, k=9)
 
         # Quality-driven
         qa_keywords = []
@@ -577,8 +959,9 @@ class ArchitectAgent:
             qa_keywords.append(qa.get("attribute", ""))
             qa_keywords.append(qa.get("stimulus", ""))
         qa_query = "Quality attribute scenarios related to: " + ", ".join([kw for kw in qa_keywords if kw])
-        context_qta, sources = load_knowledge(self.embedding_function, database_step3, qa_query, k=6)
+        context_qta = self._retrieve_chunks(database_step3, qa_query, k=6)
 
+        archs = []
         for arch in self.memory["candidate_architectures"]:
             # --- Se arch è stringa, prova a convertire in dict ---
             if isinstance(arch, str):
@@ -587,67 +970,115 @@ class ArchitectAgent:
                 except json.JSONDecodeError:
                     print(f"⚠️ Ignorato elemento non valido: {arch}")
                     continue
+            archs.append(arch)
 
-            style = arch.get("style", "")
-            qas = " ".join(arch.get("supported_quality_attributes", []))
+        async def decompose(agent, arch):
+            return await self._decompose_architecture(agent, arch, drivers, context_qta, context_general)
+
+        if concurrent:
+            results = await self._gather_isolated(archs, decompose)
+        else:
+            results = [await decompose(self.agent, arch) for arch in archs]
 
-            # Preparazione query Chroma
-            retrieval_query_arch = f"""
+        decompositions = [parsed for parsed in results if parsed is not None]
+
+        self.memory["component_decompositions"] = decompositions
+        
+        return decompositions
+
+    async def _decompose_architecture(
+        self,
+        agent: AssistantAgent,
+        arch: dict,
+        drivers: dict,
+        context_qta: list,
+        context_general: list
+    ) -> dict | None:
+        """
+        Scompone una singola architettura. Restituisce None se l'output non è JSON valido.
+        """
+        checkpoint_key = self._checkpoint_key(database_step3, drivers, arch, STEP3_PROMPT_TEMPLATE)
+        cached = self._load_checkpoint("step3", checkpoint_key)
+        if cached is not None:
+            return cached
+
+        style = arch.get("style", "")
+        qas = " ".join(arch.get("supported_quality_attributes", []))
+
+        # Preparazione query Chroma
+        retrieval_query_arch = f"""
                 {style} architecture
                 component decomposition
                 responsibility allocation
                 quality attributes {qas}
             """
-            context_arch, sources = load_knowledge(self.embedding_function, database_step3, retrieval_query_arch, k=6)
-
-            # Prompt compatto
-            arch_text = json.dumps(arch)
-            prompt = STEP3_PROMPT_TEMPLATE.format(
-                drivers=json.dumps(drivers, indent=2),
-                context_qta=context_qta,
-                architecture_id=arch["architecture_id"],
-                architecture_name=arch["name"],
-                architecture=arch_text,
-                context_arch=context_arch,
-                context_general=context_general
-            )
-
-            os.makedirs(save_log, exist_ok=True)
-
-            # Invoca LLM
-            prompt_msg = TextMessage(content=prompt, source="user")
-            response = await self.agent.run(task=prompt_msg)
-            if hasattr(self.agent, "on_reset"):
-                await self.agent.on_reset(cancellation_token=None)
-            raw_output = response.messages[-1].content
+        context_arch = self._retrieve_chunks(database_step3, retrieval_query_arch, k=6)
+
+        # Prompt compatto
+        arch_text = json.dumps(arch)
+        arch_id = arch.get("architecture_id", arch["name"])
+        prompt = self._build_prompt(
+            f"step3:{arch_id}",
+            STEP3_PROMPT_TEMPLATE,
+            {
+                "drivers": json.dumps(drivers, indent=2),
+                "architecture_id": arch_id,
+                "architecture_name": arch["name"],
+                "architecture": arch_text
+            },
+            {
+                "context_qta": context_qta,
+                "context_arch": context_arch,
+                "context_general": context_general
+            }
+        )
 
-            # Salva per debug
-            with open(os.path.join(save_log, "step3_prompt.txt"), "w", encoding="utf-8") as f:
-                f.write(prompt)
-            with open(os.path.join(save_log, "step3_output_raw.txt"), "w", encoding="utf-8") as f:
-                f.write(raw_output)
+        os.makedirs(self.log_dir, exist_ok=True)
 
-            # Parsing JSON robusto
-            try:
-                parsed = json.loads(clean_raw_json(raw_output))
-            except json.JSONDecodeError:
-                print(f"⚠️ Output non valido JSON dallo Step 3 per {arch.get('name', 'unknown')}")
-                continue
+        # Invoca LLM
+        try:
+            raw_output = await self._complete(agent, prompt)
+        except StreamBudgetExceeded:
+            print(f"⚠️ Output troncato dallo Step 3 per {arch.get('name', 'unknown')}")
+            return None
+
+        # Salva per debug
+        with open(os.path.join(self.log_dir, "step3_prompt.txt"), "w", encoding="utf-8") as f:
+            f.write(prompt)
+        with open(os.path.join(self.log_dir, "step3_output_raw.txt"), "w", encoding="utf-8") as f:
+            f.write(raw_output)
 
-            decompositions.append(parsed)
+        # Parsing JSON robusto
+        try:
+            parsed = self._parse_json("step3", raw_output)
+        except json.JSONDecodeError:
+            print(f"⚠️ Output non valido JSON dallo Step 3 per {arch.get('name', 'unknown')}")
+            return None
 
-        self.memory["component_decompositions"] = decompositions
-        
-        return decompositions
+        self._save_checkpoint("step3", checkpoint_key, parsed)
+        return parsed
 
     # ==================================================
     # STEP 4 – Architectural Views (self-refining)
     # ==================================================
-    async def define_views(self) -> list:
+    @llm_step("step4")
+    async def define_views(self, concurrent: bool | None = None) -> list:
+        """
+        Step 4 – Definizione delle viste architetturali con ciclo di raffinamento.
+
+        Con concurrent=True (default se max_concurrency > 1) il ciclo
+        genera → valida → raffina di ogni architettura gira come task
+        indipendente con un agente isolato, altrimenti le architetture sono
+        elaborate in sequenza. In entrambi i casi un fallimento viene
+        registrato in self.view_failures per quell'architettura senza
+        scartare le viste già prodotte per le altre; l'errore è sollevato
+        solo se nessuna architettura ha prodotto viste valide.
+        """
         if not self.memory["candidate_architectures"]:
             raise ValueError("❌ Nessuna candidate architecture disponibile (Step 2)")
 
-        views_list = []
+        if concurrent is None:
+            concurrent = self.max_concurrency > 1
 
         drivers = {
             "functional_drivers": self.memory["architectural_drivers"],
@@ -662,83 +1093,151 @@ class ArchitectAgent:
             Deployment, and Security views.
             4+1 View Model by Kruchten, C4 Model by Simon Brown, ISO/IEC/IEEE 42010 Clause 5.
         """
-        context_text, _ = load_knowledge(self.embedding_function, database_step4, retrieval_query, k=15)
+        context_chunks = self._retrieve_chunks(database_step4, retrieval_query, k=15)
 
-        for arch in self.memory["candidate_architectures"]:
-            component_decomposition = next(
-                (
-                    cd for cd in self.memory["component_decompositions"]
-                    if cd.get("architecture_id") == arch.get("architecture_id")
-                    or cd.get("name") == arch.get("name")
-                ),
-                None
-            )
+        self.view_failures = {}
 
-            if not component_decomposition:
-                raise ValueError(f"❌ Nessuna component decomposition trovata per {arch.get('name')}")
+        async def define(agent, arch):
+            try:
+                return await self._define_architecture_views(agent, arch, drivers, context_chunks)
+            except Exception as e:
+                self.view_failures[arch.get("name", "Unknown")] = str(e)
+                print(f"⚠️ Step 4 fallito per {arch.get('name')}: {e}")
+                return None
+
+        # le due modalità differiscono solo nello scheduling
+        if concurrent:
+            results = await self._gather_isolated(self.memory["candidate_architectures"], define)
+        else:
+            results = [await define(self.agent, arch) for arch in self.memory["candidate_architectures"]]
+        views_list = [views for views in results if views is not None]
+
+        if not views_list:
+            raise RuntimeError(
+                f"❌ Unable to generate valid architectural views for any architecture: {self.view_failures}"
+            )
 
-            max_attempts = 2
-            attempt = 0
-            last_error = ""
+        # Aggiorna memoria
+        self.memory["architectural_views"] = views_list
+        return views_list
 
-            while attempt <= max_attempts:
-                feedback = f"\nREFINEMENT FEEDBACK:\n{last_error}\n" if last_error else ""
+    async def _define_architecture_views(
+        self,
+        agent: AssistantAgent,
+        arch: dict,
+        drivers: dict,
+        context_chunks: list
+    ) -> dict:
+        """
+        Ciclo genera → valida → raffina per una singola architettura.
+        """
+        component_decomposition = next(
+            (
+                cd for cd in self.memory["component_decompositions"]
+                if cd.get("architecture_id") == arch.get("architecture_id")
+                or cd.get("name") == arch.get("name")
+            ),
+            None
+        )
 
-                prompt_content = STEP4_PROMPT_TEMPLATE.format(
-                    drivers=json.dumps(drivers, indent=2),
-                    architecture=json.dumps(arch, indent=2),
-                    component_view=json.dumps(component_decomposition["views"]["component_view"], indent=2),
-                    context=context_text
-                ) + feedback
+        if not component_decomposition:
+            raise ValueError(f"❌ Nessuna component decomposition trovata per {arch.get('name')}")
 
-                # Salva prompt per debug
-                os.makedirs(save_log, exist_ok=True)
-                with open(os.path.join(save_log, "step4_prompt.txt"), "w", encoding="utf-8") as f:
-                    f.write(prompt_content)
+        checkpoint_key = self._checkpoint_key(
+            database_step4, drivers, arch, component_decomposition, STEP4_PROMPT_TEMPLATE
+        )
+        cached = self._load_checkpoint("step4", checkpoint_key)
+        if cached is not None:
+            return cached
+
+        max_attempts = 2
+        attempt = 0
+        last_error = ""
+
+        while attempt <= max_attempts:
+            feedback = f"\nREFINEMENT FEEDBACK:\n{last_error}\n" if last_error else ""
+
+            prompt_content = self._build_prompt(
+                f"step4:{arch.get('architecture_id', arch.get('name'))}",
+                STEP4_PROMPT_TEMPLATE,
+                {
+                    "drivers": json.dumps(drivers, indent=2),
+                    "architecture": json.dumps(arch, indent=2),
+                    "component_view": json.dumps(component_decomposition["views"]["component_view"], indent=2)
+                },
+                {"context": context_chunks},
+                suffix=feedback
+            )
 
-                # --- Invoca AutoGen ---
-                prompt_msg = TextMessage(content=prompt_content, source="user")
-                response = await self.agent.run(task=prompt_msg)
-                await self.agent.on_reset(cancellation_token=None)
-                raw_output = response.messages[-1].content
+            # Salva prompt per debug
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(os.path.join(self.log_dir, "step4_prompt.txt"), "w", encoding="utf-8") as f:
+                f.write(prompt_content)
 
-                # Salva output raw
-                with open(os.path.join(save_log, "step4_output_raw.txt"), "w", encoding="utf-8") as f:
-                    f.write(raw_output)
+            # --- Invoca AutoGen ---
+            try:
+                raw_output = await self._complete(agent, prompt_content)
+            except StreamBudgetExceeded:
+                last_error = "LLM output exceeded the token budget. Return ONLY the JSON views, without explanations"
+                attempt += 1
+                continue
 
-                # Parsing JSON robusto
-                try:
-                    parsed = json.loads(clean_raw_json(raw_output))
-                except json.JSONDecodeError:
-                    last_error = "LLM returned invalid JSON"
-                    attempt += 1
-                    continue
+            # Salva output raw
+            with open(os.path.join(self.log_dir, "step4_output_raw.txt"), "w", encoding="utf-8") as f:
+                f.write(raw_output)
 
-                # Validazione interna
-                is_valid, error_msg = await self.validate_architectural_views(parsed)
-                await self.agent.on_reset(cancellation_token=None)
-                if is_valid:
-                    views_list.append(parsed)
-                    break
+            # Parsing JSON robusto
+            try:
+                parsed = self._parse_json("step4", raw_output)
+            except json.JSONDecodeError:
+                last_error = "LLM returned invalid JSON"
+                attempt += 1
+                continue
 
+            # Validazione strutturale locale: schema e riferimenti alla component view
+            structure_errors = (
+                validate_views_structure(parsed, component_decomposition)
+                if self.validate_structure else []
+            )
+            if structure_errors:
+                self.structural_rejections += 1
+                print(f"🧱 Step 4 – viste non valide strutturalmente per {arch.get('name')}: {len(structure_errors)} errori")
                 last_error = (
-                    f"The generated architectural views are invalid: {error_msg}. "
-                    f"Refine ONLY the views. Do NOT change components or introduce new ones."
+                    "The generated architectural views are structurally invalid:\n- "
+                    + "\n- ".join(structure_errors)
+                    + "\nFix ONLY these issues. Do NOT change components or introduce new ones."
                 )
                 attempt += 1
+                continue
 
-            if attempt > max_attempts:
-                raise RuntimeError(f"❌ Unable to generate valid architectural views for {arch.get('name')}")
+            # Validazione interna (reviewer LLM), solo se la struttura è corretta
+            is_valid, error_msg = await self.validate_architectural_views(parsed, agent=agent)
+            await agent.on_reset(cancellation_token=None)
+            if is_valid:
+                self._save_checkpoint("step4", checkpoint_key, parsed)
+                return parsed
 
-        # Aggiorna memoria
-        self.memory["architectural_views"] = views_list
-        return views_list
+            last_error = (
+                f"The generated architectural views are invalid: {error_msg}. "
+                f"Refine ONLY the views. Do NOT change components or introduce new ones."
+            )
+            attempt += 1
+
+        raise RuntimeError(f"❌ Unable to generate valid architectural views for {arch.get('name')}")
 
 
     # ==================================================
     # STEP 5 – Architecture Evaluation / Refinement
     # ==================================================
-    async def evaluate_architecture(self) -> list:
+    @llm_step("step5")
+    async def evaluate_architecture(self, batched: bool | None = None) -> list:
+        """
+        Step 5 – Valutazione delle architetture rispetto ai driver.
+
+        Con batched=True (default: batch_evaluation) le architetture sono
+        valutate insieme con STEP5_BATCH_PROMPT_TEMPLATE, così drivers e
+        contesto sono inviati una sola volta per gruppo.
+        """
         if not self.memory["architectural_views"]:
             raise ValueError("❌ Step 4 non eseguito – architectural views mancanti")
 
@@ -757,43 +1256,223 @@ class ArchitectAgent:
             ISO/IEC/IEEE 42010 compliance
             Risk identification and mitigation
         """
-        context_text, _ = load_knowledge(self.embedding_function, database_step4, retrieval_query, k=20)
+        context_chunks = self._retrieve_chunks(database_step4, retrieval_query, k=20)
 
-        evaluations = []
+        if batched is None:
+            batched = self.batch_evaluation
 
-        for views in self.memory["architectural_views"]:
-            views_json = json.dumps(views, indent=2)
-            prompt_content = STEP5_PROMPT_TEMPLATE.format(
-                drivers=json.dumps(drivers, indent=2),
-                views=views_json,
-                context=context_text
+        if batched and len(self.memory["architectural_views"]) > 1:
+            evaluations = await self._evaluate_views_batched(
+                self.memory["architectural_views"], drivers, context_chunks
             )
+        else:
+            async def evaluate(agent, views):
+                return await self._evaluate_views(agent, views, drivers, context_chunks)
 
-            # Salva prompt per debug
-            os.makedirs(save_log, exist_ok=True)
-            with open(os.path.join(save_log, "step5_prompt.txt"), "w", encoding="utf-8") as f:
+            evaluations = await self._gather_isolated(self.memory["architectural_views"], evaluate)
+
+        # Aggiorna memoria
+        self.memory["architecture_evaluation"] = evaluations
+        return evaluations
+
+    async def _evaluate_views(
+        self,
+        agent: AssistantAgent,
+        views: dict,
+        drivers: dict,
+        context_chunks: list
+    ) -> dict:
+        """
+        Valuta le viste di una singola architettura (Step 5).
+        """
+        checkpoint_key = self._step5_checkpoint_key(drivers, views)
+        cached = self._load_checkpoint("step5", checkpoint_key)
+        if cached is not None:
+            return cached
+
+        views_json = json.dumps(views, indent=2)
+        prompt_content = self._build_prompt(
+            f"step5:{views.get('architecture_id', 'Unknown')}",
+            STEP5_PROMPT_TEMPLATE,
+            {
+                "drivers": json.dumps(drivers, indent=2),
+                "views": views_json
+            },
+            {"context": context_chunks}
+        )
+
+        # Salva prompt per debug
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(os.path.join(self.log_dir, "step5_prompt.txt"), "w", encoding="utf-8") as f:
+            f.write(prompt_content)
+
+        # --- Invoca AutoGen ---
+        raw_output = await self._complete(agent, prompt_content)
+
+        # Salva output raw
+        with open(os.path.join(self.log_dir, "step5_output_raw.txt"), "w", encoding="utf-8") as f:
+            f.write(raw_output)
+
+        # Parsing JSON robusto
+        try:
+            parsed = self._parse_json("step5", raw_output)
+        except json.JSONDecodeError:
+            raise ValueError(f"❌ Output non valido JSON dallo Step 5 per {views.get('architecture_id', 'Unknown')}")
+
+        self._save_checkpoint("step5", checkpoint_key, parsed)
+        return parsed
+
+    def _step5_groups(self, views_list: list, drivers: dict) -> list[list]:
+        """
+        Divide le architetture in gruppi che stanno nella context length:
+        viste e risposte stimate di un gruppo occupano al massimo metà dello
+        spazio lasciato dal template, l'altra metà resta al contesto KB.
+        Senza PromptBudget tutte le architetture formano un solo gruppo.
+        """
+        if self.prompt_budget is None:
+            return [views_list]
+
+        fixed = count_tokens(STEP5_BATCH_PROMPT_TEMPLATE.format(
+            drivers=json.dumps(drivers, indent=2), views="", context="", architecture_ids=""
+        ))
+        limit = (self.prompt_budget.context_length - fixed) // 2
+
+        groups, current, used = [], [], 0
+        for views in views_list:
+            cost = count_tokens(json.dumps(views, indent=2)) + STEP5_COMPLETION_TOKENS_PER_ARCH
+            if current and used + cost > limit:
+                groups.append(current)
+                current, used = [], 0
+            current.append(views)
+            used += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    async def _evaluate_views_batched(self, views_list: list, drivers: dict, context_chunks: list) -> list:
+        """
+        Step 5 in modalità batch. Le architetture già presenti nei checkpoint
+        sono riusate; le altre sono valutate a gruppi con una richiesta per
+        gruppo. Ricadono sulla valutazione singola _evaluate_views, eseguita
+        in modo concorrente con _gather_isolated:
+        - le architetture senza architecture_id o con un id ripetuto (la
+          risposta del batch non potrebbe essere attribuita senza ambiguità)
+        - ogni architecture_id mancante o ripetuto nella risposta
+        - l'intero gruppo, se l'output non è JSON valido
+        I risultati rispettano l'ordine di views_list.
+        """
+        evaluations: list = [None] * len(views_list)
+        # voci (indice in views_list, views, chiave del checkpoint)
+        pending = []
+        for index, views in enumerate(views_list):
+            key = self._step5_checkpoint_key(drivers, views)
+            cached = self._load_checkpoint("step5", key)
+            if cached is not None:
+                evaluations[index] = cached
+            else:
+                pending.append((index, views, key))
+
+        id_counts: dict = {}
+        for _, views, _ in pending:
+            arch_id = views.get("architecture_id")
+            id_counts[arch_id] = id_counts.get(arch_id, 0) + 1
+
+        batchable, fallback = [], []
+        for entry in pending:
+            arch_id = entry[1].get("architecture_id")
+            if isinstance(arch_id, str) and arch_id and id_counts[arch_id] == 1:
+                batchable.append(entry)
+            else:
+                fallback.append(entry)
+        if fallback:
+            ambiguous = [entry[1].get("architecture_id") for entry in fallback]
+            print(f"⚠️ Step 5 batch: architecture_id assenti o duplicati {ambiguous}, valutazione singola")
+
+        groups, start = [], 0
+        for group in self._step5_groups([views for _, views, _ in batchable], drivers):
+            groups.append(batchable[start:start + len(group)])
+            start += len(group)
+
+        for group in groups:
+            if len(group) == 1:
+                fallback.extend(group)
+                continue
+
+            group_views = [views for _, views, _ in group]
+            architecture_ids = [views["architecture_id"] for views in group_views]
+            completion_reserve = len(group) * STEP5_COMPLETION_TOKENS_PER_ARCH
+            budget = None
+            if self.prompt_budget is not None and completion_reserve < self.prompt_budget.context_length:
+                budget = PromptBudget(
+                    self.prompt_budget.context_length,
+                    max(self.prompt_budget.completion_reserve, completion_reserve)
+                )
+
+            prompt_content = self._build_prompt(
+                f"step5:batch:{','.join(architecture_ids)}",
+                STEP5_BATCH_PROMPT_TEMPLATE,
+                {
+                    "drivers": json.dumps(drivers, indent=2),
+                    "views": json.dumps(group_views, indent=2),
+                    "architecture_ids": json.dumps(architecture_ids)
+                },
+                {"context": context_chunks},
+                budget=budget
+            )
+
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(os.path.join(self.log_dir, "step5_batch_prompt.txt"), "w", encoding="utf-8") as f:
                 f.write(prompt_content)
 
-            # --- Invoca AutoGen ---
-            prompt_msg = TextMessage(content=prompt_content, source="user")
-            response = await self.agent.run(task=prompt_msg)
-            await self.agent.on_reset(cancellation_token=None)
-            raw_output = response.messages[-1].content
+            try:
+                raw_output = await self._complete(
+                    self.agent,
+                    prompt_content,
+                    expect=(dict, list),
+                    max_tokens=self.stream_budgets.get("step5", 0) * len(group) or None
+                )
+            except StreamBudgetExceeded:
+                print(f"⚠️ Step 5 batch: output troncato per {architecture_ids}, valutazione singola")
+                fallback.extend(group)
+                continue
 
-            # Salva output raw
-            with open(os.path.join(save_log, "step5_output_raw.txt"), "w", encoding="utf-8") as f:
+            with open(os.path.join(self.log_dir, "step5_batch_output_raw.txt"), "w", encoding="utf-8") as f:
                 f.write(raw_output)
 
-            # Parsing JSON robusto
             try:
-                parsed = json.loads(clean_raw_json(raw_output))
+                parsed = self._parse_json("step5", raw_output, expect=(dict, list))
             except json.JSONDecodeError:
-                raise ValueError(f"❌ Output non valido JSON dallo Step 5 per {views.get('architecture_id', 'Unknown')}")
+                print(f"⚠️ Step 5 batch: output non valido JSON per {architecture_ids}, valutazione singola")
+                fallback.extend(group)
+                continue
 
-            evaluations.append(parsed)
+            items = parsed.get("evaluations", []) if isinstance(parsed, dict) else parsed
+            returned: dict = {}
+            for item in items:
+                if isinstance(item, dict):
+                    returned.setdefault(item.get("architecture_id"), []).append(item)
+
+            missing = []
+            for entry in group:
+                index, views, key = entry
+                matches = returned.get(views["architecture_id"], [])
+                if len(matches) != 1:
+                    missing.append(views["architecture_id"])
+                    fallback.append(entry)
+                    continue
+                evaluations[index] = matches[0]
+                self._save_checkpoint("step5", key, matches[0])
+
+            if missing:
+                print(f"⚠️ Step 5 batch: architecture_id mancanti o ripetuti {missing}, valutazione singola")
+
+        # valutazioni singole concorrenti, un agente isolato per architettura
+        async def evaluate(agent, entry):
+            return await self._evaluate_views(agent, entry[1], drivers, context_chunks)
+
+        for entry, evaluation in zip(fallback, await self._gather_isolated(fallback, evaluate)):
+            evaluations[entry[0]] = evaluation
 
-        # Aggiorna memoria
-        self.memory["architecture_evaluation"] = evaluations
         return evaluations
 
     # ==================================================
@@ -820,7 +1499,8 @@ class ArchitectAgent:
         # STEP 1 – Architectural Drivers
         # ==================================================
         print("=== STEP 1: Identifying Architectural Drivers ===")
-        drivers_result = await self.identify_drivers(rad_text)
+        with self.timer.measure("step1"):
+            drivers_result = await self.identify_drivers(rad_text)
         if not drivers_result:
             raise RuntimeError("❌ Step 1 non ha prodotto architectural drivers")
         self.memory["architectural_drivers"] = drivers_result.get("functional_drivers", [])
@@ -836,13 +1516,15 @@ class ArchitectAgent:
         # STEP 2 – Candidate Architectures
         # ==================================================
         print("=== STEP 2: Generating Candidate Architectures ===")
-        await self.generate_candidate_architectures()
+        with self.timer.measure("step2"):
+            await self.generate_candidate_architectures()
 
         # ==================================================
         # STEP 3 – Component Decomposition
         # ==================================================
         print("=== STEP 3: Decomposing Architectures into Components ===")
-        await self.decompose_architectures()
+        with self.timer.measure("step3"):
+            await self.decompose_architectures()
             
         print("✅ Step 3 completato")
 
@@ -850,7 +1532,8 @@ class ArchitectAgent:
         # STEP 4 – Defining Architectural Views
         # ==================================================
         print("=== STEP 4: Defining Architectural Views ===")
-        await self.define_views()
+        with self.timer.measure("step4"):
+            await self.define_views()
 
         print("✅ Step 4 completato")
 
@@ -858,9 +1541,24 @@ class ArchitectAgent:
         # STEP 5 – Evaluating Architectures
         # ==================================================
         print("=== STEP 5: Evaluating Architectures ===")
-        await self.evaluate_architecture()
+        with self.timer.measure("step5"):
+            await self.evaluate_architecture()
 
         print("✅ Step 5 completato")
+        print("📊 Startup:", self.startup_report())
+        print("📊 Embedding provider:", embedding_provider_stats())
+        if self.use_retrieval_cache:
+            print("📊 Retrieval cache:", get_retrieval_cache().stats())
+        if self.checkpoints is not None:
+            print("📊 Checkpoints:", self.checkpoints.stats())
+        if isinstance(self.model_client, CachedChatCompletionClient):
+            print("📊 LLM cache:", self.model_client.stats())
+        if self.json_repairs:
+            print("📊 JSON repairs:", self.json_repairs)
+        if self.stream_reports:
+            print("📊 Streaming:", self.stream_reports)
+        if self.structural_rejections:
+            print("📊 Step 4 structural rejections:", self.structural_rejections)
         # ==================================================
         # Salva JSON completo della memoria
         # ==================================================
@@ -871,10 +1569,12 @@ class ArchitectAgent:
         # ==================================================
         # Genera YAML finale
         # ==================================================
-        architecture_yaml_dict = generate_architecture_yaml(self.memory)
-        with open(output_yaml_path, "w", encoding="utf-8") as f_yaml:
-            yaml.dump(architecture_yaml_dict, f_yaml, sort_keys=False, allow_unicode=True)
+        with self.timer.measure("yaml"):
+            architecture_yaml_dict = generate_architecture_yaml(self.memory)
+            with open(output_yaml_path, "w", encoding="utf-8") as f_yaml:
+                yaml.dump(architecture_yaml_dict, f_yaml, sort_keys=False, allow_unicode=True)
         print(f"✅ YAML finale salvato in '{output_yaml_path}'.")
+        print("📊 Timings:", self.timer.report())
 
         return self.memory  # restituisce la memoria completa
 
@@ -901,10 +1601,16 @@ class ArchitectAgent:
 
         return {"architectures": architectures}
 
-    async def validate_architectural_views(self, views: dict) -> tuple[bool, str]:
+    @llm_step("step4_validation")
+    async def validate_architectural_views(
+        self,
+        views: dict,
+        agent: AssistantAgent | None = None
+    ) -> tuple[bool, str]:
         """
         Validates architectural views using RAG approach and AutoGen LLM.
         Retrieves relevant guidance from KB and asks the LLM to evaluate quality.
+        The review runs on `agent` when given (isolated Step 4 tasks), otherwise on self.agent.
         
         Returns:
             (bool, str): (is_valid, error_message). If valid, error_message may include LLM feedback.
@@ -920,9 +1626,11 @@ class ArchitectAgent:
         - Component consistency, connectors, and responsibilities
         - Quality attributes coverage and trade-offs
         """
-        context_text, _ = load_knowledge(
-            self.embedding_function, database_step4, retrieval_query, k=15
-        )
+        with self.timer.measure("retrieval"):
+            context_text, _ = load_knowledge(
+                self.embedding_function, database_step4, retrieval_query, k=15,
+                use_cache=self.use_retrieval_cache
+            )
 
         # ---------------------------------------------------------
         # 2. Prepara prompt per il controllo qualità
@@ -959,15 +1667,17 @@ class ArchitectAgent:
         # ---------------------------------------------------------
         # 3. Invoca AutoGen
         # ---------------------------------------------------------
-        prompt_msg = TextMessage(content=quality_check_prompt, source="user")
-        response = await self.agent.run(task=prompt_msg)
-        raw_output = response.messages[-1].content
+        agent = agent or self.agent
+        try:
+            raw_output = await self._complete(agent, quality_check_prompt)
+        except StreamBudgetExceeded:
+            return False, "LLM output exceeded the token budget during quality validation"
 
         # ---------------------------------------------------------
         # 4. Parsing JSON robusto
         # ---------------------------------------------------------
         try:
-            parsed = json.loads(clean_raw_json(raw_output))
+            parsed = self._parse_json("step4_validation", raw_output)
         except json.JSONDecodeError:
             return False, "LLM returned invalid JSON during quality validation"
 
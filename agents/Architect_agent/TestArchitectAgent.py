@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from ArchitectAgent import ArchitectAgent
+from llm_cache import CachedChatCompletionClient
 
 async def main():
     # Carica eventuali variabili d'ambiente
@@ -29,10 +30,22 @@ async def main():
         }
     )
 
+    # Cache delle risposte: un rerun con prompt identici non richiama il modello.
+    # Per forzare la rigenerazione di uno step: bypass_steps={"step4"}
+    llm = CachedChatCompletionClient(llm)
+
     # ==================================================
     # 2️⃣ Crea l'agente AutoGen
     # ==================================================
-    agent = ArchitectAgent(model_client=llm)
+    # checkpoint_dir: al rerun vengono ricalcolati solo gli step con input modificati
+    # streaming: la risposta si ferma appena il JSON dello step è completo
+    # warm_up_embeddings: l'embedding model si carica in background mentre parte lo Step 1
+    agent = ArchitectAgent(
+        model_client=llm,
+        checkpoint_dir="output/checkpoints",
+        streaming=True,
+        warm_up_embeddings=True
+    )
 
     # ==================================================
     # 3️⃣ Leggi RAD di input
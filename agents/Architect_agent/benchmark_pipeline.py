@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from ArchitectAgent import ArchitectAgent
+from replay_client import ReplayModelClient
+
+# Output del benchmark (risultati e log dei prompt), separati da quelli di
+# TestArchitectAgent: i file stepN_output_raw.txt in output/ sono le
+# registrazioni rigiocate da --recording output
+BENCHMARK_DIR = "output/benchmark"
+
+STAGES = ("step1", "step2", "step3", "step4", "step5", "retrieval", "prompt", "llm", "parse", "yaml")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the ADD pipeline: the model is replaced by recorded responses."
+    )
+    parser.add_argument("--rad", default="rad.txt", help="RAD input file")
+    parser.add_argument(
+        "--recording",
+        default="output/final_architecture.json",
+        help="Agent memory JSON to replay, or a directory with stepN_output_raw.txt files"
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Number of pipeline runs")
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial latency per model call (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Simulated generation speed")
+    parser.add_argument("--streaming", action="store_true", help="Use the streaming call path")
+    parser.add_argument("--batch-evaluation", action="store_true", help="Batched Step 5 evaluation")
+    parser.add_argument("--max-concurrency", type=int, default=1, help="Concurrent per-architecture tasks")
+    parser.add_argument(
+        "--strict-views",
+        action="store_true",
+        help="Enable the Step 4 structural validator (recordings made before it may not pass)"
+    )
+    parser.add_argument(
+        "--warm-cache",
+        action="store_true",
+        help="Use the persistent retrieval cache and the embedding cache "
+             "(timings then depend on what earlier runs left on disk)"
+    )
+    parser.add_argument("--output-json", default=None, help="Write the per-run timings to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args))
+    print_summary(results)
+
+    if args.output_json:
+        with open(args.output_json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Timings salvati in '{args.output_json}'")
+
+
+def make_client(args) -> ReplayModelClient:
+    kwargs = {"latency": args.latency, "tokens_per_second": args.tokens_per_second}
+    if os.path.isdir(args.recording):
+        return ReplayModelClient.from_raw_outputs(args.recording, **kwargs)
+    return ReplayModelClient.from_memory(args.recording, **kwargs)
+
+
+async def run_benchmark(args) -> list[dict]:
+    with open(args.rad, "r", encoding="utf-8") as f:
+        rad_text = f.read()
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    results = []
+
+    for run in range(args.runs):
+        start = time.perf_counter()
+        agent = ArchitectAgent(
+            model_client=make_client(args),
+            max_concurrency=args.max_concurrency,
+            streaming=args.streaming,
+            batch_evaluation=args.batch_evaluation,
+            validate_structure=args.strict_views,
+            log_dir=BENCHMARK_DIR,
+            retrieval_cache=args.warm_cache,
+            embedding_cache=args.warm_cache
+        )
+        init_s = time.perf_counter() - start
+
+        await agent.run_full_add_pipeline(
+            rad_text=rad_text,
+            output_yaml_path=os.path.join(BENCHMARK_DIR, "architecture.yaml"),
+            output_json_path=os.path.join(BENCHMARK_DIR, "architecture.json")
+        )
+        total_s = time.perf_counter() - start
+
+        report = agent.timer.report()
+        results.append({
+            "run": run + 1,
+            "warm_cache": args.warm_cache,
+            "init_s": round(init_s, 4),
+            "total_s": round(total_s, 4),
+            "stages": {stage: report.get(stage, {"seconds": 0.0, "calls": 0}) for stage in STAGES}
+        })
+
+    return results
+
+
+def print_summary(results: list[dict]) -> None:
+    print("\n=== Benchmark ADD pipeline (replay) ===")
+    print(f"{'stage':<12}{'calls':>8}{'median s':>12}{'min s':>10}{'max s':>10}")
+
+    rows = [("init", [r["init_s"] for r in results], 1)]
+    for stage in STAGES:
+        seconds = [r["stages"][stage]["seconds"] for r in results]
+        rows.append((stage, seconds, results[-1]["stages"][stage]["calls"]))
+    rows.append(("total", [r["total_s"] for r in results], 1))
+
+    for stage, seconds, calls in rows:
+        print(
+            f"{stage:<12}{calls:>8}{statistics.median(seconds):>12.4f}"
+            f"{min(seconds):>10.4f}{max(seconds):>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# checkpoints.py
+import hashlib
+import json
+import os
+import tempfile
+
+
+def hash_inputs(*inputs) -> str:
+    """
+    Hash stabile degli input di uno step (dict/list/str serializzati in JSON canonico).
+    """
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Checkpoint degli output della pipeline ADD, indicizzati per hash degli input.
+
+    Ogni entry è un file JSON in <directory>/<step>/<hash>.json.
+    Se gli input di uno step (RAD, drivers, architettura, fingerprint della KB,
+    prompt template, ...) non cambiano, il risultato salvato viene riusato
+    senza richiamare il modello. Gli step 3–5 salvano un checkpoint per
+    architettura, quindi la modifica di una candidate ricalcola solo quella.
+    """
+
+    def __init__(self, directory: str = "output/checkpoints"):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, step: str, key: str) -> str:
+        return os.path.join(self.directory, step, f"{key}.json")
+
+    def get(self, step: str, key: str):
+        path = self._path(step, key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)["value"]
+        except (json.JSONDecodeError, KeyError):
+            # checkpoint troncato (es. crash durante la scrittura): si ricalcola
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def put(self, step: str, key: str, value) -> None:
+        path = self._path(step, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Scrittura atomica: un crash non lascia checkpoint parziali. Il file
+        # temporaneo è unico per scrittura, così task concorrenti con la
+        # stessa chiave (es. candidate duplicate) non si sovrascrivono a vicenda
+        with tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=os.path.dirname(path),
+            prefix=f"{key}.",
+            suffix=".tmp",
+            delete=False
+        ) as f:
+            json.dump({"step": step, "value": value}, f, indent=2, ensure_ascii=False)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,10 @@
+# embedding_stage.py
+# Implementazione unica in agents/agent_common/embedding_stage.py (condivisa con tradeoff_agent)
+import os
+import sys
+
+_AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _AGENTS_DIR not in sys.path:
+    sys.path.append(_AGENTS_DIR)
+
+from agent_common.embedding_stage import EmbeddingStage, configure_threads  # noqa: E402
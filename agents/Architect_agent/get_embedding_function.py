@@ -1,7 +1,29 @@
-from langchain_community.embeddings import HuggingFaceEmbeddings
+# get_embedding_function.py
+# Implementazione unica in agents/agent_common/embedding_provider.py (condivisa con tradeoff_agent)
+import os
+import sys
 
-def get_embedding_function():
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
- 
\ No newline at end of file
+_AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _AGENTS_DIR not in sys.path:
+    sys.path.append(_AGENTS_DIR)
+
+from agent_common import embedding_provider  # noqa: E402
+from agent_common.embedding_cache import CachedEmbeddings  # noqa: E402
+from agent_common.embedding_provider import (  # noqa: E402
+    EMBEDDING_MODEL_NAME,
+    LazyEmbeddings,
+    embedding_provider_stats,
+)
+
+
+def _load_model(model_name: str):
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def get_embedding_function(model_name: str = EMBEDDING_MODEL_NAME) -> CachedEmbeddings:
+    """
+    Provider di embedding condiviso per model_name (HuggingFaceEmbeddings
+    di langchain_community).
+    """
+    return embedding_provider.get_embedding_function(model_name, loader=_load_model)
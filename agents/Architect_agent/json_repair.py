@@ -0,0 +1,241 @@
+# json_repair.py
+import json
+import re
+from typing import Any
+
+_OPENERS = {"{": "}", "[": "]"}
+_CLOSERS = {"}": "{", "]": "["}
+
+_FENCE_LINE = re.compile(r"^[ \t]*```[\w-]*[ \t]*$", re.MULTILINE)
+_DANGLING_KEY = re.compile(r',?\s*"(?:[^"\\]|\\.)*"\s*:\s*$')
+
+
+def scan_json_spans(text: str) -> list[tuple[int, int | None]]:
+    """
+    Scansione in un solo passaggio delle parentesi bilanciate di text,
+    ignorando quelle dentro le stringhe JSON.
+
+    Restituisce (start, end) per ogni parentesi aperta, in ordine di start:
+    end è l'indice della parentesi di chiusura corrispondente, oppure None
+    se il documento non è chiuso prima della fine del testo (output troncato).
+    Le chiusure senza apertura (prosa) e le chiusure del tipo sbagliato
+    interrompono solo le aperture più interne, non l'intera scansione.
+    """
+    spans: dict[int, int | None] = {}
+    stack: list[int] = []
+    in_string = False
+    escaped = False
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            # le virgolette contano solo dentro un candidato: nella prosa
+            # un apostrofo o una citazione non devono aprire una stringa
+            in_string = bool(stack)
+        elif ch in _OPENERS:
+            stack.append(i)
+            spans[i] = None
+        elif ch in _CLOSERS:
+            # risale fino all'apertura corrispondente, scartando quelle spaiate
+            while stack and text[stack[-1]] != _CLOSERS[ch]:
+                stack.pop()
+            if stack:
+                spans[stack.pop()] = i
+
+    return sorted(spans.items())
+
+
+def _strip_fences(text: str) -> str:
+    return _FENCE_LINE.sub("", text)
+
+
+def _fix_smart_quotes(text: str) -> str:
+    """
+    Sostituisce “ ” usate come delimitatori di stringa. Dentro una stringa
+    delimitata da " le virgolette tipografiche sono testo valido e restano.
+    """
+    out = []
+    in_string = False
+    smart = False
+    escaped = False
+
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif smart and ch in "”“":
+                in_string = False
+                ch = '"'
+            elif smart and ch == '"':
+                ch = '\\"'
+            elif not smart and ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string, smart = True, False
+        elif ch in "“”„":
+            in_string, smart = True, True
+            ch = '"'
+        out.append(ch)
+
+    return "".join(out)
+
+
+def _remove_trailing_commas(text: str) -> str:
+    out = []
+    in_string = False
+    escaped = False
+
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "}]":
+            # elimina la virgola prima della chiusura (spazi compresi)
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        out.append(ch)
+
+    return "".join(out)
+
+
+def _close_brackets(text: str) -> str:
+    """
+    Chiude stringhe e parentesi rimaste aperte a fine testo, eliminando
+    prima l'ultima coppia chiave/valore incompleta.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _OPENERS:
+            stack.append(_OPENERS[ch])
+        elif ch in _CLOSERS and stack:
+            stack.pop()
+
+    if escaped:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+
+    text = _DANGLING_KEY.sub("", text.rstrip()).rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+# Riparazioni in ordine di applicazione: (nome, funzione, solo per documenti troncati)
+REPAIRS = [
+    ("markdown_fence", _strip_fences, False),
+    ("smart_quotes", _fix_smart_quotes, False),
+    ("trailing_commas", _remove_trailing_commas, False),
+    ("unclosed_brackets", _close_brackets, True),
+]
+
+
+def _try_candidate(candidate: str, truncated: bool, expect) -> tuple[bool, Any, list[str]]:
+    applied: list[str] = []
+    try:
+        value = json.loads(candidate)
+        if isinstance(value, expect):
+            return True, value, applied
+    except json.JSONDecodeError:
+        pass
+
+    for name, repair, only_truncated in REPAIRS:
+        if only_truncated and not truncated:
+            continue
+        repaired = repair(candidate)
+        if repaired == candidate:
+            continue
+        candidate = repaired
+        applied.append(name)
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, expect):
+            return True, value, applied
+
+    return False, None, applied
+
+
+def parse_llm_json(raw_text: str, expect: type | tuple = (dict, list)) -> tuple[Any, list[str]]:
+    """
+    Estrae il primo documento JSON valido dall'output di un modello.
+
+    I candidati sono le parentesi bilanciate trovate da scan_json_spans,
+    provati in ordine; i candidati contenuti in un documento completo già
+    provato vengono saltati (non si restituisce un frammento interno).
+    Se un candidato non è JSON valido si applicano, una alla volta, le
+    riparazioni locali di REPAIRS. Se il testo contiene un'apertura non
+    chiusa (output troncato), i documenti completi che la seguono sono
+    frammenti del documento troncato: prima si prova il testo
+    dall'apertura fino alla fine, e quei frammenti solo come ultima possibilità.
+
+    Argomenti:
+    - raw_text: output del modello
+    - expect: tipo (o tupla di tipi) accettato per il documento
+
+    Ritorna (documento, riparazioni applicate). Solleva json.JSONDecodeError
+    se nessun candidato è recuperabile.
+    """
+    spans = scan_json_spans(raw_text)
+    first_unclosed = next((start for start, end in spans if end is None), len(raw_text))
+
+    complete = []
+    tried_until = -1
+    for start, end in spans:
+        if end is None or start < tried_until:
+            continue
+        tried_until = end
+        complete.append((start, end))
+
+    for start, end in complete:
+        if start > first_unclosed:
+            break
+        ok, value, repairs = _try_candidate(raw_text[start:end + 1], False, expect)
+        if ok:
+            return value, repairs
+
+    for start, end in spans:
+        if end is not None:
+            continue
+        ok, value, repairs = _try_candidate(raw_text[start:], True, expect)
+        if ok:
+            return value, repairs
+
+    for start, end in complete:
+        if start < first_unclosed:
+            continue
+        ok, value, repairs = _try_candidate(raw_text[start:end + 1], False, expect)
+        if ok:
+            return value, repairs
+
+    raise json.JSONDecodeError("No valid JSON document found in model output", raw_text, 0)
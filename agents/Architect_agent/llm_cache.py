@@ -0,0 +1,16 @@
+# llm_cache.py
+# Implementazione unica in agents/agent_common/llm_cache.py (condivisa con tradeoff_agent)
+import os
+import sys
+
+_AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _AGENTS_DIR not in sys.path:
+    sys.path.append(_AGENTS_DIR)
+
+from agent_common.llm_cache import (  # noqa: E402
+    DEFAULT_CACHE_PATH,
+    CachedChatCompletionClient,
+    current_step,
+    llm_step,
+    model_identity,
+)
@@ -1,12 +1,17 @@
 import argparse
+import hashlib
+import os
 import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 
-from langchain.document_loaders.pdf import PyPDFDirectoryLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
 from langchain.vectorstores.chroma import Chroma
 
+from embedding_stage import EmbeddingStage, configure_threads
 from get_embedding_function import get_embedding_function
 
 # Paths to your documents
@@ -19,6 +24,19 @@ ADD_DB_DIR = Path("chroma/chroma_add")
 ARCH_SEL_DB_DIR = Path("chroma/chroma_arch_selection")
 COMP_DB_DIR = Path("chroma/chroma_component")
 
+# Corpora da indicizzare: (db_type, cartella PDF, store Chroma, etichetta)
+CORPORA = [
+    ("ADD", ADD_DOCS_DIR, ADD_DB_DIR, "ADD"),
+    ("ARCH", ARCH_SEL_DOCS_DIR, ARCH_SEL_DB_DIR, "Architecture Selection"),
+    ("COMP", COMP_DOCS_DIR, COMP_DB_DIR, "Component Design"),
+]
+
+# Numero di chunk embeddati e inviati a Chroma per ogni upsert
+UPSERT_BATCH_SIZE = 64
+
+# PDF in lavorazione per worker: limita i chunk in attesa dello stadio di embedding
+FILES_IN_FLIGHT_PER_WORKER = 2
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -27,44 +45,127 @@ def main():
         action="store_true",
         help="Delete and rebuild the Chroma databases"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes used to parse PDFs (default: CPU count)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=UPSERT_BATCH_SIZE,
+        help="Number of chunks embedded and written to Chroma per batch"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of torch/BLAS threads used by the embedding model"
+    )
     args = parser.parse_args()
 
+    configure_threads(args.threads)
+
     if args.reset:
         print("✨ Clearing databases")
-        clear_database(ADD_DB_DIR)
-        clear_database(ARCH_SEL_DB_DIR)
-        clear_database(COMP_DB_DIR)
-
-    # Popoliamo il DB per ADD
-    print("📄 Loading ADD documents...")
-    add_docs = load_documents(ADD_DOCS_DIR)
-    print(f"📑 Loaded {len(add_docs)} pages for ADD")
-    add_chunks = split_documents(add_docs, db_type="ADD")
-    print(f"🧩 Created {len(add_chunks)} chunks for ADD")
-    add_to_chroma(add_chunks, ADD_DB_DIR)
-
-    # Popoliamo il DB per Architettura
-    print("📄 Loading Architecture Selection documents...")
-    arch_docs = load_documents(ARCH_SEL_DOCS_DIR)
-    print(f"📑 Loaded {len(arch_docs)} pages for Architecture Selection")
-    arch_chunks = split_documents(arch_docs, db_type="ARCH")
-    print(f"🧩 Created {len(arch_chunks)} chunks for Architecture Selection")
-    add_to_chroma(arch_chunks, ARCH_SEL_DB_DIR)
-
-    # Popoliamo il DB per Component Design
-    print("📄 Loading Component Design documents...")
-    comp_docs = load_documents(COMP_DOCS_DIR)
-    print(f"📑 Loaded {len(comp_docs)} pages for Component Design")
-    comp_chunks = split_documents(comp_docs, db_type="COMP")
-    print(f"🧩 Created {len(comp_chunks)} chunks for Component Design")
-    add_to_chroma(comp_chunks, COMP_DB_DIR)
+        for _, _, db_dir, _ in CORPORA:
+            clear_database(db_dir)
+
+    ingest_corpora(CORPORA, workers=args.workers, batch_size=args.batch_size)
 
     print("✅ Database population complete")
 
 
-def load_documents(path: Path) -> list[Document]:
-    loader = PyPDFDirectoryLoader(str(path))
-    return loader.load()
+def list_pdfs(path: Path) -> list[Path]:
+    return sorted(path.glob("**/[!.]*.pdf"))
+
+
+def load_and_split_pdf(pdf_path: str, db_type: str) -> tuple[str, int, list[Document], float]:
+    """
+    Worker del process pool: parsing di un singolo PDF e chunking
+    con i parametri del corpus. Restituisce (db_type, pagine, chunk, secondi).
+    """
+    start = time.perf_counter()
+    pages = PyPDFLoader(pdf_path).load()
+    chunks = split_documents(pages, db_type)
+    return db_type, len(pages), chunks, time.perf_counter() - start
+
+
+def ingest_corpora(
+    corpora: list[tuple[str, Path, Path, str]],
+    workers: int | None = None,
+    batch_size: int = UPSERT_BATCH_SIZE
+) -> None:
+    """
+    Parsing e chunking dei PDF di tutti i corpora in parallelo (un task per file
+    su un ProcessPoolExecutor). I chunk di ogni file vengono passati, appena
+    pronti, all'unico stadio di embedding/scrittura nel processo principale.
+
+    Al pool vengono sottomessi al massimo FILES_IN_FLIGHT_PER_WORKER file per
+    worker alla volta, così la memoria resta limitata anche con molti PDF.
+    """
+    syncs = {
+        db_type: ChromaSync(db_dir, batch_size=batch_size, label=label)
+        for db_type, _, db_dir, label in corpora
+    }
+    labels = {db_type: label for db_type, _, _, label in corpora}
+    stats = {
+        db_type: {"files": 0, "pages": 0, "chunks": 0, "parse_s": 0.0, "done_at": None}
+        for db_type, _, _, _ in corpora
+    }
+
+    jobs = [
+        (str(pdf), db_type)
+        for db_type, docs_dir, _, _ in corpora
+        for pdf in list_pdfs(docs_dir)
+    ]
+    remaining = {db_type: sum(1 for _, t in jobs if t == db_type) for db_type in syncs}
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * FILES_IN_FLIGHT_PER_WORKER
+    print(f"📄 Parsing {len(jobs)} PDF files with {workers} workers...")
+
+    start = time.perf_counter()
+    pending_jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for pdf, db_type in pending_jobs:
+            in_flight.add(pool.submit(load_and_split_pdf, pdf, db_type))
+            if len(in_flight) >= max_in_flight:
+                break
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                next_job = next(pending_jobs, None)
+                if next_job is not None:
+                    in_flight.add(pool.submit(load_and_split_pdf, *next_job))
+
+                db_type, pages, chunks, parse_s = future.result()
+                corpus_stats = stats[db_type]
+                corpus_stats["files"] += 1
+                corpus_stats["pages"] += pages
+                corpus_stats["chunks"] += len(chunks)
+                corpus_stats["parse_s"] += parse_s
+
+                # Stadio di embedding: unico consumer, riceve i chunk file per file
+                syncs[db_type].add(chunks)
+
+                remaining[db_type] -= 1
+                if remaining[db_type] == 0:
+                    corpus_stats["done_at"] = time.perf_counter() - start
+
+    for db_type, sync in syncs.items():
+        sync.finish()
+
+        corpus_stats = stats[db_type]
+        elapsed = corpus_stats["done_at"] or (time.perf_counter() - start)
+        print(
+            f"📑 {labels[db_type]}: {corpus_stats['files']} files, {corpus_stats['pages']} pages, "
+            f"{corpus_stats['chunks']} chunks in {elapsed:.1f}s "
+            f"({corpus_stats['pages'] / elapsed:.1f} pages/s, {corpus_stats['chunks'] / elapsed:.1f} chunks/s, "
+            f"parse CPU {corpus_stats['parse_s']:.1f}s)"
+        )
 
 
 def split_documents(documents: list[Document], db_type: str) -> list[Document]:
@@ -96,22 +197,133 @@ def split_documents(documents: list[Document], db_type: str) -> list[Document]:
     return splitter.split_documents(documents)
 
 
-def add_to_chroma(chunks: list[Document], chroma_path: Path):
-    db = Chroma(
-        persist_directory=str(chroma_path),
-        embedding_function=get_embedding_function(),
-    )
+def calculate_chunk_ids(chunks: list[Document]) -> list[Document]:
+    """
+    Assegna a ogni chunk un id stabile:
+        <source>:<page>:<indice del chunk nella pagina>:<hash del contenuto>
 
-    # Optional sanity check
-    try:
-        existing_count = db._collection.count()
-        print(f"📦 Existing chunks in DB: {existing_count}")
-    except Exception:
-        print("📦 New database detected")
+    La parte <source>:<page>:<indice> identifica la posizione del chunk,
+    l'hash permette di riconoscere i chunk il cui contenuto è cambiato.
+    """
+    last_page_id = None
+    current_chunk_index = 0
+
+    for chunk in chunks:
+        source = chunk.metadata.get("source")
+        page = chunk.metadata.get("page")
+        current_page_id = f"{source}:{page}"
+
+        if current_page_id == last_page_id:
+            current_chunk_index += 1
+        else:
+            current_chunk_index = 0
+
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+        chunk.metadata["id"] = f"{current_page_id}:{current_chunk_index}:{content_hash}"
+        last_page_id = current_page_id
+
+    return chunks
+
+
+def chunk_position(chunk_id: str) -> str:
+    """
+    Posizione del chunk (id senza hash del contenuto).
+    """
+    return chunk_id.rsplit(":", 1)[0]
+
+
+class ChromaSync:
+    """
+    Sincronizza in modo incrementale e idempotente uno store Chroma con i chunk correnti.
+
+    I chunk arrivano a blocchi (un PDF alla volta) tramite add():
+    - chunk con id già presente: saltati (nessun nuovo embedding)
+    - chunk in una posizione esistente ma con contenuto diverso: aggiornati
+    - chunk in posizioni nuove: aggiunti
+    I chunk nuovi/aggiornati passano dall'EmbeddingStage, che li embedda e
+    scrive a batch: un'ingestion interrotta riprende dai chunk non ancora scritti.
+    finish() elimina i chunk nel DB che non corrispondono più a nessun chunk
+    (PDF modificati con meno chunk o PDF rimossi) e stampa il riepilogo.
+    """
+
+    def __init__(self, chroma_path: Path, batch_size: int = UPSERT_BATCH_SIZE, label: str = ""):
+        self.chroma_path = chroma_path
+        self.batch_size = batch_size
+        embedding_function = get_embedding_function()
+        self.db = Chroma(
+            persist_directory=str(chroma_path),
+            embedding_function=embedding_function,
+        )
+        self.stage = EmbeddingStage(
+            self.db, embedding_function, batch_size=batch_size, label=label or str(chroma_path)
+        )
 
-    db.add_documents(chunks)
-    db.persist()
-    print(f"➕ Added {len(chunks)} chunks to database at {chroma_path}")
+        self.existing_ids = set(self.db.get(include=[])["ids"])
+        self.existing_positions = {chunk_position(chunk_id): chunk_id for chunk_id in self.existing_ids}
+        print(f"📦 Existing chunks in {chroma_path}: {len(self.existing_ids)}")
+
+        self.seen_ids: set[str] = set()
+        self.seen_positions: set[str] = set()
+        self.summary = {"added": 0, "updated": 0, "deleted": 0, "skipped": 0}
+
+    def add(self, chunks: list[Document]) -> None:
+        chunks = calculate_chunk_ids(chunks)
+
+        new_chunks = []
+        replaced_ids = []
+        for chunk in chunks:
+            chunk_id = chunk.metadata["id"]
+            position = chunk_position(chunk_id)
+            self.seen_ids.add(chunk_id)
+            self.seen_positions.add(position)
+
+            if chunk_id in self.existing_ids:
+                self.summary["skipped"] += 1
+                continue
+
+            new_chunks.append(chunk)
+            old_id = self.existing_positions.get(position)
+            if old_id is not None:
+                replaced_ids.append(old_id)
+                self.summary["updated"] += 1
+            else:
+                self.summary["added"] += 1
+
+        self._delete(replaced_ids)
+        self.stage.submit(new_chunks)
+
+    def _delete(self, ids: list[str]) -> None:
+        for i in range(0, len(ids), self.batch_size):
+            self.db.delete(ids=ids[i:i + self.batch_size])
+
+    def finish(self) -> dict:
+        self.stage.close()
+
+        # Id obsoleti: né l'id né la posizione sono stati visti in questa esecuzione
+        stale_ids = [
+            chunk_id for chunk_id in self.existing_ids
+            if chunk_id not in self.seen_ids and chunk_position(chunk_id) not in self.seen_positions
+        ]
+        self._delete(stale_ids)
+        self.summary["deleted"] = len(stale_ids)
+
+        if any(self.summary[key] for key in ("added", "updated", "deleted")):
+            self.db.persist()
+
+        print(
+            f"➕ {self.chroma_path}: added {self.summary['added']}, updated {self.summary['updated']}, "
+            f"deleted {self.summary['deleted']}, skipped {self.summary['skipped']} (unchanged)"
+        )
+        return self.summary
+
+
+def add_to_chroma(chunks: list[Document], chroma_path: Path) -> dict:
+    """
+    Sincronizza lo store con l'insieme completo dei chunk di un corpus.
+    """
+    sync = ChromaSync(chroma_path)
+    sync.add(chunks)
+    return sync.finish()
 
 
 def clear_database(chroma_path: Path):
@@ -0,0 +1,107 @@
+# prompt_budget.py
+import re
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken non installato o encoding non disponibile offline
+    _ENCODING = None
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Conta i token localmente, senza chiamare il server del modello.
+
+    Usa tiktoken (cl100k_base) se disponibile; altrimenti stima
+    ~1.3 token per parola/simbolo, una buona approssimazione per i
+    tokenizer subword su testo tecnico in inglese.
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return int(len(_TOKEN_PATTERN.findall(text)) * 1.3) + 1
+
+
+def join_chunks(chunks: list[tuple[str, dict, float]]) -> str:
+    return CONTEXT_SEPARATOR.join(content for content, _, _ in chunks)
+
+
+class PromptBudget:
+    """
+    Riempie gli slot CONTEXT di un prompt template rispettando la
+    context length del modello.
+
+    Il budget per il contesto è:
+        context_length - completion_reserve - token del template senza contesto
+
+    I chunk di tutti gli slot vengono considerati insieme in ordine di
+    rilevanza (score Chroma = distanza, quindi crescente) e inseriti
+    finché c'è spazio. Dentro ogni slot l'ordine originale è mantenuto.
+    """
+
+    def __init__(self, context_length: int, completion_reserve: int = 2048):
+        if completion_reserve >= context_length:
+            raise ValueError("completion_reserve must be smaller than context_length")
+        self.context_length = context_length
+        self.completion_reserve = completion_reserve
+
+    def fill(
+        self,
+        template: str,
+        fields: dict,
+        slots: dict[str, list[tuple[str, dict, float]]],
+        suffix: str = ""
+    ) -> tuple[str, dict]:
+        """
+        Restituisce (prompt, report). Il report indica token usati,
+        budget e quanti chunk/token sono stati scartati.
+        """
+        empty_prompt = template.format(**fields, **{slot: "" for slot in slots}) + suffix
+        fixed_tokens = count_tokens(empty_prompt)
+        budget = self.context_length - self.completion_reserve - fixed_tokens
+
+        ranked = sorted(
+            (
+                (score, slot, index, count_tokens(content))
+                for slot, chunks in slots.items()
+                for index, (content, _, score) in enumerate(chunks)
+            ),
+            key=lambda item: item[0]
+        )
+
+        separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+        kept: dict[str, set[int]] = {slot: set() for slot in slots}
+        used = 0
+        dropped = 0
+        dropped_tokens = 0
+
+        for score, slot, index, tokens in ranked:
+            cost = tokens + (separator_tokens if kept[slot] else 0)
+            if used + cost <= budget:
+                kept[slot].add(index)
+                used += cost
+            else:
+                dropped += 1
+                dropped_tokens += tokens
+
+        contexts = {
+            slot: join_chunks([chunk for i, chunk in enumerate(chunks) if i in kept[slot]])
+            for slot, chunks in slots.items()
+        }
+        prompt = template.format(**fields, **contexts) + suffix
+
+        report = {
+            "context_length": self.context_length,
+            "completion_reserve": self.completion_reserve,
+            "context_budget": max(budget, 0),
+            "prompt_tokens": fixed_tokens + used,
+            "kept_chunks": sum(len(indexes) for indexes in kept.values()),
+            "dropped_chunks": dropped,
+            "dropped_tokens": dropped_tokens
+        }
+        return prompt, report
@@ -0,0 +1,196 @@
+# retrieval_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = "cache/retrieval_cache.sqlite3"
+
+
+class RetrievalCache:
+    """
+    Cache dei risultati di retrieval indicizzata per (store, query, k).
+
+    Due livelli:
+    - memoria: OrderedDict con eviction LRU (max_memory_entries)
+    - disco: tabella SQLite con eviction LRU su last_access (max_disk_entries)
+
+    Ogni entry è legata al fingerprint dello store da cui proviene:
+    se il numero di chunk o il contenuto della collection cambia,
+    le entry dello store vengono invalidate automaticamente.
+    """
+
+    def __init__(
+        self,
+        db_path: str | None = DEFAULT_CACHE_PATH,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 4096
+    ):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: OrderedDict[str, tuple[str, list]] = OrderedDict()
+        self._fingerprints: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrieval_cache (
+                    key TEXT PRIMARY KEY,
+                    store TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    results TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_retrieval_cache_access "
+                "ON retrieval_cache(last_access)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(store: str, query: str, k: int) -> str:
+        payload = json.dumps([store, query, k], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _sync_fingerprint(self, store: str, fingerprint: str) -> None:
+        """
+        Invalida tutte le entry di uno store se il suo fingerprint è cambiato.
+        """
+        if self._fingerprints.get(store) == fingerprint:
+            return
+
+        stale = [key for key, (fp_store, _) in self._memory.items() if fp_store == store]
+        for key in stale:
+            del self._memory[key]
+
+        if self._conn is not None:
+            cur = self._conn.execute(
+                "DELETE FROM retrieval_cache WHERE store = ? AND fingerprint != ?",
+                (store, fingerprint)
+            )
+            self._conn.commit()
+            stale_count = len(stale) + cur.rowcount
+        else:
+            stale_count = len(stale)
+
+        if store in self._fingerprints or stale_count:
+            self.invalidations += 1
+
+        self._fingerprints[store] = fingerprint
+
+    def get(self, store: str, fingerprint: str, query: str, k: int) -> list | None:
+        """
+        Restituisce la lista di risultati (page_content, metadata, score)
+        oppure None in caso di miss.
+        """
+        key = self.make_key(store, query, k)
+
+        with self._lock:
+            self._sync_fingerprint(store, fingerprint)
+
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][1]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT results FROM retrieval_cache WHERE key = ? AND fingerprint = ?",
+                    (key, fingerprint)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE retrieval_cache SET last_access = ? WHERE key = ?",
+                        (time.time(), key)
+                    )
+                    self._conn.commit()
+                    results = json.loads(row[0])
+                    self._remember(key, store, results)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return results
+
+            self.misses += 1
+            return None
+
+    def put(self, store: str, fingerprint: str, query: str, k: int, results: list) -> None:
+        key = self.make_key(store, query, k)
+
+        with self._lock:
+            self._sync_fingerprint(store, fingerprint)
+            self._remember(key, store, results)
+
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO retrieval_cache "
+                    "(key, store, fingerprint, results, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, store, fingerprint, json.dumps(results, ensure_ascii=False), time.time())
+                )
+                # Eviction LRU su disco
+                self._conn.execute(
+                    """
+                    DELETE FROM retrieval_cache WHERE key IN (
+                        SELECT key FROM retrieval_cache
+                        ORDER BY last_access DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_disk_entries,)
+                )
+                self._conn.commit()
+
+    def _remember(self, key: str, store: str, results: list) -> None:
+        self._memory[key] = (store, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._fingerprints.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM retrieval_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "memory_entries": len(self._memory)
+        }
+
+
+_DEFAULT_CACHE: RetrievalCache | None = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """
+    Restituisce la cache di retrieval condivisa dal processo.
+    """
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = RetrievalCache()
+    return _DEFAULT_CACHE
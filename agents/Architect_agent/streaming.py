@@ -0,0 +1,63 @@
+# streaming.py
+import json
+import os
+import sys
+from typing import Optional
+
+from json_repair import parse_llm_json
+
+_AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _AGENTS_DIR not in sys.path:
+    sys.path.append(_AGENTS_DIR)
+
+# stream_structured / StreamBudgetExceeded: implementazione unica in agents/agent_common/streaming.py (condivisa con tradeoff_agent)
+from agent_common.streaming import StreamBudgetExceeded, stream_structured  # noqa: E402
+
+
+class JSONDocumentDetector:
+    """
+    Segue in modo incrementale il bilanciamento delle parentesi (ignorando
+    quelle nelle stringhe) sul testo in streaming. feed() restituisce il
+    testo ricevuto fino alla chiusura del primo documento JSON completo
+    e parsabile del tipo atteso, altrimenti None.
+    """
+
+    def __init__(self, expect: type | tuple = dict):
+        self.expect = expect
+        self.buffer = ""
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> Optional[str]:
+        offset = len(self.buffer)
+        self.buffer += text
+
+        for i, ch in enumerate(text, start=offset):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self._depth > 0
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0 and self._is_document(self.buffer[self._start:i + 1]):
+                    return self.buffer[:i + 1]
+
+        return None
+
+    def _is_document(self, candidate: str) -> bool:
+        try:
+            parse_llm_json(candidate, expect=self.expect)
+        except json.JSONDecodeError:
+            return False
+        return True
@@ -0,0 +1,150 @@
+# test_json_repair.py
+# parse_llm_json confrontato con il clean_raw_json precedente (prima "{" o "["
+# fino all'ultima chiusura) e sui casi che quella versione non gestiva.
+import json
+import random
+
+import pytest
+
+from json_repair import parse_llm_json, scan_json_spans
+
+
+def previous_clean_raw_json(raw_text: str) -> str:
+    raw_text = raw_text.strip()
+
+    first_curly = raw_text.find("{")
+    last_curly = raw_text.rfind("}")
+    first_square = raw_text.find("[")
+    last_square = raw_text.rfind("]")
+
+    candidates = []
+    if first_curly != -1 and last_curly != -1:
+        candidates.append((first_curly, last_curly))
+    if first_square != -1 and last_square != -1:
+        candidates.append((first_square, last_square))
+    if not candidates:
+        return raw_text
+
+    start, end = min(candidates, key=lambda x: x[0])
+    return raw_text[start:end + 1]
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randint(0, 5 if depth < 3 else 3)
+    if kind == 0:
+        return rng.randint(-1000, 1000)
+    if kind == 1:
+        return rng.choice([True, False, None, 1.5])
+    if kind in (2, 3):
+        # stringhe con parentesi, virgolette ed escape: non devono spostare i confini
+        return "".join(rng.choice(['a', ' ', '{', '}', '[', ']', '"', '\\', ',', 'è', '“']) for _ in range(rng.randint(0, 8)))
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+PROSE = ["", "Here is the result:\n", "Sure! ", "```json\n", "L'architettura proposta è questa.\n"]
+TRAILERS = ["", "\n", "\n```", "\nLet me know if you need changes.", " Hope it's useful."]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_previous_extraction_when_it_worked(seed):
+    rng = random.Random(seed)
+    document = rng.choice([
+        {f"k{i}": random_value(rng) for i in range(rng.randint(0, 5))},
+        [random_value(rng) for _ in range(rng.randint(0, 5))],
+    ])
+    raw = rng.choice(PROSE) + json.dumps(document, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2])) + rng.choice(TRAILERS)
+
+    expected = json.loads(previous_clean_raw_json(raw))
+    parsed, repairs = parse_llm_json(raw)
+
+    assert parsed == expected == document
+    assert repairs == []
+
+
+def test_braces_in_prose_before_the_document():
+    raw = 'The {architecture} is described below.\n{"name": "A1", "layers": ["ui", "core"]}'
+
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(previous_clean_raw_json(raw))
+    assert parse_llm_json(raw) == ({"name": "A1", "layers": ["ui", "core"]}, [])
+
+
+def test_second_document_after_the_first():
+    raw = '{"a": 1}\nAlternative:\n{"a": 2}'
+
+    assert parse_llm_json(raw) == ({"a": 1}, [])
+
+
+def test_inner_fragment_is_not_returned():
+    # il documento esterno non è JSON valido: non si ripiega su {"x": 1}
+    raw = '{"outer": {"x": 1} "missing comma": 2}'
+
+    with pytest.raises(json.JSONDecodeError):
+        parse_llm_json(raw)
+
+
+def test_expect_skips_documents_of_another_type():
+    raw = 'Components: ["A", "B"]\n{"components": ["A", "B"]}'
+
+    assert parse_llm_json(raw, expect=dict) == ({"components": ["A", "B"]}, [])
+    assert parse_llm_json(raw, expect=list) == (["A", "B"], [])
+
+
+def test_markdown_fence_inside_the_document():
+    raw = '{"a": [1,\n```\n2]}'
+
+    assert parse_llm_json(raw) == ({"a": [1, 2]}, ["markdown_fence"])
+
+
+def test_smart_quote_delimiters():
+    raw = '{“name”: “Layered”, "note": "uses “quotes” inside"}'
+
+    assert parse_llm_json(raw) == (
+        {"name": "Layered", "note": "uses “quotes” inside"}, ["smart_quotes"]
+    )
+
+
+def test_trailing_commas():
+    raw = '{"a": [1, 2, ], "b": {"c": "x,]"},\n}'
+
+    assert parse_llm_json(raw) == ({"a": [1, 2], "b": {"c": "x,]"}}, ["trailing_commas"])
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1, 2]}),
+    ('{"a": 1, "b": "trunc', {"a": 1, "b": "trunc"}),
+    ('{"a": 1, "b":', {"a": 1}),
+    ('Result: [{"id": "C1"}, {"id": "C2", "deps": ["C1",', [{"id": "C1"}, {"id": "C2", "deps": ["C1"]}]),
+])
+def test_truncated_output_is_closed(raw, expected):
+    parsed, repairs = parse_llm_json(raw)
+
+    assert parsed == expected
+    assert repairs[-1] == "unclosed_brackets"
+
+
+def test_truncated_document_is_preferred_to_its_fragments():
+    raw = 'Components:\n[{"id": "C1"}, {"id": "C2"}, {"id": "C3", "name": "Gat'
+
+    parsed, _ = parse_llm_json(raw)
+
+    assert parsed == [{"id": "C1"}, {"id": "C2"}, {"id": "C3", "name": "Gat"}]
+
+
+def test_complete_document_after_a_stray_opening_bracket():
+    raw = 'Fill in {placeholder as needed.\n{"a": 1}'
+
+    assert parse_llm_json(raw) == ({"a": 1}, [])
+
+
+def test_no_document_raises():
+    with pytest.raises(json.JSONDecodeError):
+        parse_llm_json("No JSON here, sorry.")
+
+
+def test_scan_ignores_brackets_inside_strings():
+    text = 'x {"a": "}]", "b": [1]} y'
+
+    assert scan_json_spans(text) == [(2, 22), (19, 21)]
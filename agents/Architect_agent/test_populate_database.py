@@ -0,0 +1,129 @@
+# test_populate_database.py
+# Diff degli id di ChromaSync su uno store Chroma reale (cartella temporanea),
+# con un embedding deterministico al posto del modello HuggingFace.
+import random
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import populate_database
+from populate_database import ChromaSync, calculate_chunk_ids, chunk_position
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    Embedding deterministico che conta i testi embeddati.
+    """
+
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        rng = random.Random(text)
+        return [rng.random() for _ in range(8)]
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    embedding_function = CountingEmbeddings()
+    monkeypatch.setattr(populate_database, "get_embedding_function", lambda: embedding_function)
+    return embedding_function
+
+
+def chunks_of(pages: dict[tuple[str, int], list[str]]) -> list[Document]:
+    return [
+        Document(page_content=text, metadata={"source": source, "page": page})
+        for (source, page), texts in pages.items()
+        for text in texts
+    ]
+
+
+def sync(chroma_path, pages, batch_size=3):
+    """
+    Una ingestion completa: un add() per PDF, come ingest_corpora.
+    """
+    sync = ChromaSync(chroma_path, batch_size=batch_size)
+    for source in dict.fromkeys(source for source, _ in pages):
+        sync.add(chunks_of({key: texts for key, texts in pages.items() if key[0] == source}))
+    return sync.finish()
+
+
+def store_contents(chroma_path) -> dict[str, str]:
+    store = populate_database.Chroma(
+        persist_directory=str(chroma_path), embedding_function=CountingEmbeddings()
+    ).get(include=["documents"])
+    return dict(zip(store["ids"], store["documents"]))
+
+
+def expected_contents(pages) -> dict[str, str]:
+    return {chunk.metadata["id"]: chunk.page_content for chunk in calculate_chunk_ids(chunks_of(pages))}
+
+
+def test_calculate_chunk_ids():
+    chunks = calculate_chunk_ids(chunks_of({("a.pdf", 0): ["x", "y"], ("a.pdf", 1): ["x"]}))
+    ids = [chunk.metadata["id"] for chunk in chunks]
+
+    assert [chunk_position(chunk_id) for chunk_id in ids] == ["a.pdf:0:0", "a.pdf:0:1", "a.pdf:1:0"]
+    # stesso contenuto, stesso hash; contenuto diverso, hash diverso
+    assert ids[0].rsplit(":", 1)[1] == ids[2].rsplit(":", 1)[1] != ids[1].rsplit(":", 1)[1]
+    assert len(ids[0].rsplit(":", 1)[1]) == 16
+
+
+def test_incremental_sync(tmp_path, embeddings):
+    pages = {
+        ("a.pdf", 0): ["a0-0", "a0-1", "a0-2"],
+        ("a.pdf", 1): ["a1-0"],
+        ("b.pdf", 0): ["b0-0", "b0-1"],
+    }
+    assert sync(tmp_path, pages) == {"added": 6, "updated": 0, "deleted": 0, "skipped": 0}
+    assert store_contents(tmp_path) == expected_contents(pages)
+
+    # seconda esecuzione identica: nessun embedding
+    embeddings.embedded.clear()
+    assert sync(tmp_path, pages) == {"added": 0, "updated": 0, "deleted": 0, "skipped": 6}
+    assert embeddings.embedded == []
+
+    # un chunk modificato, un chunk in meno, una pagina nuova, un PDF rimosso
+    pages = {
+        ("a.pdf", 0): ["a0-0", "a0-1 (edited)"],
+        ("a.pdf", 1): ["a1-0"],
+        ("a.pdf", 2): ["a2-0"],
+    }
+    embeddings.embedded.clear()
+    assert sync(tmp_path, pages) == {"added": 1, "updated": 1, "deleted": 3, "skipped": 2}
+    assert sorted(embeddings.embedded) == ["a0-1 (edited)", "a2-0"]
+    assert store_contents(tmp_path) == expected_contents(pages)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_corpus_versions_match_set_difference(tmp_path, embeddings, seed):
+    """
+    Dopo ogni ingestion lo store contiene esattamente i chunk correnti e
+    vengono embeddati solo gli id che non erano già nello store.
+    """
+    rng = random.Random(seed)
+    pages = {}
+    stored: dict[str, str] = {}
+
+    for _ in range(5):
+        pages = {
+            (f"doc{d}.pdf", page): [f"text {rng.randint(0, 3)}" for _ in range(rng.randint(0, 4))]
+            for d in range(rng.randint(0, 3))
+            for page in range(rng.randint(1, 3))
+        }
+        expected = expected_contents(pages)
+
+        embeddings.embedded.clear()
+        summary = sync(tmp_path, pages, batch_size=rng.randint(1, 5))
+
+        new_ids = expected.keys() - stored.keys()
+        assert sorted(embeddings.embedded) == sorted(expected[chunk_id] for chunk_id in new_ids)
+        assert summary["added"] + summary["updated"] == len(new_ids)
+        assert summary["skipped"] == len(expected.keys() & stored.keys())
+        assert store_contents(tmp_path) == expected
+        stored = expected
@@ -0,0 +1,161 @@
+# test_view_validation.py
+import copy
+
+import pytest
+
+from view_validation import REQUIRED_VIEWS, decomposition_component_ids, validate_views_structure
+
+DECOMPOSITION = {
+    "architecture_id": "A1",
+    "views": {"component_view": {"components": [
+        {"id": "Gateway"}, {"id": "Orders"}, {"name": "OrdersDB"}
+    ]}},
+}
+
+VIEWS = {
+    "architecture_id": "A1",
+    "views": {
+        "context_view": {
+            "actors": [{"id": "Customer"}],
+            "external_systems": ["PaymentProvider"],
+        },
+        "logical_view": {
+            "components": [{"id": "Gateway"}, {"id": "Orders"}, "OrdersDB"],
+            "connectors": [
+                {"from": "Customer", "to": "Gateway"},
+                {"source": "Gateway", "target": "Orders"},
+                {"caller": "Orders", "callee": ["OrdersDB", "PaymentProvider"]},
+            ],
+        },
+        "runtime_view": {"scenarios": [
+            {"name": "checkout", "participants": ["Customer", "Gateway", {"id": "Orders"}]},
+        ]},
+        "deployment_view": {
+            "nodes": [{"id": "edge"}, {"name": "app"}, "db"],
+            "component_mapping": {"Gateway": "edge", "Orders": ["app"], "db": ["OrdersDB"]},
+        },
+        "security_view": {"trust_boundaries": [], "threats": [], "countermeasures": []},
+    },
+}
+
+
+def views_with(**changes):
+    """
+    Copia di VIEWS con le modifiche indicate come vista__campo=valore
+    (None elimina il campo).
+    """
+    views = copy.deepcopy(VIEWS)
+    for path, value in changes.items():
+        view, field = path.split("__")
+        if value is None:
+            del views["views"][view][field]
+        else:
+            views["views"][view][field] = value
+    return views
+
+
+def test_decomposition_component_ids():
+    assert decomposition_component_ids(DECOMPOSITION) == ["Gateway", "Orders", "OrdersDB"]
+    assert decomposition_component_ids({}) == []
+
+
+def test_valid_views_have_no_errors():
+    assert validate_views_structure(VIEWS, DECOMPOSITION) == []
+
+
+def test_component_mapping_as_list():
+    views = views_with(deployment_view__component_mapping=[
+        {"component": "Gateway", "node": "edge"},
+        {"component": {"id": "Orders"}, "nodes": ["app"]},
+        {"node": "db", "components": ["OrdersDB"]},
+    ])
+
+    assert validate_views_structure(views, DECOMPOSITION) == []
+
+
+def test_not_an_object():
+    assert validate_views_structure(["A1"], DECOMPOSITION) == [
+        "The output must be a JSON object following the schema"
+    ]
+
+
+def test_missing_views_object_and_wrong_architecture_id():
+    errors = validate_views_structure({"architecture_id": "A2"}, DECOMPOSITION)
+
+    assert errors == [
+        "architecture_id must be exactly 'A1' (got 'A2')",
+        "Missing 'views' object",
+    ]
+
+
+@pytest.mark.parametrize("view_name", list(REQUIRED_VIEWS))
+def test_missing_view(view_name):
+    views = copy.deepcopy(VIEWS)
+    del views["views"][view_name]
+
+    assert validate_views_structure(views, DECOMPOSITION) == [f"Missing view '{view_name}'"]
+
+
+def test_schema_errors_stop_cross_checks():
+    views = views_with(
+        logical_view__connectors=None,
+        runtime_view__scenarios={"checkout": []},
+        deployment_view__component_mapping="Gateway->edge",
+    )
+    views["views"]["security_view"] = []
+    # componente sconosciuto: non segnalato finché lo schema non è corretto
+    views["views"]["logical_view"]["components"].append("Unknown")
+
+    assert validate_views_structure(views, DECOMPOSITION) == [
+        "Missing field 'logical_view.connectors'",
+        "'runtime_view.scenarios' must be a list",
+        "'deployment_view.component_mapping' must be an object or a list",
+        "'security_view' must be an object",
+    ]
+
+
+def test_logical_view_components_must_match_step_3():
+    views = views_with(logical_view__components=["Gateway", "Gateway", "Cache", {"type": "db"}])
+    views["views"]["deployment_view"]["component_mapping"] = {"Gateway": "edge", "Orders": "app", "OrdersDB": "db"}
+
+    assert validate_views_structure(views, DECOMPOSITION) == [
+        "Every logical_view component must have an 'id'",
+        "logical_view introduces components not in the Step 3 component view: ['Cache']. "
+        "Allowed ids: ['Gateway', 'Orders', 'OrdersDB']",
+        "logical_view is missing Step 3 components: ['Orders', 'OrdersDB']",
+        "logical_view lists components more than once: ['Gateway']",
+    ]
+
+
+def test_unknown_references():
+    views = views_with(
+        logical_view__connectors=[{"from": "Gateway", "to": ["Orders", "Billing"]}, "free text"],
+        runtime_view__scenarios=[{"components": "Mailer"}, "free text"],
+        deployment_view__component_mapping={
+            "Gateway": "edge", "Orders": "cloud", "db": ["OrdersDB", "Cache"], "Queue": "app"
+        },
+    )
+
+    assert validate_views_structure(views, DECOMPOSITION) == [
+        "logical_view.connectors[0].to references unknown id 'Billing'",
+        "runtime_view.scenarios[0].components references unknown id 'Mailer'",
+        "deployment_view maps 'Orders' to unknown node 'cloud'",
+        "deployment_view maps node 'db' to unknown component 'Cache'",
+        "deployment_view.component_mapping references unknown id 'Queue'",
+    ]
+
+
+def test_unmapped_components():
+    views = views_with(deployment_view__component_mapping={"Gateway": "edge"})
+
+    assert validate_views_structure(views, DECOMPOSITION) == [
+        "deployment_view does not map Step 3 components: ['Orders', 'OrdersDB']"
+    ]
+
+
+def test_decomposition_without_architecture_id_accepts_any_id():
+    decomposition = {k: v for k, v in DECOMPOSITION.items() if k != "architecture_id"}
+    views = copy.deepcopy(VIEWS)
+    views["architecture_id"] = "whatever"
+
+    assert validate_views_structure(views, decomposition) == []
@@ -0,0 +1,35 @@
+# timing.py
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    Tempi cumulati per fase della pipeline (step, retrieval, parsing, ...).
+
+    Le fasi possono annidarsi e sovrapporsi (es. retrieval dentro uno step,
+    task concorrenti): ogni fase somma la durata delle proprie misure.
+    """
+
+    def __init__(self):
+        self.totals: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[stage] = self.totals.get(stage, 0.0) + time.perf_counter() - start
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def reset(self) -> None:
+        self.totals.clear()
+        self.counts.clear()
+
+    def report(self) -> dict:
+        return {
+            stage: {"seconds": round(seconds, 4), "calls": self.counts[stage]}
+            for stage, seconds in self.totals.items()
+        }
@@ -1,65 +1,202 @@
 # utils.py
 from langchain_community.vectorstores import Chroma
+import hashlib
+import json
+import os
+import threading
 import yaml
 
+from json_repair import parse_llm_json
+from prompt_budget import join_chunks
+from retrieval_cache import get_retrieval_cache
+
+# Pool di vector store condivisi a livello di processo:
+# ogni persist_directory viene aperta una sola volta (una connessione
+# SQLite e un indice HNSW per path) e riusata da tutti gli step/agenti.
+_STORE_POOL: dict[tuple[str, str], Chroma] = {}
+_STORE_POOL_LOCK = threading.Lock()
+# Fingerprint dei contenuti per store: path -> (stato dello store, fingerprint)
+_STORE_FINGERPRINTS: dict[str, tuple[tuple, str]] = {}
+# File SQLite scritti da Chroma nella persist_directory (database e WAL)
+CHROMA_SQLITE_FILES = ("chroma.sqlite3", "chroma.sqlite3-wal")
+
 def clean_raw_json(raw_text: str) -> str:
     """
-    Rimuove testo prima/dopo un JSON valido.
-    Supporta sia {} che [].
+    Restituisce il primo documento JSON valido in raw_text ({} o []),
+    già riparato da parse_llm_json. Se non ne trova, restituisce il
+    testo originale (json.loads solleverà l'errore come prima).
+    """
+    try:
+        parsed, _ = parse_llm_json(raw_text)
+    except json.JSONDecodeError:
+        return raw_text.strip()
+    return json.dumps(parsed, ensure_ascii=False)
+
+
+def _embedding_key(embedding_function) -> str:
+    """
+    Identifica il modello di embedding associato a uno store (e se passa
+    dalla cache degli embedding: CachedEmbeddings o modello diretto).
     """
-    raw_text = raw_text.strip()
+    model_name = getattr(embedding_function, "model_name", "")
+    return f"{type(embedding_function).__name__}:{model_name}"
 
-    first_curly = raw_text.find("{")
-    last_curly = raw_text.rfind("}")
 
-    first_square = raw_text.find("[")
-    last_square = raw_text.rfind("]")
+def get_vector_store(embedding_function, chroma_path: str) -> Chroma:
+    """
+    Restituisce lo store Chroma condiviso per chroma_path, aprendolo
+    solo alla prima richiesta nel processo.
+    """
+    key = (os.path.abspath(chroma_path), _embedding_key(embedding_function))
+
+    store = _STORE_POOL.get(key)
+    if store is not None:
+        return store
 
-    candidates = []
+    with _STORE_POOL_LOCK:
+        store = _STORE_POOL.get(key)
+        if store is None:
+            store = Chroma(
+                persist_directory=chroma_path,
+                embedding_function=embedding_function
+            )
+            _STORE_POOL[key] = store
 
-    if first_curly != -1 and last_curly != -1:
-        candidates.append((first_curly, last_curly))
+    return store
 
-    if first_square != -1 and last_square != -1:
-        candidates.append((first_square, last_square))
 
-    if not candidates:
-        return raw_text
+def close_vector_stores(chroma_path: str | None = None) -> None:
+    """
+    Rimuove dal pool gli store aperti (tutti, oppure solo quelli di chroma_path).
+    Da usare dopo una re-ingestion, così la richiesta successiva riapre lo store.
+    """
+    target = os.path.abspath(chroma_path) if chroma_path else None
 
-    start, end = min(candidates, key=lambda x: x[0])
-    return raw_text[start:end + 1]
+    with _STORE_POOL_LOCK:
+        for key in list(_STORE_POOL):
+            if target is None or key[0] == target:
+                del _STORE_POOL[key]
+                _STORE_FINGERPRINTS.pop(key[0], None)
 
 
-def load_knowledge(
+def _sqlite_state(chroma_path: str) -> tuple:
+    """
+    mtime e dimensione dei file SQLite dello store: cambiano a ogni
+    scrittura, anche quando il numero di chunk resta lo stesso.
+    """
+    state = []
+    for name in CHROMA_SQLITE_FILES:
+        try:
+            st = os.stat(os.path.join(chroma_path, name))
+        except OSError:
+            state.append(None)
+            continue
+        state.append((st.st_mtime_ns, st.st_size))
+    return tuple(state)
+
+
+def store_fingerprint(embedding_function, chroma_path: str) -> str:
+    """
+    Fingerprint del contenuto di uno store Chroma.
+
+    Il numero di chunk (una COUNT su SQLite) e lo stato dei file SQLite
+    (mtime e dimensione) sono letti ad ogni chiamata; l'hash degli id
+    viene ricalcolato solo quando uno dei due cambia. Così anche un
+    aggiornamento che sostituisce chunk senza cambiarne il numero
+    (delete del vecchio id + add del nuovo) produce un nuovo fingerprint.
+    """
+    db = get_vector_store(embedding_function, chroma_path)
+    path = os.path.abspath(chroma_path)
+    state = (db._collection.count(), _sqlite_state(path))
+
+    cached = _STORE_FINGERPRINTS.get(path)
+    if cached is not None and cached[0] == state:
+        return cached[1]
+
+    ids = sorted(db.get(include=[])["ids"])
+    digest = hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+    fingerprint = f"{state[0]}:{digest[:16]}"
+    _STORE_FINGERPRINTS[path] = (state, fingerprint)
+    return fingerprint
+
+
+def retrieve_chunks(
     embedding_function,
     chroma_path: str,
     query: str,
-    k: int
-) -> tuple[str, list[str]]:
+    k: int,
+    use_cache: bool = True
+) -> list[tuple[str, dict, float]]:
     """
-    Retrieves context and sources from a Chroma vector store.
+    Esegue la similarity search e restituisce (page_content, metadata, score).
+    I risultati passano dalla RetrievalCache, invalidata dal fingerprint dello store.
     """
-    db = Chroma(
-        persist_directory=chroma_path,
-        embedding_function=embedding_function
-    )
+    store = os.path.abspath(chroma_path)
+    fingerprint = store_fingerprint(embedding_function, chroma_path) if use_cache else None
+
+    if use_cache:
+        cached = get_retrieval_cache().get(store, fingerprint, query, k)
+        if cached is not None:
+            return [tuple(r) for r in cached]
+
+    db = get_vector_store(embedding_function, chroma_path)
+    results = [
+        (doc.page_content, doc.metadata, float(score))
+        for doc, score in db.similarity_search_with_score(query, k=k)
+    ]
 
-    results = db.similarity_search_with_score(query, k=k)
+    if use_cache and results:
+        get_retrieval_cache().put(store, fingerprint, query, k, results)
+
+    return results
+
+
+def load_knowledge_chunks(
+    embedding_function,
+    chroma_path: str,
+    query: str,
+    k: int,
+    use_cache: bool = True
+) -> list[tuple[str, dict, float]]:
+    """
+    Retrieves scored chunks (page_content, metadata, score) from a Chroma vector store.
+    """
+    results = retrieve_chunks(embedding_function, chroma_path, query, k, use_cache=use_cache)
 
     if not results:
         raise RuntimeError("❌ No relevant knowledge found in Chroma")
 
-    context = "\n\n---\n\n".join(doc.page_content for doc, _ in results)
-
     sources = [
-        f"{doc.metadata.get('source', 'Unknown')} - page {doc.metadata.get('page', '?')}"
-        for doc, _ in results
+        f"{metadata.get('source', 'Unknown')} - page {metadata.get('page', '?')}"
+        for _, metadata, _ in results
     ]
 
     print("\nSources:")
     for s in sources:
         print(f"- {s}")
 
+    return results
+
+
+def load_knowledge(
+    embedding_function,
+    chroma_path: str,
+    query: str,
+    k: int,
+    use_cache: bool = True
+) -> tuple[str, list[str]]:
+    """
+    Retrieves context and sources from a Chroma vector store.
+    """
+    results = load_knowledge_chunks(embedding_function, chroma_path, query, k, use_cache=use_cache)
+
+    context = join_chunks(results)
+
+    sources = [
+        f"{metadata.get('source', 'Unknown')} - page {metadata.get('page', '?')}"
+        for _, metadata, _ in results
+    ]
+
     return context, sources
 
 
@@ -0,0 +1,201 @@
+# view_validation.py
+
+# Viste richieste dallo Step 4 e, per ognuna, i campi obbligatori con il tipo atteso
+REQUIRED_VIEWS = {
+    "context_view": {"actors": list, "external_systems": list},
+    "logical_view": {"components": list, "connectors": list},
+    "runtime_view": {"scenarios": list},
+    "deployment_view": {"nodes": list, "component_mapping": (dict, list)},
+    "security_view": {"trust_boundaries": list, "threats": list, "countermeasures": list},
+}
+
+# Chiavi che nei connettori / scenari indicano un componente referenziato
+ENDPOINT_KEYS = (
+    "from", "to", "source", "target", "source_component", "target_component",
+    "consumer", "provider", "caller", "callee",
+)
+PARTICIPANT_KEYS = ("components", "participants")
+
+_TYPE_NAMES = {list: "a list", dict: "an object", (dict, list): "an object or a list"}
+
+
+def _element_id(element) -> str | None:
+    """
+    Identificativo di un elemento (componente, nodo, attore) scritto come
+    stringa oppure come oggetto con id/name.
+    """
+    if isinstance(element, str):
+        return element
+    if isinstance(element, dict):
+        value = element.get("id") or element.get("name")
+        return value if isinstance(value, str) else None
+    return None
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def decomposition_component_ids(component_decomposition: dict) -> list[str]:
+    components = (
+        component_decomposition.get("views", {})
+        .get("component_view", {})
+        .get("components", [])
+    )
+    return [cid for cid in (_element_id(c) for c in components) if cid]
+
+
+def validate_views_structure(views, component_decomposition: dict) -> list[str]:
+    """
+    Validazione deterministica delle viste dello Step 4, prima del
+    validatore LLM.
+
+    Controlla lo schema (viste e campi obbligatori con il tipo corretto)
+    e i riferimenti incrociati con la component decomposition dello Step 3:
+    - architecture_id coerente con la decomposition
+    - logical_view con esattamente i componenti dello Step 3
+    - connettori, scenari runtime e component_mapping che referenziano
+      solo componenti, nodi, attori o sistemi esterni noti
+
+    Ritorna la lista degli errori (vuota se la struttura è valida); i
+    messaggi sono pensati per essere usati direttamente come feedback.
+    """
+    if not isinstance(views, dict):
+        return ["The output must be a JSON object following the schema"]
+
+    errors = []
+
+    expected_id = component_decomposition.get("architecture_id")
+    if expected_id and views.get("architecture_id") != expected_id:
+        errors.append(
+            f"architecture_id must be exactly '{expected_id}' (got '{views.get('architecture_id')}')"
+        )
+
+    body = views.get("views")
+    if not isinstance(body, dict):
+        return errors + ["Missing 'views' object"]
+
+    for view_name, fields in REQUIRED_VIEWS.items():
+        view = body.get(view_name)
+        if view is None:
+            errors.append(f"Missing view '{view_name}'")
+            continue
+        if not isinstance(view, dict):
+            errors.append(f"'{view_name}' must be an object")
+            continue
+        for field, expected_type in fields.items():
+            if field not in view:
+                errors.append(f"Missing field '{view_name}.{field}'")
+            elif not isinstance(view[field], expected_type):
+                errors.append(f"'{view_name}.{field}' must be {_TYPE_NAMES[expected_type]}")
+
+    if errors:
+        # I controlli incrociati presuppongono uno schema corretto
+        return errors
+
+    known_components = decomposition_component_ids(component_decomposition)
+    component_set = set(known_components)
+
+    context_view = body["context_view"]
+    external = {
+        eid for eid in (
+            _element_id(e) for e in context_view["actors"] + context_view["external_systems"]
+        ) if eid
+    }
+
+    # --- Logical view: stessi componenti dello Step 3 ---
+    logical_ids = []
+    for component in body["logical_view"]["components"]:
+        cid = _element_id(component)
+        if cid is None:
+            errors.append("Every logical_view component must have an 'id'")
+        else:
+            logical_ids.append(cid)
+
+    unknown = [cid for cid in logical_ids if cid not in component_set]
+    if unknown:
+        errors.append(
+            f"logical_view introduces components not in the Step 3 component view: {unknown}. "
+            f"Allowed ids: {known_components}"
+        )
+    missing = [cid for cid in known_components if cid not in logical_ids]
+    if missing:
+        errors.append(f"logical_view is missing Step 3 components: {missing}")
+    duplicated = sorted({cid for cid in logical_ids if logical_ids.count(cid) > 1})
+    if duplicated:
+        errors.append(f"logical_view lists components more than once: {duplicated}")
+
+    # --- Connettori ---
+    referable = component_set | external
+    for index, connector in enumerate(body["logical_view"]["connectors"]):
+        if not isinstance(connector, dict):
+            continue
+        for key in ENDPOINT_KEYS:
+            if key not in connector:
+                continue
+            for ref in _as_list(connector[key]):
+                ref_id = _element_id(ref)
+                if ref_id is not None and ref_id not in referable:
+                    errors.append(
+                        f"logical_view.connectors[{index}].{key} references unknown id '{ref_id}'"
+                    )
+
+    # --- Runtime view ---
+    for index, scenario in enumerate(body["runtime_view"]["scenarios"]):
+        if not isinstance(scenario, dict):
+            continue
+        for key in PARTICIPANT_KEYS:
+            for ref in _as_list(scenario.get(key, [])):
+                ref_id = _element_id(ref)
+                if ref_id is not None and ref_id not in referable:
+                    errors.append(
+                        f"runtime_view.scenarios[{index}].{key} references unknown id '{ref_id}'"
+                    )
+
+    # --- Deployment view ---
+    deployment = body["deployment_view"]
+    nodes = {nid for nid in (_element_id(n) for n in deployment["nodes"]) if nid}
+    mapping = deployment["component_mapping"]
+    if isinstance(mapping, list):
+        # forma a lista: [{"component": ..., "node": ...}] o [{"node": ..., "components": [...]}]
+        pairs = []
+        for entry in mapping:
+            if not isinstance(entry, dict):
+                continue
+            node = entry.get("node") or entry.get("nodes")
+            if "component" in entry:
+                pairs.append((_element_id(entry["component"]), node))
+            elif "components" in entry:
+                pairs.append((_element_id(node), entry["components"]))
+    else:
+        pairs = list(mapping.items())
+
+    mapped = set()
+    for key, value in pairs:
+        if key is None:
+            continue
+        if key in component_set:
+            # component -> nodo/i
+            mapped.add(key)
+            for node in _as_list(value):
+                node_id = _element_id(node)
+                if node_id is not None and nodes and node_id not in nodes:
+                    errors.append(f"deployment_view maps '{key}' to unknown node '{node_id}'")
+        elif key in nodes:
+            # nodo -> componente/i
+            for ref in _as_list(value):
+                ref_id = _element_id(ref)
+                if ref_id is None:
+                    continue
+                if ref_id in component_set:
+                    mapped.add(ref_id)
+                else:
+                    errors.append(f"deployment_view maps node '{key}' to unknown component '{ref_id}'")
+        else:
+            errors.append(f"deployment_view.component_mapping references unknown id '{key}'")
+
+    unmapped = [cid for cid in known_components if cid not in mapped]
+    if unmapped:
+        errors.append(f"deployment_view does not map Step 3 components: {unmapped}")
+
+    return errors
@@ -0,0 +1,6 @@
+# agent_common: moduli condivisi da Architect_agent e tradeoff_agent.
+#
+# I due agenti girano come processi separati con radici di import diverse
+# (moduli piatti in Architect_agent, agents.* / rag.* in tradeoff_agent):
+# ogni agente espone questi moduli tramite un modulo omonimo che aggiunge
+# la cartella agents/ a sys.path e li re-esporta.
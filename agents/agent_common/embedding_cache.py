@@ -0,0 +1,219 @@
+# agent_common/embedding_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "agents_embeddings")
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizza il testo della query: il tokenizer di MiniLM ignora
+    spazi multipli e indentazione, quindi due query che differiscono
+    solo per whitespace producono lo stesso vettore.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrapper content-addressed attorno a un embedding model.
+
+    - le query sono indicizzate per sha256(model_name, testo normalizzato)
+    - i vettori recenti restano in una LRU in memoria (max_memory_entries)
+    - tutti i vettori sono scritti in un file memory-mapped su disco
+      (vectors.f32, capacity x dim) con indice SQLite key -> slot,
+      così un riavvio del processo trova la cache già calda.
+
+    Architect_agent e tradeoff_agent usano questa stessa implementazione:
+    agenti che usano lo stesso modello condividono la stessa directory.
+    embed_documents (ingestion) non passa dalla cache.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        cache_dir: str | None = DEFAULT_CACHE_DIR,
+        max_memory_entries: int = 2048,
+        disk_capacity: int = 65536
+    ):
+        self.base = base
+        self.model_name = getattr(base, "model_name", type(base).__name__)
+        self.max_memory_entries = max_memory_entries
+        self.disk_capacity = disk_capacity
+
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._dim = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._dir = None
+        self._conn = None
+        if cache_dir:
+            slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.model_name)
+            self._dir = os.path.join(cache_dir, slug)
+            os.makedirs(self._dir, exist_ok=True)
+            self._conn = sqlite3.connect(
+                os.path.join(self._dir, "index.sqlite3"),
+                timeout=30,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_access REAL NOT NULL)"
+            )
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            if row is not None:
+                self._open_vectors(row[0])
+
+    # --------------------------------------------------
+    # Disk layer
+    # --------------------------------------------------
+    def _open_vectors(self, dim: int) -> None:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'capacity'").fetchone()
+        capacity = row[0] if row is not None else self.disk_capacity
+        path = os.path.join(self._dir, "vectors.f32")
+        mode = "r+" if os.path.exists(path) else "w+"
+        self._vectors = np.memmap(path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self._dim = dim
+        self.disk_capacity = capacity
+
+    def _disk_get(self, key: str) -> list[float] | None:
+        if self._conn is None or self._vectors is None:
+            return None
+        row = self._conn.execute("SELECT slot FROM vectors WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE vectors SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        return self._vectors[row[0]].tolist()
+
+    def _disk_put(self, key: str, vector: list[float]) -> None:
+        if self._conn is None:
+            return
+
+        # BEGIN IMMEDIATE: l'allocazione degli slot è serializzata anche tra processi
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._vectors is None:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (len(vector),)
+                )
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO meta (name, value) VALUES ('capacity', ?)",
+                    (self.disk_capacity,)
+                )
+                dim = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()[0]
+                self._open_vectors(dim)
+
+            if len(vector) != self._dim:
+                self._conn.execute("ROLLBACK")
+                return
+
+            row = self._conn.execute("SELECT slot FROM vectors WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                slot = row[0]
+            else:
+                used = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+                if used < self.disk_capacity:
+                    slot = self._conn.execute(
+                        "SELECT COALESCE(MAX(slot) + 1, 0) FROM vectors"
+                    ).fetchone()[0]
+                else:
+                    # Eviction LRU: riusa lo slot della entry meno recente
+                    lru_key, slot = self._conn.execute(
+                        "SELECT key, slot FROM vectors ORDER BY last_access ASC LIMIT 1"
+                    ).fetchone()
+                    self._conn.execute("DELETE FROM vectors WHERE key = ?", (lru_key,))
+
+            self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+            self._vectors.flush()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vectors (key, slot, last_access) VALUES (?, ?, ?)",
+                (key, slot, time.time())
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    # --------------------------------------------------
+    # Embeddings interface
+    # --------------------------------------------------
+    def _key(self, text: str) -> str:
+        payload = f"{self.model_name}\0{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            vector = self._disk_get(key)
+            if vector is not None:
+                self._remember(key, vector)
+                self.hits += 1
+                self.disk_hits += 1
+                return vector
+
+        vector = self.base.embed_query(text)
+
+        with self._lock:
+            self.misses += 1
+            self._remember(key, vector)
+            self._disk_put(key, vector)
+
+        return vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.base.embed_documents(texts)
+
+    def warm_up(self):
+        """
+        Avvia il caricamento in background del modello, se è lazy (LazyEmbeddings).
+        """
+        warm_up = getattr(self.base, "warm_up", None)
+        return warm_up() if warm_up is not None else None
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "model_loaded": getattr(self.base, "loaded", True),
+            "model_load_s": getattr(self.base, "load_seconds", None)
+        }
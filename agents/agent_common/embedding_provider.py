@@ -0,0 +1,153 @@
+# agent_common/embedding_provider.py
+import os
+import threading
+import time
+from typing import Callable
+
+from langchain_core.embeddings import Embeddings
+
+from .embedding_cache import CachedEmbeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def load_huggingface_embeddings(model_name: str) -> Embeddings:
+    """
+    Loader di default: langchain_huggingface se installato, altrimenti
+    langchain_community.
+    """
+    try:
+        from langchain_huggingface import HuggingFaceEmbeddings
+    except ImportError:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+# Provider condivisi a livello di processo: model_name -> embeddings con cache
+_PROVIDERS: dict[str, CachedEmbeddings] = {}
+_PROVIDERS_LOCK = threading.Lock()
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embedding model caricato al primo utilizzo.
+
+    L'import di sentence-transformers/torch e il caricamento dei pesi
+    avvengono solo alla prima embed_query/embed_documents: le query già
+    presenti nella cache degli embedding non caricano mai il modello.
+    warm_up() anticipa il caricamento su un thread in background.
+    loader(model_name) crea il modello (ogni agente usa il proprio
+    pacchetto langchain).
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, loader: Callable[[str], Embeddings] | None = None):
+        self.model_name = model_name
+        self.loader = loader or load_huggingface_embeddings
+        self.load_seconds: float | None = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._warm_up_thread: threading.Thread | None = None
+
+    def _load_model(self) -> Embeddings:
+        return self.loader(self.model_name)
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            # Se il warm-up è in corso si attende che finisca invece di caricare due volte
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = self._load_model()
+                    self.load_seconds = time.perf_counter() - start
+                    print(f"🧠 Embedding model {self.model_name} caricato in {self.load_seconds:.1f}s")
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def parameters_bytes(self) -> int | None:
+        """
+        Memoria occupata dai pesi del modello (None se non ancora caricato).
+        """
+        client = getattr(self._model, "client", None)
+        parameters = getattr(client, "parameters", None)
+        if parameters is None:
+            return None
+        return sum(p.numel() * p.element_size() for p in parameters())
+
+    def warm_up(self) -> threading.Thread | None:
+        if self.loaded or self._warm_up_thread is not None:
+            return self._warm_up_thread
+        self._warm_up_thread = threading.Thread(
+            target=lambda: self.model, name="embedding-warm-up", daemon=True
+        )
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.model.embed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.model.embed_documents(texts)
+
+
+def get_embedding_function(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    loader: Callable[[str], Embeddings] | None = None
+) -> CachedEmbeddings:
+    """
+    Restituisce il provider di embedding condiviso per model_name.
+
+    Ogni modello viene creato una sola volta per processo (e caricato al
+    primo utilizzo), poi riusato da agenti, KnowledgeBase e store Chroma.
+    Il provider è thread-safe: il caricamento è protetto da lock e la cache
+    delle query ha il proprio lock. loader è usato solo alla creazione
+    del provider.
+    """
+    with _PROVIDERS_LOCK:
+        provider = _PROVIDERS.get(model_name)
+        if provider is None:
+            provider = CachedEmbeddings(LazyEmbeddings(model_name, loader))
+            _PROVIDERS[model_name] = provider
+        return provider
+
+
+def _process_rss_bytes() -> int | None:
+    """
+    Resident set size corrente del processo.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def embedding_provider_stats() -> dict:
+    """
+    Stato dei provider condivisi: modelli caricati, tempo di caricamento,
+    memoria dei pesi e resident memory del processo.
+    """
+    def to_mb(value):
+        return round(value / (1024 * 1024), 1) if value is not None else None
+
+    with _PROVIDERS_LOCK:
+        providers = dict(_PROVIDERS)
+
+    return {
+        "process_rss_mb": to_mb(_process_rss_bytes()),
+        "models": {
+            name: {
+                **provider.stats(),
+                "parameters_mb": to_mb(provider.base.parameters_bytes())
+            }
+            for name, provider in providers.items()
+        }
+    }
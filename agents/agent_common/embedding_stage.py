@@ -0,0 +1,115 @@
+# agent_common/embedding_stage.py
+import os
+import sys
+import time
+
+from langchain_core.documents import Document
+
+
+def configure_threads(num_threads: int | None) -> None:
+    """
+    Imposta il numero di thread usati da torch e dalle librerie BLAS.
+    Le variabili d'ambiente valgono per le librerie non ancora inizializzate,
+    torch.set_num_threads anche a runtime.
+    """
+    if not num_threads:
+        return
+
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(num_threads)
+
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
+class EmbeddingStage:
+    """
+    Stadio di embedding per l'ingestion della KB.
+
+    I chunk arrivano in streaming con submit(); appena il buffer raggiunge
+    batch_size il batch viene embeddato e scritto su Chroma (upsert con id
+    stabili), quindi in memoria restano al massimo batch_size chunk.
+    Ogni batch è persistito prima del successivo: se l'ingestion si
+    interrompe, la riesecuzione salta gli id già presenti e riprende
+    dal primo batch mancante.
+    """
+
+    def __init__(
+        self,
+        db,
+        embedding_function,
+        batch_size: int = 64,
+        report_every: float = 2.0,
+        label: str = ""
+    ):
+        self.db = db
+        self.embedding_function = embedding_function
+        self.batch_size = batch_size
+        self.report_every = report_every
+        self.label = label
+
+        self._buffer: list[Document] = []
+        self.written = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        self._start = None
+        self._last_report = 0.0
+
+    def submit(self, chunks: list[Document]) -> None:
+        for chunk in chunks:
+            self._buffer.append(chunk)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        if self._start is None:
+            self._start = time.perf_counter()
+
+        batch, self._buffer = self._buffer, []
+
+        t0 = time.perf_counter()
+        embeddings = self.embedding_function.embed_documents([chunk.page_content for chunk in batch])
+        t1 = time.perf_counter()
+        self.db._collection.upsert(
+            ids=[chunk.metadata["id"] for chunk in batch],
+            embeddings=embeddings,
+            metadatas=[chunk.metadata for chunk in batch],
+            documents=[chunk.page_content for chunk in batch]
+        )
+        t2 = time.perf_counter()
+
+        self.embed_seconds += t1 - t0
+        self.write_seconds += t2 - t1
+        self.written += len(batch)
+
+        if t2 - self._last_report >= self.report_every:
+            self._last_report = t2
+            self._report(live=True)
+
+    def _report(self, live: bool = False) -> None:
+        elapsed = time.perf_counter() - self._start if self._start else 0.0
+        rate = self.written / elapsed if elapsed else 0.0
+        line = (
+            f"🧠 {self.label} embedded {self.written} chunks "
+            f"({rate:.1f} chunks/s, embed {self.embed_seconds:.1f}s, write {self.write_seconds:.1f}s)"
+        )
+        if live and sys.stdout.isatty():
+            print(f"\r{line}", end="", flush=True)
+        else:
+            print(line)
+
+    def close(self) -> int:
+        """
+        Scrive l'ultimo batch parziale e stampa le metriche finali.
+        """
+        self._flush()
+        if self.written:
+            if sys.stdout.isatty():
+                print()
+            self._report()
+        return self.written
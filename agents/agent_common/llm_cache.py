@@ -0,0 +1,369 @@
+# agent_common/llm_cache.py
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+DEFAULT_CACHE_PATH = "cache/llm_cache.sqlite3"
+
+# Step della pipeline in esecuzione: usato per il bypass per-step e per le statistiche.
+# È un ContextVar, quindi i task concorrenti (asyncio.gather) ereditano lo step corretto.
+_CURRENT_STEP: ContextVar[Optional[str]] = ContextVar("llm_current_step", default=None)
+
+
+def current_step() -> Optional[str]:
+    return _CURRENT_STEP.get()
+
+
+def llm_step(step: str):
+    """
+    Decoratore per i metodi async degli agenti: marca tutte le chiamate
+    al modello eseguite dentro il metodo come appartenenti a `step`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = _CURRENT_STEP.set(step)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _CURRENT_STEP.reset(token)
+        return wrapper
+    return decorator
+
+
+def _model_name(client: ChatCompletionClient) -> str:
+    create_args = getattr(client, "_create_args", None) or {}
+    return create_args.get("model") or getattr(client, "model", None) or type(client).__name__
+
+
+def _sampling_params(client: ChatCompletionClient) -> dict:
+    create_args = getattr(client, "_create_args", None) or {}
+    return {k: v for k, v in create_args.items() if k != "model"}
+
+
+def model_identity(client: ChatCompletionClient) -> dict:
+    """
+    Modello e parametri di sampling che producono le risposte di client
+    (quelli del client interno se è un CachedChatCompletionClient).
+    Da includere nelle chiavi degli output salvati, es. i checkpoint.
+    """
+    while isinstance(client, CachedChatCompletionClient):
+        client = client.client
+    return {"model": _model_name(client), "sampling": _sampling_params(client)}
+
+
+class CachedChatCompletionClient(ChatCompletionClient):
+    """
+    Wrapper di un ChatCompletionClient che riusa le risposte del modello.
+
+    La chiave è l'hash di (model name, messaggi – system message incluso –,
+    parametri di sampling del client, extra_create_args, json_output, tools).
+    Le risposte sono salvate in SQLite con:
+    - TTL (ttl_seconds): le entry più vecchie vengono scartate alla lettura
+    - limite di entry e di byte, con eviction LRU su last_access
+    - bypass per step (bypass_steps): la cache non viene letta, ma la
+      risposta fresca sostituisce quella salvata
+
+    Le statistiche includono hit/miss e la latenza risparmiata, cioè la
+    durata originale delle chiamate servite dalla cache.
+    """
+
+    def __init__(
+        self,
+        client: ChatCompletionClient,
+        db_path: str = DEFAULT_CACHE_PATH,
+        ttl_seconds: float | None = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        max_bytes: int = 256 * 1024 * 1024,
+        bypass_steps: Sequence[str] = ()
+    ):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bypass_steps = set(bypass_steps)
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_latency = 0.0
+        self.step_stats: dict[str, dict[str, int]] = {}
+
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                step TEXT,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                latency REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)"
+        )
+        self._conn.commit()
+
+    # --------------------------------------------------
+    # Cache store
+    # --------------------------------------------------
+    def _key(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema],
+        json_output: Optional[bool | type[BaseModel]],
+        extra_create_args: Mapping[str, Any]
+    ) -> str:
+        if isinstance(json_output, type) and issubclass(json_output, BaseModel):
+            json_output = json.dumps(json_output.model_json_schema())
+
+        data = {
+            "model": _model_name(self.client),
+            "sampling": _sampling_params(self.client),
+            "messages": [message.model_dump(mode="json") for message in messages],
+            "tools": [(tool.schema if isinstance(tool, Tool) else tool) for tool in tools],
+            "json_output": json_output,
+            "extra_create_args": dict(extra_create_args),
+        }
+        serialized = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def _count(self, step: Optional[str], outcome: str) -> None:
+        stats = self.step_stats.setdefault(step or "unknown", {"hits": 0, "misses": 0, "bypassed": 0})
+        stats[outcome] += 1
+
+    def _lookup(self, key: str) -> Optional[CreateResult]:
+        step = current_step()
+
+        if step in self.bypass_steps:
+            self.bypassed += 1
+            self._count(step, "bypassed")
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, latency, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl_seconds is not None and now - row[2] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                self._count(step, "misses")
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        self.hits += 1
+        self.saved_latency += row[1]
+        self._count(step, "hits")
+
+        result = CreateResult.model_validate(json.loads(row[0]))
+        result.cached = True
+        return result
+
+    def _store(self, key: str, result: CreateResult, latency: float, replace: bool = True) -> None:
+        """
+        Salva la risposta. Con replace=False una entry ancora valida (non
+        scaduta) per la stessa chiave viene lasciata intatta: latenza e
+        created_at restano quelli della chiamata originale.
+        """
+        payload = json.dumps(result.model_dump(mode="json"), ensure_ascii=False)
+        now = time.time()
+
+        with self._lock:
+            if not replace:
+                row = self._conn.execute(
+                    "SELECT created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and (self.ttl_seconds is None or now - row[0] <= self.ttl_seconds):
+                    return
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, step, result, size, latency, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, current_step(), payload, len(payload), latency, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """
+        Eviction LRU finché la cache rispetta max_entries e max_bytes.
+        """
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY last_access ASC"
+        ).fetchall()
+        stale = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            stale.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_latency_s": round(self.saved_latency, 2),
+            "per_step": self.step_stats
+        }
+
+    # --------------------------------------------------
+    # ChatCompletionClient interface
+    # --------------------------------------------------
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | str = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        key = self._key(messages, tools, json_output, extra_create_args)
+
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        result = await self.client.create(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        self._store(key, result, time.perf_counter() - start)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | str = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        key = self._key(messages, tools, json_output, extra_create_args)
+
+        cached = self._lookup(key)
+        if cached is not None:
+            # solo il CreateResult (cached=True): chi consuma lo stream vede
+            # che la risposta non arriva dal modello e non la risalva
+            yield cached
+            return
+
+        start = time.perf_counter()
+        stream = self.client.create_stream(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        try:
+            async for chunk in stream:
+                if isinstance(chunk, CreateResult):
+                    self._store(key, chunk, time.perf_counter() - start)
+                yield chunk
+        finally:
+            # chiude la richiesta sottostante anche se il consumer si ferma prima
+            await stream.aclose()
+
+    def remember(
+        self,
+        messages: Sequence[LLMMessage],
+        result: CreateResult,
+        latency: float,
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+    ) -> None:
+        """
+        Salva una risposta ottenuta fuori da create(), ad esempio uno stream
+        interrotto appena il documento strutturato è completo.
+        Non sovrascrive una entry ancora valida per la stessa chiave.
+        """
+        if result.cached:
+            return
+        key = self._key(messages, tools, json_output, extra_create_args)
+        self._store(key, result, latency, replace=False)
+
+    async def close(self) -> None:
+        self._conn.close()
+        await self.client.close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self.client.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self.client.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self.client.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self.client.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self.client.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self.client.model_info
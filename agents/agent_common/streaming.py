@@ -0,0 +1,113 @@
+# agent_common/streaming.py
+import time
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, RequestUsage, SystemMessage, UserMessage
+
+
+class StreamBudgetExceeded(RuntimeError):
+    """
+    Generazione interrotta perché ha superato il budget di token dello step.
+    L'output è troncato: non va riparato, parsato né salvato (cache o
+    checkpoint). text contiene il testo parziale, solo per debug.
+    """
+
+    def __init__(self, step: str, max_tokens: int | None, text: str):
+        super().__init__(f"{step}: generazione interrotta oltre {max_tokens} token")
+        self.step = step
+        self.max_tokens = max_tokens
+        self.text = text
+
+
+async def stream_structured(
+    model_client: ChatCompletionClient,
+    system_message: str,
+    prompt: str,
+    detector,
+    max_tokens: int | None = None
+) -> tuple[str, dict]:
+    """
+    Chiamata in streaming al modello con arresto anticipato.
+
+    I token sono passati al detector man mano che arrivano: appena il
+    documento è completo la richiesta viene cancellata e il commento
+    successivo non viene generato. Se la generazione supera max_tokens
+    (stimati) viene interrotta e si restituisce il testo parziale con
+    budget_exceeded nel report: il chiamante deve scartarlo (vedi
+    StreamBudgetExceeded).
+
+    detector: oggetto con feed(chunk) -> documento completo o None e
+    buffer (testo ricevuto finora), es. JSONDocumentDetector di
+    Architect_agent o YAMLDocumentDetector di tradeoff_agent.
+
+    Ritorna (testo, report) con report: cached, early_stop, budget_exceeded,
+    chunks, estimated_tokens, seconds.
+    """
+    messages = [
+        SystemMessage(content=system_message),
+        UserMessage(content=prompt, source="user"),
+    ]
+    token = CancellationToken()
+    stream = model_client.create_stream(messages, cancellation_token=token)
+
+    start = time.perf_counter()
+    text = None
+    chunks = 0
+    cached = False
+    early_stop = False
+    budget_exceeded = False
+
+    try:
+        async for chunk in stream:
+            if isinstance(chunk, CreateResult):
+                # un hit della cache arriva come solo CreateResult con cached=True
+                cached = chunk.cached
+                if isinstance(chunk.content, str):
+                    text = chunk.content
+                break
+
+            chunks += 1
+            document = detector.feed(chunk)
+            if document is not None:
+                text = document
+                early_stop = True
+                break
+
+            if max_tokens is not None and max(chunks, len(detector.buffer) // 4) > max_tokens:
+                budget_exceeded = True
+                break
+    finally:
+        if early_stop or budget_exceeded:
+            token.cancel()
+        await stream.aclose()
+
+    if text is None:
+        text = detector.buffer
+
+    seconds = time.perf_counter() - start
+
+    # La risposta interrotta non arriva mai come CreateResult: la si salva
+    # nella cache solo se il documento è completo e arriva davvero dal
+    # modello (mai se troncata dal budget o servita dalla cache)
+    remember = getattr(model_client, "remember", None)
+    if early_stop and not cached and remember is not None:
+        remember(
+            messages,
+            CreateResult(
+                finish_reason="stop",
+                content=text,
+                usage=RequestUsage(prompt_tokens=0, completion_tokens=chunks),
+                cached=False
+            ),
+            seconds
+        )
+
+    report = {
+        "cached": cached,
+        "early_stop": early_stop,
+        "budget_exceeded": budget_exceeded,
+        "chunks": chunks,
+        "estimated_tokens": max(chunks, len(text) // 4),
+        "seconds": round(seconds, 2)
+    }
+    return text, report
@@ -0,0 +1,136 @@
+# agents/component_graph.py
+from typing import Dict, List
+
+import numpy as np
+
+from agents.graph_metrics import ComponentAdjacency
+
+# Nodo creato solo da un connector (componente non dichiarato): nessun attributo
+_NO_ATTRIBUTES = object()
+
+
+class ComponentGraph:
+    """
+    Grafo diretto dei componenti di un'architettura in forma compatta.
+
+    - id dei componenti internati in indici 0..N-1 (ordine di prima comparsa)
+    - attributi dei nodi per colonna (types / responsibilities / interfaces)
+    - archi in CSR: indptr (N+1) e indices (E), con gli attributi di ogni
+      arco (interaction del connector) nello stesso ordine di indices
+
+    Gli oggetti di input non vengono copiati: colonne e attributi degli
+    archi referenziano i dati delle views. Come networkx.DiGraph un arco
+    ripetuto è tenuto una volta sola (gli attributi vengono uniti) e un
+    connector verso un componente non dichiarato crea un nodo senza
+    attributi; anche l'ordine di nodes() / edges() è lo stesso.
+    La conversione a networkx serve solo per la visualizzazione (to_networkx).
+    """
+
+    __slots__ = (
+        "component_ids", "index",
+        "types", "responsibilities", "interfaces",
+        "src", "dst", "indptr", "indices", "edge_data",
+    )
+
+    def __init__(self, components: List[Dict], connectors: List[Dict]):
+        self.component_ids: List = []
+        self.index: Dict = {}
+        self.types: List = []
+        self.responsibilities: List = []
+        self.interfaces: List = []
+
+        for comp in components:
+            i = self._intern(comp['id'])
+            self.types[i] = comp['type']
+            self.responsibilities[i] = comp['responsibilities']
+            self.interfaces[i] = comp['interfaces']
+
+        edge_position: Dict = {}
+        src, dst, edge_data = [], [], []
+        for conn in connectors:
+            u = self._intern(conn['from'])
+            v = self._intern(conn['to'])
+            attributes = conn['interaction']
+            position = edge_position.get((u, v))
+            if position is None:
+                edge_position[(u, v)] = len(src)
+                src.append(u)
+                dst.append(v)
+                edge_data.append(attributes)
+            else:
+                edge_data[position] = {**edge_data[position], **attributes}
+
+        # CSR: archi ordinati per nodo sorgente, stabile rispetto all'inserimento
+        n = len(self.component_ids)
+        order = np.argsort(np.asarray(src, dtype=np.int64), kind="stable")
+        self.src = np.asarray(src, dtype=np.int64)[order]
+        self.dst = np.asarray(dst, dtype=np.int64)[order]
+        self.indices = self.dst
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=n), out=self.indptr[1:])
+        self.edge_data = [edge_data[k] for k in order.tolist()]
+
+    def _intern(self, comp_id) -> int:
+        i = self.index.get(comp_id)
+        if i is None:
+            i = len(self.component_ids)
+            self.index[comp_id] = i
+            self.component_ids.append(comp_id)
+            self.types.append(_NO_ATTRIBUTES)
+            self.responsibilities.append(None)
+            self.interfaces.append(None)
+        return i
+
+    @classmethod
+    def from_architecture(cls, arch: Dict) -> "ComponentGraph":
+        component_view = arch['views']['component_view']
+        return cls(component_view['components'], component_view.get('connectors', []))
+
+    # --------------------------------------------------
+    # Accesso (stessa forma di networkx per nodes / edges)
+    # --------------------------------------------------
+    def node_attributes(self, i: int) -> Dict:
+        if self.types[i] is _NO_ATTRIBUTES:
+            return {}
+        return {
+            'type': self.types[i],
+            'responsibilities': self.responsibilities[i],
+            'interfaces': self.interfaces[i]
+        }
+
+    def nodes(self, data=False) -> List:
+        if not data:
+            return list(self.component_ids)
+        return [(comp_id, self.node_attributes(i)) for i, comp_id in enumerate(self.component_ids)]
+
+    def edges(self, data=False) -> List:
+        ids = self.component_ids
+        pairs = zip(self.src.tolist(), self.dst.tolist())
+        if not data:
+            return [(ids[u], ids[v]) for u, v in pairs]
+        return [(ids[u], ids[v], d) for (u, v), d in zip(pairs, self.edge_data)]
+
+    def number_of_nodes(self) -> int:
+        return len(self.component_ids)
+
+    def number_of_edges(self) -> int:
+        return int(self.src.size)
+
+    def adjacency(self) -> ComponentAdjacency:
+        """
+        Adiacenza per le metriche dello step 5, senza passare da liste di dict.
+        """
+        return ComponentAdjacency(self.component_ids, self.src, self.dst)
+
+    def to_networkx(self):
+        """
+        networkx.DiGraph equivalente (solo per visualizzazione).
+        """
+        import networkx as nx
+
+        G = nx.DiGraph()
+        for comp_id, attributes in self.nodes(data=True):
+            G.add_node(comp_id, **attributes)
+        for u, v, attributes in self.edges(data=True):
+            G.add_edge(u, v, **attributes)
+        return G
@@ -1,28 +1,127 @@
 import agents.utils as utils
+from agents.graph_metrics import evaluate_metrics
+from agents.llm_cache import current_step, llm_step
+from agents.pareto import dominance_info, rank_architectures
+from agents.streaming import StreamBudgetExceeded, YAMLDocumentDetector, stream_structured
 from autogen_agentchat.agents import AssistantAgent
 from copy import deepcopy
-import textwrap, yaml
-from rag.kb import KnowledgeBase
+import asyncio, textwrap, yaml
+from rag.kb import get_knowledge_base_registry
 
-class TradeOffAgent:
-    def __init__(self, model_client):
-
-        self.agent = AssistantAgent(
-            name="tradeoff_agent",
-            model_client=model_client,
-            system_message=("""
+TRADEOFF_SYSTEM_MESSAGE = """
 You are an agent that supports the analysis of software architectures.
 You operate by extracting and structuring information from inputs and authoritative
 knowledge sources, without introducing assumptions or making design decisions.
 """
-            )
-        )
+
+# Token massimi (stimati) per risposta in modalità streaming
+DEFAULT_STREAM_BUDGETS = {
+    "step2": 3072,
+    "step3": 2048,
+    "step4": 2048,
+    "step7": 1024,
+    "evolution": 1024,
+}
+
+class TradeOffAgent:
+    def __init__(self, model_client, streaming=False, stream_budgets=None, kb_registry=None, max_concurrency=1):
+        """
+        streaming=True chiama il modello in streaming e interrompe la risposta
+        appena il documento YAML richiesto è completo; stream_budgets
+        (default DEFAULT_STREAM_BUDGETS) limita i token generati per step.
+
+        kb_registry: KnowledgeBaseRegistry da cui ottenere le KB degli step
+        (default: quello condiviso dal processo). Le KB restano aperte tra
+        step e iterazioni finché non si chiama close_knowledge_bases().
+
+        max_concurrency > 1 genera in parallelo gli scenari dei driver dello
+        step 4: ogni task usa un AssistantAgent isolato e il semaforo limita
+        le richieste contemporanee al modello.
+        """
+        self.model_client = model_client
+        self.max_concurrency = max(1, max_concurrency)
+        self.agent = self._new_agent()
+
+        self.streaming = streaming
+        self.stream_budgets = {**DEFAULT_STREAM_BUDGETS, **(stream_budgets or {})}
+        self.stream_reports = {}
+
+        self.knowledge_bases = kb_registry or get_knowledge_base_registry()
 
         self.workflow = {
             "continue": True,
             "iteration": 0
         }
     
+    def close_knowledge_bases(self):
+        self.knowledge_bases.close()
+
+    def _new_agent(self):
+        """
+        Crea un AssistantAgent con il system message del TradeOffAgent.
+        Usato per l'agente principale e per i task concorrenti, così
+        on_reset di un task non interferisce con gli altri.
+        """
+        return AssistantAgent(
+            name="tradeoff_agent",
+            model_client=self.model_client,
+            system_message=TRADEOFF_SYSTEM_MESSAGE
+        )
+
+    async def _gather_isolated(self, items, worker):
+        """
+        Esegue worker(agent, item) per ogni item in modo concorrente,
+        con un agente isolato per task e al massimo max_concurrency task attivi.
+        I risultati rispettano l'ordine di items.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_isolated(item):
+            async with semaphore:
+                return await worker(self._new_agent(), item)
+
+        return await asyncio.gather(*(run_isolated(item) for item in items))
+
+    async def _complete(self, prompt, root_keys=(), agent=None):
+        """
+        Invia il prompt al modello e restituisce l'output testuale.
+
+        Argomenti:
+        - prompt: testo del prompt
+        - root_keys: chiavi radice del YAML atteso (vuoto per una lista radice)
+        - agent: AssistantAgent da usare (default self.agent)
+
+        In streaming, se la generazione supera il budget dello step solleva
+        StreamBudgetExceeded invece di restituire il testo troncato.
+        """
+        if not self.streaming:
+            agent = agent or self.agent
+            response = await agent.run(task=prompt)
+            await agent.on_reset(cancellation_token=None)
+            return response.messages[-1].content
+
+        step = current_step() or "unknown"
+        text, report = await stream_structured(
+            self.model_client,
+            TRADEOFF_SYSTEM_MESSAGE,
+            prompt,
+            YAMLDocumentDetector(root_keys),
+            max_tokens=self.stream_budgets.get(step)
+        )
+
+        totals = self.stream_reports.setdefault(
+            step, {"calls": 0, "early_stops": 0, "budget_exceeded": 0, "estimated_tokens": 0}
+        )
+        totals["calls"] += 1
+        totals["early_stops"] += report["early_stop"]
+        totals["budget_exceeded"] += report["budget_exceeded"]
+        totals["estimated_tokens"] += report["estimated_tokens"]
+        if report["budget_exceeded"]:
+            # output troncato: non va passato al parsing YAML
+            print(f"⛔ {step}: generazione interrotta oltre {self.stream_budgets[step]} token")
+            raise StreamBudgetExceeded(step, self.stream_budgets[step], text)
+        return text
+
     def step1_normalize_input(self, input_yaml):
         """
         Argomenti:
@@ -31,7 +130,8 @@ knowledge sources, without introducing assumptions or making design decisions.
         Ritorna:
         - dict con architetture normalizzate e grafo dei componenti
         """
-        # Carica YAML se necessario
+        # Carica YAML se necessario (input_data è poi privato: le views
+        # possono essere referenziate senza ulteriori copie)
         if isinstance(input_yaml, str):
             input_data = yaml.safe_load(input_yaml)
         else:
@@ -49,7 +149,7 @@ knowledge sources, without introducing assumptions or making design decisions.
                 'name': arch['name'],
                 'style': arch['style'],
                 'uml_standard': arch['uml_standard'],
-                'views': deepcopy(arch['views']),
+                'views': arch['views'],
                 'component_graph': graph
             })
 
@@ -59,6 +159,7 @@ knowledge sources, without introducing assumptions or making design decisions.
 
         return normalized_input
 
+    @llm_step("step2")
     async def step2_qa_elicitation(self, non_functional_requirements):
         """
         Argomenti:
@@ -68,7 +169,7 @@ knowledge sources, without introducing assumptions or making design decisions.
         - qa_candidates: lista di QA candidati come dict {name, rationale, ...}
         """
 
-        kb = KnowledgeBase(vector_dir="chroma/step2", k=15)
+        kb = self.knowledge_bases.get("chroma/step2")
 
         # 1. Prepara query testuale per la KB
         query = (
@@ -78,11 +179,10 @@ knowledge sources, without introducing assumptions or making design decisions.
         "- any architectural tactics or patterns used to achieve the attribute. "
         )
 
-        # 2. Recupera documenti rilevanti dalla KB
-        docs = kb.retrieve(query)
-
-        # 3. Costruisci contesto testuale con fonti
-        context_text, sources_text = utils.build_context_with_sources(docs)
+        # 2-3. Recupera i documenti dalla KB e costruisci il contesto con fonti (memoizzato)
+        context_text, sources_text = kb.retrieve_context(
+            query, utils.build_context_with_sources, k=15
+        )
 
         # 4. Prompt per l'agente
         prompt = f"""
@@ -150,14 +250,14 @@ quality_attributes:
 """
 
         # 5. Chiamata all'agente
-        response = await self.agent.run(task=prompt)
-        await self.agent.on_reset(cancellation_token=None)
+        response = await self._complete(prompt, root_keys=("quality_attributes",))
 
         # 6. Estrai e salva output YAML
         qa_candidates = utils.return_result_save_yaml(response, "agent_outputs/ST2_qa_candidates.yaml")
 
         return qa_candidates, sources_text
 
+    @llm_step("step3")
     async def step3_driver_analysis(self, qa_candidates, constraints, context, stakeholders):
         """
         Argomenti:
@@ -170,7 +270,7 @@ quality_attributes:
         - QA_drivers: lista di driver selezionati come dict {name, rationale, influencing_factors, related_stakeholders, related_constraints}
         """
 
-        kb = KnowledgeBase(vector_dir="chroma/step3", k=15)
+        kb = self.knowledge_bases.get("chroma/step3")
 
         query = (
             "architectural drivers identification sensitivity points "
@@ -178,9 +278,9 @@ quality_attributes:
             "quantifying architectural decisions impact analysis"
         )
 
-        docs = kb.retrieve(query)
-
-        kb_context, sources_text = utils.build_context_with_sources(docs)
+        kb_context, sources_text = kb.retrieve_context(
+            query, utils.build_context_with_sources, k=15
+        )
 
         prompt = f"""
 Your task is to propose candidate Quality Attribute Drivers based on the provided inputs.
@@ -270,27 +370,31 @@ IMPORTANT:
 
         print(prompt)
         
-        response = await self.agent.run(task=prompt)
-        await self.agent.on_reset(cancellation_token=None)
+        response = await self._complete(prompt, root_keys=("candidate_drivers",))
 
         qa_drivers = utils.return_result_save_yaml(response, "agent_outputs/ST3_qa_drivers.yaml")
 
         return qa_drivers, sources_text
 
     # va aggiustato il prompt, gli scenari devono essere neutrali e non descrivere soluzioni
-    async def step4_scenario_generation(self, QA_drivers_info, context, stakeholders, constraints):
+    @llm_step("step4")
+    async def step4_scenario_generation(self, QA_drivers_info, context, stakeholders, constraints, concurrent=None):
         """
         Argomenti:
         - qa_drivers: lista di driver selezionati come dict (output step 3)
         - context: contesto del sistema
         - stakeholders: elenco degli stakeholder
         - constraints: vincoli
+        - concurrent: genera gli scenari dei driver in parallelo, ciascuno con
+          un agente isolato (default: True se max_concurrency > 1). Il YAML di
+          ogni driver è validato separatamente e il merge segue l'ordine di
+          QA_drivers_info, come nell'esecuzione sequenziale.
 
         Ritorna:
         - scenarios: lista di scenari generati come dict {related_driver, stimulus, environment, response, response_measure}
         """
 
-        kb = KnowledgeBase(vector_dir="chroma/step4", k=20)
+        kb = self.knowledge_bases.get("chroma/step4")
 
         drivers_str = [f"{driver_name}" for driver_name, driver in QA_drivers_info.items()]
         query = (
@@ -300,13 +404,15 @@ IMPORTANT:
             f"{drivers_str}"
         )
 
-        docs = kb.retrieve(query)
-
-        kb_context, sources_text = utils.build_context_with_sources(docs)
+        kb_context, sources_text = kb.retrieve_context(
+            query, utils.build_context_with_sources, k=20
+        )
 
-        scenarios = {}
+        if concurrent is None:
+            concurrent = self.max_concurrency > 1
 
-        for driver_name, driver in QA_drivers_info.items():
+        async def generate(agent, item):
+            driver_name, driver = item
 
             print(f"""\nSIAMO NEL FOR PER IL DRIVER {driver_name}\n""")
             print(driver)
@@ -439,20 +545,35 @@ IMPORTANT:
 
             utils.inject_failures(self.workflow, prompt, "SCENARIO")
 
-            response = await self.agent.run(task=prompt)
-            await self.agent.on_reset(cancellation_token=None)
-
-            scenario = response.messages[-1].content
+            # un output troncato dal budget di streaming scarta solo questo driver
+            try:
+                scenario = await self._complete(prompt, root_keys=("scenarios",), agent=agent)
+            except StreamBudgetExceeded:
+                print(f"Output troncato per driver {driver_name}")
+                return None
             cleaned_scenario = utils.clean_agent_output(scenario)
 
-            # per ogni driver, estrai gli scenari generati
-            # e salvali in un dict complessivo (scenarios)
+            # parsing isolato per driver: un YAML non valido scarta solo questo driver
             try:
                 parsed = yaml.safe_load(cleaned_scenario)
-                if parsed and "scenarios" in parsed:
-                    scenarios[driver_name] = parsed["scenarios"]
+                if isinstance(parsed, dict) and "scenarios" in parsed:
+                    return parsed["scenarios"]
             except Exception as e:
                 print(f"Errore parsing YAML per driver {driver_name}: {e}")
+            return None
+
+        drivers = list(QA_drivers_info.items())
+        if concurrent:
+            results = await self._gather_isolated(drivers, generate)
+        else:
+            results = [await generate(self.agent, item) for item in drivers]
+
+        # per ogni driver, estrai gli scenari generati
+        # e salvali in un dict complessivo (scenarios), nell'ordine dei driver
+        scenarios = {}
+        for (driver_name, _), driver_scenarios in zip(drivers, results):
+            if driver_scenarios is not None:
+                scenarios[driver_name] = driver_scenarios
 
             print(f"Scenari generati per driver {driver_name}:\n")
             print(scenarios.get(driver_name, []))
@@ -475,54 +596,11 @@ IMPORTANT:
         evaluations = {}
 
         for arch in architectures['normalized_architectures']:
-            graph = arch['component_graph']
-            nodes = [{'id': n} for n in graph.nodes()]
-            edges = [{'from': u, 'to': v} for u, v in graph.edges()]
+            # adiacenza costruita una volta sola, metriche in passate vettoriali O(N + E)
+            adjacency = arch['component_graph'].adjacency()
             deplyoment_nodes = arch['views']['deployment_view']['nodes']
 
-            component_count = utils.calculate_component_count(nodes)
-            coupling = utils.calculate_coupling(nodes, edges)
-            fan_in = utils.calculate_fan_in(nodes, edges)
-            fan_out = utils.calculate_fan_out(nodes, edges)
-            cohesion = utils.calculate_cohesion(nodes)
-            complexity = utils.calculate_complexity(nodes, edges)
-            redundancy = utils.calculate_redundancy(nodes, deplyoment_nodes)
-
-            evaluations[arch['architecture_id']] = {
-                'component_count': component_count,
-                'coupling': {
-                    'per_component': {k: v for k, v in coupling.items() if k not in ['average_coupling', 'normalized_coupling', 'max_coupling']},
-                    'average_coupling': coupling['average_coupling'],
-                    'normalized_coupling': coupling['normalized_coupling'],
-                    'max_coupling': coupling['max_coupling']
-                },
-                'fan_in': {
-                    'per_component': {k: v for k, v in fan_in.items() if k not in ['fan_in_concentration', 'normalized_fan_in', 'max_fan_in']},
-                    'normalized_fan_in': fan_in['normalized_fan_in'],
-                    'fan_in_concentration': fan_in['fan_in_concentration'],
-                    'max_fan_in': fan_in['max_fan_in']
-                },
-                'fan_out': {
-                    'per_component': {k: v for k, v in fan_out.items() if k not in ['fan_out_concentration', 'normalized_fan_out', 'max_fan_out']},
-                    'normalized_fan_out': fan_out['normalized_fan_out'],
-                    'fan_out_concentration': fan_out['fan_out_concentration'],
-                    'max_fan_out': fan_out['max_fan_out']
-                },
-                'cohesion': {
-                    'per_component': {k: v for k, v in cohesion.items() if k not in ['average_cohesion', 'min_cohesion']},
-                    'average_cohesion': cohesion['average_cohesion'],
-                    'min_cohesion': cohesion['min_cohesion'],
-                },
-                'complexity': {
-                    'tot_complexity': complexity['tot_complexity'],
-                    'norm_complexity': complexity['norm_complexity']
-                },
-                'redundancy': {
-                    'per_component': {k: v for k, v in redundancy.items() if k not in ['normalized_avg_redundancy', 'normalized_max_redundancy']},
-                    'normalized_avg_redundancy': redundancy['normalized_avg_redundancy'],
-                    'normalized_max_redundancy': redundancy['normalized_max_redundancy']
-                }
-            }
+            evaluations[arch['architecture_id']] = evaluate_metrics(adjacency, deplyoment_nodes)
 
         # salva output
         with open("agent_outputs/ST5_metric_evaluations.yaml", "w", encoding="utf-8") as f:
@@ -530,48 +608,49 @@ IMPORTANT:
 
         return evaluations
         
-    def step6_multi_objective_comparison(self, evaluations):
+    def step6_multi_objective_comparison(self, evaluations, dominance_details=False):
         """
         Calcola il Pareto front dato un insieme di architetture.
 
+        Le architetture sono ordinate per fronti (fast non-dominated sorting
+        su matrice numpy): fronte 1 = Pareto front, fronte 2 = non dominate
+        una volta escluso il fronte 1, ecc.
+
+        Argomenti:
+        - evaluations: output dello step 5
+        - dominance_details: se True aggiunge dominance_info con il confronto
+          metrica per metrica di ogni coppia dominante/dominata (O(n²))
+
         Ritorna:
         - pareto_front: lista di architetture non dominate
-        - dominance_info: dettagli di dominanza
+        - fronts: liste di architetture per fronte
+        - ranking: {arch_id: {front, crowding_distance, dominates, dominated_by}}
+        - dominance_info: dettagli di dominanza (solo con dominance_details=True)
         """
 
-        pareto = []
-        dominance_info = {}
         objectives = utils.extract_objectives(evaluations)
+        ranking = rank_architectures(objectives, utils.OBJECTIVES)
+        arch_ids = ranking["arch_ids"]
 
-        for a_id, a_obj in objectives.items():
-            dominated = False
-            dominance_info[a_id] = {
-                "dominates": {},
-                "dominated_by": {}
-            }
-
-            for b_id, b_obj in objectives.items():
-                if a_id == b_id:
-                    continue
-
-                if utils.dominates(b_obj, a_obj):
-                    dominated = True
-                    dominance_info[a_id]["dominated_by"][b_id] = \
-                        utils.compare_objectives(a_obj, b_obj)
-
-                elif utils.dominates(a_obj, b_obj):
-                    dominance_info[a_id]["dominates"][b_id] = \
-                        utils.compare_objectives(a_obj, b_obj)
-
-            if not dominated:
-                pareto.append(a_id)
-
-        
         multi_objective_comparison = {
-            "pareto_front": pareto,
-            "dominance_info": dominance_info
+            "pareto_front": ranking["fronts"][0] if ranking["fronts"] else [],
+            "fronts": ranking["fronts"],
+            "ranking": {
+                arch_id: {
+                    "front": int(ranking["rank"][i]),
+                    "crowding_distance": float(ranking["crowding_distance"][i]),
+                    "dominates": int(ranking["dominates_count"][i]),
+                    "dominated_by": int(ranking["dominated_by_count"][i])
+                }
+                for i, arch_id in enumerate(arch_ids)
+            }
         }
 
+        if dominance_details:
+            multi_objective_comparison["dominance_info"] = dominance_info(
+                ranking, objectives, utils.compare_objectives
+            )
+
         # salva output
         with open("agent_outputs/ST6_multi_objective_comparison.yaml", "w", encoding="utf-8") as f:
             yaml.dump(multi_objective_comparison, f, allow_unicode=True, sort_keys=False)
@@ -579,11 +658,16 @@ IMPORTANT:
         return multi_objective_comparison
 
     # scenarios non è usato perchè la simulazione delle architetture su scenari è mockata
-    async def step7_tradeoff_analysis(self, multi_objective_comparison, scenarios, evaluations):
+    @llm_step("step7")
+    async def step7_tradeoff_analysis(self, multi_objective_comparison, scenarios, evaluations, max_comparisons=None):
+        """
+        max_comparisons: se indicato, analizza solo le coppie del Pareto front
+        più conflittuali (utile con fronti grandi); default tutte le coppie.
+        """
 
         pareto_front = multi_objective_comparison["pareto_front"]
 
-        comparasions = utils.comparing_pareto_front(pareto_front, evaluations)
+        comparasions = utils.comparing_pareto_front(pareto_front, evaluations, top_k=max_comparisons)
 
         # simulazione del comportamento delle architetture sugli scenari
         # qui andrebbe integrata una simulazione reale usando scenarios (richiesta a LLM)
@@ -595,7 +679,7 @@ IMPORTANT:
             scenario_simulations
         )
 
-        kb = KnowledgeBase(vector_dir="chroma/evolution", k=15)
+        kb = self.knowledge_bases.get("chroma/evolution")
 
         query = (            
             "ATAM evaluation criteria for trade-offs, "
@@ -605,9 +689,9 @@ IMPORTANT:
             "criteria to iterate architecture trade-off analysis"
         )
 
-        docs = kb.retrieve(query)
-
-        kb_context, sources_text = utils.build_context_with_sources(docs)
+        kb_context, sources_text = kb.retrieve_context(
+            query, utils.build_context_with_sources, k=15
+        )
 
         prompt = f"""
 You are an architecture evaluation assistant specialized in ATAM-style trade-off analysis.
@@ -669,10 +753,7 @@ IMPORTANT RULES:
 
         utils.inject_failures(self.workflow, prompt, "TRADEOFF_RATIONALE")
 
-        response = await self.agent.run(task=prompt)
-        await self.agent.on_reset(cancellation_token=None)
-
-        message = utils.clean_agent_output(response.messages[-1].content)
+        message = utils.clean_agent_output(await self._complete(prompt))
 
         evidence_tradeoffs = yaml.safe_load(message)
 
@@ -684,12 +765,13 @@ IMPORTANT RULES:
 
         return tradeoffs
 
+    @llm_step("evolution")
     async def consider_evolution(self, tradeoff_analysis, non_functional_requirements, dev_context, stakeholders, driver_names):
         """
         Decide se ripetere l'analisi dei tradeoff con nuovi driver.
         """
 
-        kb = KnowledgeBase(vector_dir="chroma/evolution", k=15)
+        kb = self.knowledge_bases.get("chroma/evolution")
 
         query = (
             "ATAM evaluation criteria for trade-offs, "
@@ -700,9 +782,9 @@ IMPORTANT RULES:
         )
 
 
-        docs = kb.retrieve(query)
-
-        kb_context, sources_text = utils.build_context_with_sources(docs)
+        kb_context, sources_text = kb.retrieve_context(
+            query, utils.build_context_with_sources, k=15
+        )
 
         prompt = f"""You are an Architecture Trade-off Evaluation Agent.
 
@@ -846,10 +928,7 @@ Any positive evaluation MUST correspond to a NO flag.
 
         """
 
-        response = await self.agent.run(task=prompt)
-        await self.agent.on_reset(cancellation_token=None)
-
-        message = utils.clean_agent_output(response.messages[-1].content)
+        message = utils.clean_agent_output(await self._complete(prompt, root_keys=("response",)))
 
         evaluation = yaml.safe_load(message)
         evaluation = evaluation["response"]
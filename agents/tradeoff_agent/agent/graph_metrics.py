@@ -0,0 +1,177 @@
+# agents/graph_metrics.py
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class ComponentAdjacency:
+    """
+    Adiacenza del grafo dei componenti in forma CSR (indptr / indices),
+    costruita una sola volta per architettura.
+
+    Gli id dei componenti sono internati in indici 0..N-1 nell'ordine di
+    component_ids; tutte le metriche di grado si ricavano dagli array
+    con passate vettoriali O(N + E).
+    """
+
+    __slots__ = ("component_ids", "index", "src", "dst", "indptr", "indices")
+
+    def __init__(self, component_ids: Sequence, src: np.ndarray, dst: np.ndarray):
+        self.component_ids = list(component_ids)
+        self.index = {comp_id: i for i, comp_id in enumerate(self.component_ids)}
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+
+        n = len(self.component_ids)
+        order = np.argsort(self.src, kind="stable")
+        self.indices = self.dst[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=n), out=self.indptr[1:])
+
+    @classmethod
+    def from_graph(cls, graph) -> "ComponentAdjacency":
+        """
+        Da un grafo con nodes() / edges() (es. networkx.DiGraph).
+        """
+        component_ids = list(graph.nodes())
+        index = {comp_id: i for i, comp_id in enumerate(component_ids)}
+        edges = list(graph.edges())
+        src = np.fromiter((index[u] for u, _ in edges), dtype=np.int64, count=len(edges))
+        dst = np.fromiter((index[v] for _, v in edges), dtype=np.int64, count=len(edges))
+        return cls(component_ids, src, dst)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.component_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return int(self.src.size)
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=self.node_count)
+
+    def deployment_counts(self, deployment_nodes: List[Dict]) -> np.ndarray:
+        """
+        Numero di deployment nodes distinti in cui compare ogni componente.
+        """
+        node_idx, comp_idx = [], []
+        for d, deployment_node in enumerate(deployment_nodes):
+            deployed = deployment_node.get('deployed_components', [])
+            if isinstance(deployed, str):
+                deployed = [deployed]
+            for comp_id in deployed:
+                i = self.index.get(comp_id) if not isinstance(comp_id, (dict, list)) else None
+                if i is not None:
+                    node_idx.append(d)
+                    comp_idx.append(i)
+
+        if not comp_idx:
+            return np.zeros(self.node_count, dtype=np.int64)
+
+        # un componente elencato due volte nello stesso nodo conta una volta
+        pairs = np.unique(np.asarray(node_idx, dtype=np.int64) * self.node_count + np.asarray(comp_idx, dtype=np.int64))
+        return np.bincount(pairs % self.node_count, minlength=self.node_count)
+
+
+def _per_component(adjacency: ComponentAdjacency, values: np.ndarray) -> Dict:
+    return dict(zip(adjacency.component_ids, values.tolist()))
+
+
+def _degree_summary(degrees: np.ndarray, n: int):
+    """
+    Massimo, totale e normalizzazione (max / (N-1)) di un vettore di gradi.
+    """
+    max_degree = int(degrees.max()) if n else 0
+    total = int(degrees.sum())
+    normalized = max_degree / (n - 1) if n > 1 else 0
+    return max_degree, total, normalized
+
+
+def evaluate_metrics(
+    adjacency: ComponentAdjacency,
+    deployment_nodes: List[Dict],
+    responsibility_counts: np.ndarray | None = None
+) -> Dict:
+    """
+    Calcola tutte le metriche dello Step 5 per un'architettura, con lo
+    stesso formato di output di calculate_coupling / fan_in / fan_out /
+    cohesion / complexity / redundancy in utils.
+
+    Argomenti:
+    - adjacency: ComponentAdjacency dell'architettura
+    - deployment_nodes: nodi della deployment view
+    - responsibility_counts: numero di responsabilità per componente
+      (None = nessuna responsabilità, coesione 1.0 come nella versione a liste)
+
+    Ritorna:
+    - dict con component_count, coupling, fan_in, fan_out, cohesion, complexity, redundancy
+    """
+    n = adjacency.node_count
+    out_degree = adjacency.out_degree()
+    in_degree = adjacency.in_degree()
+
+    # --- Coupling / fan-out: dipendenze uscenti ---
+    max_out, total_out, normalized_out = _degree_summary(out_degree, n)
+    per_component_out = _per_component(adjacency, out_degree)
+
+    # --- Fan-in: dipendenze entranti ---
+    max_in, total_in, normalized_in = _degree_summary(in_degree, n)
+
+    # --- Cohesion: 1 / numero di responsabilità (1.0 se <= 1) ---
+    if responsibility_counts is None:
+        cohesion_values = [1.0] * n
+    else:
+        counts = np.asarray(responsibility_counts, dtype=np.float64)
+        cohesion_values = np.where(counts <= 1, 1.0, 1.0 / np.maximum(counts, 1)).tolist()
+    cohesion = dict(zip(adjacency.component_ids, cohesion_values))
+
+    # --- Redundancy: deployment nodes aggiuntivi per componente ---
+    redundant = np.maximum(adjacency.deployment_counts(deployment_nodes) - 1, 0)
+    max_redundancy = int(redundant.max()) if n else 0
+    avg_redundancy = int(redundant.sum()) / n if n else 0
+    d = len(deployment_nodes)
+    normalized_avg = avg_redundancy / (d - 1) if d > 1 else 0
+    normalized_max = max_redundancy / (d - 1) if d > 1 else 0
+
+    tot_complexity = n + adjacency.edge_count
+
+    return {
+        'component_count': n,
+        'coupling': {
+            'per_component': per_component_out,
+            'average_coupling': round(total_out / n if n else 0, 2),
+            'normalized_coupling': round(normalized_out, 2),
+            'max_coupling': max_out
+        },
+        'fan_in': {
+            'per_component': _per_component(adjacency, in_degree),
+            'normalized_fan_in': round(normalized_in, 2),
+            'fan_in_concentration': round(max_in / total_in if total_in > 0 else 0, 2),
+            'max_fan_in': max_in
+        },
+        'fan_out': {
+            'per_component': dict(per_component_out),
+            'normalized_fan_out': round(normalized_out, 2),
+            'fan_out_concentration': round(max_out / total_out if total_out > 0 else 0, 2),
+            'max_fan_out': max_out
+        },
+        'cohesion': {
+            'per_component': cohesion,
+            # somma sequenziale come in calculate_cohesion (stesso arrotondamento)
+            'average_cohesion': round(sum(cohesion_values) / n if n else 0, 2),
+            'min_cohesion': round(min(cohesion_values) if n else 0, 2),
+        },
+        'complexity': {
+            'tot_complexity': tot_complexity,
+            'norm_complexity': round(tot_complexity / (n * (n - 1)) if n > 1 else 0, 2)
+        },
+        'redundancy': {
+            'per_component': _per_component(adjacency, redundant),
+            'normalized_avg_redundancy': round(normalized_avg, 2),
+            'normalized_max_redundancy': round(normalized_max, 2)
+        }
+    }
@@ -0,0 +1,278 @@
+# agents/pareto.py
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Righe per blocco nel calcolo della matrice di dominanza (limita i temporanei a ROW_BLOCK*N)
+ROW_BLOCK = 1024
+
+
+def objective_matrix(objectives: Dict[str, Dict[str, float]], directions: Dict[str, str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Converte {arch_id: {objective: value}} in una matrice (N, M) orientata
+    in modo che ogni obiettivo sia da minimizzare (gli obiettivi "max"
+    vengono negati: la negazione è esatta, i confronti non cambiano).
+
+    Ritorna:
+    - arch_ids nell'ordine di objectives
+    - matrice float64 (N, M) con le colonne nell'ordine di directions
+    """
+    for direction in directions.values():
+        if direction not in ("min", "max"):
+            raise ValueError(f"Unknown objective direction: {direction}")
+
+    arch_ids = list(objectives.keys())
+    values = np.array(
+        [[objectives[arch_id][metric] for metric in directions] for arch_id in arch_ids],
+        dtype=np.float64
+    ).reshape(len(arch_ids), len(directions))
+    sign = np.array([1.0 if d == "min" else -1.0 for d in directions.values()])
+    return arch_ids, values * sign
+
+
+def dominance_matrix(F: np.ndarray) -> np.ndarray:
+    """
+    D[i, j] = True se i domina j (Pareto, tutti gli obiettivi da minimizzare).
+    Calcolata a blocchi di righe per contenere la memoria.
+    """
+    n, m = F.shape
+    D = np.zeros((n, n), dtype=bool)
+    for start in range(0, n, ROW_BLOCK):
+        rows = F[start:start + ROW_BLOCK]
+        no_worse = np.ones((rows.shape[0], n), dtype=bool)
+        better = np.zeros((rows.shape[0], n), dtype=bool)
+        # un obiettivo alla volta: temporanei 2D invece di un tensore (righe, N, M)
+        for k in range(m):
+            col = F[:, k]
+            no_worse &= rows[:, k, None] <= col
+            better |= rows[:, k, None] < col
+        D[start:start + ROW_BLOCK] = no_worse & better
+    return D
+
+
+def non_dominated_sort(D: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Fast non-dominated sorting: fronte 1 = non dominate, fronte k = non
+    dominate una volta rimossi i fronti precedenti.
+
+    Ritorna:
+    - rank (N,) con il numero del fronte (da 1)
+    - lista dei fronti, ciascuno come array di indici in ordine crescente
+    """
+    n = D.shape[0]
+    remaining = D.sum(axis=0).astype(np.int64)
+    rank = np.zeros(n, dtype=np.int64)
+    fronts = []
+
+    current = np.flatnonzero(remaining == 0)
+    while current.size:
+        rank[current] = len(fronts) + 1
+        fronts.append(current)
+        remaining[current] = -1
+        remaining -= D[current].sum(axis=0)
+        current = np.flatnonzero(remaining == 0)
+
+    return rank, fronts
+
+
+def crowding_distance(F: np.ndarray, fronts: List[np.ndarray]) -> np.ndarray:
+    """
+    Crowding distance (NSGA-II) calcolata all'interno di ciascun fronte:
+    gli estremi di ogni obiettivo hanno distanza infinita.
+    """
+    distance = np.zeros(F.shape[0], dtype=np.float64)
+    for front in fronts:
+        if front.size <= 2:
+            distance[front] = np.inf
+            continue
+
+        values = F[front]
+        order = np.argsort(values, axis=0, kind="stable")
+        sorted_values = np.take_along_axis(values, order, axis=0)
+        span = sorted_values[-1] - sorted_values[0]
+
+        contribution = np.zeros_like(values)
+        gaps = sorted_values[2:] - sorted_values[:-2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            interior = np.where(span > 0, gaps / span, 0.0)
+        np.put_along_axis(contribution, order[1:-1], interior, axis=0)
+        np.put_along_axis(contribution, order[[0, -1]], np.inf, axis=0)
+
+        distance[front] = contribution.sum(axis=1)
+    return distance
+
+
+def rank_architectures(objectives: Dict[str, Dict[str, float]], directions: Dict[str, str]) -> Dict:
+    """
+    Ordinamento multi-fronte delle architetture.
+
+    Ritorna un dict con:
+    - arch_ids: ordine delle righe
+    - dominance: matrice D (N, N), D[i, j] = i domina j
+    - rank: numero del fronte per architettura
+    - fronts: liste di arch_id per fronte (fronte 1 = Pareto front)
+    - crowding_distance, dominates_count, dominated_by_count per architettura
+    """
+    arch_ids, F = objective_matrix(objectives, directions)
+    D = dominance_matrix(F)
+    rank, fronts = non_dominated_sort(D)
+    distance = crowding_distance(F, fronts)
+
+    return {
+        "arch_ids": arch_ids,
+        "dominance": D,
+        "rank": rank,
+        "fronts": [[arch_ids[i] for i in front] for front in fronts],
+        "crowding_distance": distance,
+        "dominates_count": D.sum(axis=1),
+        "dominated_by_count": D.sum(axis=0),
+    }
+
+
+def dominance_info(ranking: Dict, objectives: Dict[str, Dict[str, float]], compare) -> Dict:
+    """
+    Dettaglio completo delle relazioni di dominanza, nel formato storico
+    dello step 6: {arch_id: {"dominates": {b: compare(a, b)}, "dominated_by": {b: compare(a, b)}}}.
+    Le coppie sono lette dalla matrice di dominanza; compare è chiamato
+    solo per le coppie effettivamente in relazione.
+    """
+    arch_ids = ranking["arch_ids"]
+    D = ranking["dominance"]
+
+    info = {}
+    for i, a_id in enumerate(arch_ids):
+        a_obj = objectives[a_id]
+        info[a_id] = {
+            "dominates": {
+                arch_ids[j]: compare(a_obj, objectives[arch_ids[j]]) for j in np.flatnonzero(D[i])
+            },
+            "dominated_by": {
+                arch_ids[j]: compare(a_obj, objectives[arch_ids[j]]) for j in np.flatnonzero(D[:, i])
+            }
+        }
+    return info
+
+
+class PairwiseComparison:
+    """
+    Confronto di tutte le coppie di architetture (es. del Pareto front)
+    calcolato in un colpo solo.
+
+    sign[a, b, k] vale +1 se a è migliore di b sull'obiettivo k, -1 se è
+    peggiore, 0 se pari (tensore int8 di forma (P, P, M)). Gli insiemi di
+    metriche sono mappati sui quality attribute tramite bitmask
+    precalcolate: better_mask / worse_mask / equal_mask (P, P) contengono
+    l'OR delle bitmask QA delle metriche corrispondenti.
+
+    I record nel formato di utils.comparing_pareto_front sono prodotti su
+    richiesta da records(), eventualmente solo per le top_k coppie più
+    conflittuali.
+    """
+
+    def __init__(self, objectives: Dict[str, Dict[str, float]], directions: Dict[str, str], metric_to_qa: Dict[str, List[str]]):
+        self.arch_ids, F = objective_matrix(objectives, directions)
+        self.metrics = list(directions)
+
+        # QA internati in ordine di prima comparsa, un bit ciascuno
+        self.quality_attributes = []
+        for metric in self.metrics:
+            for qa in metric_to_qa.get(metric, []):
+                if qa not in self.quality_attributes:
+                    self.quality_attributes.append(qa)
+        qa_bit = {qa: 1 << i for i, qa in enumerate(self.quality_attributes)}
+        metric_masks = np.array(
+            [sum(qa_bit[qa] for qa in set(metric_to_qa.get(metric, []))) for metric in self.metrics],
+            dtype=np.int64
+        )
+
+        # obiettivi orientati a minimizzare: a migliore di b se F[a] < F[b]
+        self.sign = np.sign(F[None, :, :] - F[:, None, :]).astype(np.int8)
+
+        better = self.sign > 0
+        worse = self.sign < 0
+        self.better_count = better.sum(axis=2)
+        self.worse_count = worse.sum(axis=2)
+        self.better_mask = np.bitwise_or.reduce(np.where(better, metric_masks, 0), axis=2)
+        self.worse_mask = np.bitwise_or.reduce(np.where(worse, metric_masks, 0), axis=2)
+        self.equal_mask = np.bitwise_or.reduce(np.where(self.sign == 0, metric_masks, 0), axis=2)
+
+        # insiemi di metriche come bitmask (bit k = obiettivo k)
+        metric_bits = np.int64(1) << np.arange(len(self.metrics), dtype=np.int64)
+        self.better_metrics = (better * metric_bits).sum(axis=2)
+        self.worse_metrics = (worse * metric_bits).sum(axis=2)
+
+        # tabelle di decodifica bitmask -> lista (2^M metriche, 2^Q quality attribute)
+        self._metric_table = [
+            [metric for k, metric in enumerate(self.metrics) if mask >> k & 1]
+            for mask in range(1 << len(self.metrics))
+        ]
+        self._qa_table = [
+            [qa for i, qa in enumerate(self.quality_attributes) if mask >> i & 1]
+            for mask in range(1 << len(self.quality_attributes))
+        ]
+
+    def quality_attributes_of(self, mask: int) -> List[str]:
+        """
+        Lista dei QA codificati nella bitmask (nuova lista a ogni chiamata).
+        """
+        return list(self._qa_table[mask])
+
+    def metrics_of(self, mask: int) -> List[str]:
+        """
+        Lista delle metriche codificate nella bitmask, nell'ordine degli obiettivi.
+        """
+        return list(self._metric_table[mask])
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Coppie (a, b) con a < b, nell'ordine del doppio ciclo originale.
+        """
+        return np.triu_indices(len(self.arch_ids), k=1)
+
+    def conflict_scores(self) -> np.ndarray:
+        """
+        Conflitto di ogni coppia di pairs(): quanto entrambe le architetture
+        hanno metriche a favore (min tra PRO_A e PRO_B), poi quante metriche
+        le distinguono in totale.
+        """
+        rows, cols = self.pairs()
+        better = self.better_count[rows, cols]
+        worse = self.worse_count[rows, cols]
+        return np.minimum(better, worse) * (len(self.metrics) + 1) + better + worse
+
+    def records(self, top_k: int | None = None):
+        """
+        Genera i record di confronto {id, arch_A, arch_B, PRO_A_attributes,
+        PRO_A_metrics, PRO_B_attributes, PRO_B_metrics, NEUTRAL}.
+
+        Con top_k vengono generate solo le top_k coppie più conflittuali;
+        l'ordine e gli id restano quelli dell'enumerazione completa.
+        """
+        rows, cols = self.pairs()
+        selected = np.arange(rows.size)
+        if top_k is not None and top_k < rows.size:
+            scores = self.conflict_scores()
+            selected = np.sort(np.argsort(-scores, kind="stable")[:max(top_k, 0)])
+
+        rows, cols = rows[selected], cols[selected]
+
+        # estrazione in blocco: nel ciclo solo lookup su int Python
+        # (liste copiate per record, così yaml.dump non genera alias)
+        arch_ids, metric_table, qa_table = self.arch_ids, self._metric_table, self._qa_table
+        columns = zip(
+            selected.tolist(), rows.tolist(), cols.tolist(),
+            self.better_mask[rows, cols].tolist(), self.better_metrics[rows, cols].tolist(),
+            self.worse_mask[rows, cols].tolist(), self.worse_metrics[rows, cols].tolist(),
+            self.equal_mask[rows, cols].tolist()
+        )
+        for position, a, b, better_qa, better_metrics, worse_qa, worse_metrics, equal_qa in columns:
+            yield {
+                "id": position + 1,
+                "arch_A": arch_ids[a],
+                "arch_B": arch_ids[b],
+                "PRO_A_attributes": qa_table[better_qa][:],
+                "PRO_A_metrics": metric_table[better_metrics][:],
+                "PRO_B_attributes": qa_table[worse_qa][:],
+                "PRO_B_metrics": metric_table[worse_metrics][:],
+                "NEUTRAL": qa_table[equal_qa][:]
+            }
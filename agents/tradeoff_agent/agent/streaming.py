@@ -0,0 +1,107 @@
+# agents/streaming.py
+import os
+import re
+import sys
+from typing import Optional, Sequence
+
+import yaml
+
+_AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _AGENTS_DIR not in sys.path:
+    sys.path.append(_AGENTS_DIR)
+
+# stream_structured / StreamBudgetExceeded: implementazione unica in agents/agent_common/streaming.py (condivisa con Architect_agent)
+from agent_common.streaming import StreamBudgetExceeded, stream_structured  # noqa: E402
+
+_FENCE = re.compile(r"^\s*```")
+_ROOT_KEY = re.compile(r"^[\"']?([\w-]+)[\"']?\s*:")
+
+
+class YAMLDocumentDetector:
+    """
+    Segue la struttura YAML del testo in streaming, riga per riga.
+
+    Il documento inizia alla prima riga YAML (le righe di prosa prima e
+    l'eventuale fence di apertura vengono ignorate) ed è completo quando:
+    - arriva la fence di chiusura ```, oppure
+    - arriva "..." / "---", oppure
+    - arriva una riga a colonna 0 che non continua il documento: per una
+      lista radice una riga che non inizia con "- ", per una mappa una
+      chiave fuori da root_keys dopo che tutte le root_keys sono apparse.
+    feed() restituisce il documento (senza prosa né fence) se è completo e
+    parsabile, altrimenti None.
+    """
+
+    def __init__(self, root_keys: Sequence[str] = ()):
+        self.root_keys = set(root_keys)
+        self.buffer = ""
+        self._pos = 0
+        self._start = None
+        self._list_root = False
+        self._seen_keys: set[str] = set()
+
+    def feed(self, text: str) -> Optional[str]:
+        self.buffer += text
+
+        while True:
+            newline = self.buffer.find("\n", self._pos)
+            if newline == -1:
+                return None
+            line_start, self._pos = self._pos, newline + 1
+            line = self.buffer[line_start:newline]
+            stripped = line.strip()
+
+            if self._start is None:
+                if self._starts_document(stripped):
+                    self._start = line_start
+                    self._list_root = stripped.startswith("-")
+                    self._track_key(line)
+                continue
+
+            if not stripped or line[0] in " \t" or stripped.startswith("#"):
+                continue
+
+            if self._ends_document(line, stripped):
+                document = self.buffer[self._start:line_start]
+                if self._is_document(document):
+                    return document
+                continue
+
+            self._track_key(line)
+
+    def _starts_document(self, stripped: str) -> bool:
+        if stripped.startswith("- "):
+            return True
+        match = _ROOT_KEY.match(stripped)
+        if match is None:
+            return False
+        return not self.root_keys or match.group(1) in self.root_keys
+
+    def _ends_document(self, line: str, stripped: str) -> bool:
+        if _FENCE.match(line) or stripped in ("...", "---"):
+            return True
+        if self._list_root:
+            return not stripped.startswith("-")
+        if stripped.startswith("-"):
+            return False
+
+        match = _ROOT_KEY.match(stripped)
+        if match is None:
+            return True
+        if self.root_keys:
+            return self.root_keys <= self._seen_keys and match.group(1) not in self.root_keys
+        return False
+
+    def _track_key(self, line: str) -> None:
+        match = _ROOT_KEY.match(line)
+        if match is not None:
+            self._seen_keys.add(match.group(1))
+
+    def _is_document(self, document: str) -> bool:
+        try:
+            parsed = yaml.safe_load(document)
+        except yaml.YAMLError:
+            return False
+        if self._list_root:
+            return isinstance(parsed, list)
+        return isinstance(parsed, dict) and self.root_keys <= parsed.keys()
@@ -4,6 +4,8 @@ import networkx as nx
 import yaml, re
 from pathlib import Path
 from copy import deepcopy
+from agents.component_graph import ComponentGraph
+from agents.pareto import PairwiseComparison
 
 def build_context_with_sources(docs: List[Any]) -> Tuple[str, str]:
     context_parts = []
@@ -34,7 +36,8 @@ def clean_agent_output(text: str) -> str:
     return text.strip()
 
 def return_result_save_yaml(response, output_file):
-    raw_content = response.messages[-1].content
+    # response: TaskResult di AutoGen oppure testo già estratto (streaming)
+    raw_content = response if isinstance(response, str) else response.messages[-1].content
     cleaned_content = clean_agent_output(raw_content)
 
     try:
@@ -58,31 +61,14 @@ class NoAliasDumper(yaml.SafeDumper):
     
 def build_component_graph(arch):
     """
-    Costruisce un grafo NetworkX dai componenti e connector dell'architettura.
+    Costruisce il grafo compatto (ComponentGraph) dai componenti e connector
+    dell'architettura; networkx serve solo per show_graph.
     """
-    G = nx.DiGraph()
-    components = arch['views']['component_view']['components']
-    
-    # Aggiungi nodi
-    for comp in components:
-        G.add_node(comp['id'], **{
-            'type': comp['type'],
-            'responsibilities': comp['responsibilities'],
-            'interfaces': comp['interfaces']
-        })
-    
-    # Aggiungi archi dai connector
-    for conn in arch['views']['component_view'].get('connectors', []):
-        G.add_edge(
-            conn['from'],
-            conn['to'],
-            **conn['interaction']
-        )
-    return G
+    return ComponentGraph.from_architecture(arch)
 
 def show_graph(normalized_output):
     for arch in normalized_output['normalized_architectures']:
-        G = arch['component_graph']
+        G = arch['component_graph'].to_networkx()
         plt.figure(figsize=(8,6))
         pos = nx.spring_layout(G)
         nx.draw(G, pos, with_labels=True, node_color='skyblue', node_size=1500, arrows=True)
@@ -103,12 +89,19 @@ def save_normalized_input(
     Path(folder).mkdir(parents=True, exist_ok=True)
     filepath = Path(folder) / filename
 
-    # Deep copy per sicurezza
-    output_to_save = deepcopy(normalized_input)
+    # Copia superficiale: normalized_input non viene modificato e i dati
+    # condivisi con le views sono scritti per esteso da NoAliasDumper
+    output_to_save = {
+        **normalized_input,
+        'normalized_architectures': [
+            {k: v for k, v in arch.items() if k != 'component_graph'}
+            for arch in normalized_input['normalized_architectures']
+        ]
+    }
 
     # Serializzazione esplicita del grafo
-    for arch in output_to_save['normalized_architectures']:
-        G = arch.pop('component_graph', None)
+    for source, arch in zip(normalized_input['normalized_architectures'], output_to_save['normalized_architectures']):
+        G = source.get('component_graph')
         if G is not None:
             arch['component_graph_nodes'] = [
                 {"id": n, **d} for n, d in G.nodes(data=True)
@@ -536,46 +529,28 @@ def metrics_to_quality_attributes(metrics: list):
         qa.update(METRIC_TO_QA.get(m, []))
     return list(qa)
 
-def comparing_pareto_front(pareto, evaluations):
+def comparing_pareto_front(pareto, evaluations, top_k=None):
     """
     Confronta tutte le architetture nel Pareto front
     e ritorna una lista di PRO tra coppie di architetture.
+
+    Le relazioni migliore/peggiore/pari di tutte le coppie sono calcolate
+    insieme (PairwiseComparison); i record sono costruiti solo per le
+    coppie restituite. I QA di ogni record seguono l'ordine di METRIC_TO_QA.
+
     Argomenti:
     - pareto: architetture nel Pareto front
     - evaluations: dizionario {arch_id: metrics}
+    - top_k: se indicato, solo le top_k coppie più conflittuali (PRO su entrambi i lati)
     Ritorna:
     - lista di PRO tra coppie di architetture nel Pareto front
     """
-    comparison_list = []
-
     pareto_evaluations = filter_evaluations_by_arch_ids(evaluations, pareto)
     objectives = extract_objectives(pareto_evaluations)
 
-    arch_ids = list(objectives.keys())
-    comparison_id = 1
-
-    for i, arch_a in enumerate(arch_ids):
-        for arch_b in arch_ids[i + 1:]:
-
-            a_obj = objectives[arch_a]
-            b_obj = objectives[arch_b]
-
-            comparison = compare_objectives(a_obj, b_obj)
-
-            comparison_list.append({
-                "id": comparison_id,
-                "arch_A": arch_a,
-                "arch_B": arch_b,
-                "PRO_A_attributes": metrics_to_quality_attributes(comparison["better_on"]),
-                "PRO_A_metrics": comparison["better_on"],
-                "PRO_B_attributes": metrics_to_quality_attributes(comparison["worse_on"]),
-                "PRO_B_metrics": comparison["worse_on"],
-                "NEUTRAL": metrics_to_quality_attributes(comparison["equal_on"])
-            })
-
-            comparison_id += 1
+    comparison = PairwiseComparison(objectives, OBJECTIVES, METRIC_TO_QA)
 
-    return comparison_list
+    return list(comparison.records(top_k=top_k))
 
 def identify_tradeoffs(comparisons, scenario_simulations):
     """
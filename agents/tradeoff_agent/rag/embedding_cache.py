@@ -0,0 +1,10 @@
+# rag/embedding_cache.py
+# Implementazione unica in agents/agent_common/embedding_cache.py (condivisa con Architect_agent)
+import os
+import sys
+
+_AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _AGENTS_DIR not in sys.path:
+    sys.path.append(_AGENTS_DIR)
+
+from agent_common.embedding_cache import DEFAULT_CACHE_DIR, CachedEmbeddings, normalize_text  # noqa: E402
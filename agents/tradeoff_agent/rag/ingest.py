@@ -1,11 +1,14 @@
+import argparse
 import os
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from get_embedding_function import get_embedding_function
+from embedding_stage import EmbeddingStage, configure_threads
 
 DATA_DIR = "data/step_name"
 CHROMA_PATH = "chroma/step_name"
+BATCH_SIZE = 64
 
 def sanitize_metadata(metadata: dict) -> dict:
     """
@@ -31,11 +34,18 @@ def sanitize_metadata(metadata: dict) -> dict:
 
 def load_pdfs():
     documents = []
-    for filename in os.listdir(DATA_DIR):
+    for pdf_documents in iter_pdfs():
+        documents.extend(pdf_documents)
+    return documents
+
+def iter_pdfs():
+    """
+    Restituisce le pagine un PDF alla volta, per non tenere in memoria l'intera KB.
+    """
+    for filename in sorted(os.listdir(DATA_DIR)):
         if filename.endswith(".pdf"):
             loader = PyPDFLoader(os.path.join(DATA_DIR, filename))
-            documents.extend(loader.load())
-    return documents
+            yield loader.load()
 
 def split_documents(documents):
     splitter = RecursiveCharacterTextSplitter(
@@ -65,36 +75,50 @@ def calculate_chunk_ids(chunks):
 
 
 def main():
-    documents = load_pdfs()
-    chunks = split_documents(documents)
-    chunks = calculate_chunk_ids(chunks)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Chunk embeddati e scritti su Chroma per batch")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Thread torch/BLAS usati dal modello di embedding")
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
 
+    embedding_function = get_embedding_function()
     db = Chroma(
         persist_directory=CHROMA_PATH,
-        embedding_function=get_embedding_function()
+        embedding_function=embedding_function
     )
 
     existing_items = db.get(include=[])
     existing_ids = set(existing_items["ids"])
     print(f"Documenti già nel DB: {len(existing_ids)}")
 
-    new_chunks = [
-        chunk for chunk in chunks
-        if chunk.metadata["id"] not in existing_ids
-    ]
-
-    for i, chunk in enumerate(new_chunks):
-        try:
-            chunk.metadata = sanitize_metadata(chunk.metadata)
-        except Exception as e:
-            print(f"Errore metadata chunk index {i}: {chunk.metadata} -> {e}")
-
-    if new_chunks:
-        print(f"Aggiungo {len(new_chunks)} nuovi chunk")
-        db.add_documents(
-            new_chunks,
-            ids=[chunk.metadata["id"] for chunk in new_chunks]
-        )
+    # I PDF vengono elaborati uno alla volta e i chunk nuovi scritti a batch:
+    # se l'ingestion si interrompe, la riesecuzione salta i chunk già scritti.
+    stage = EmbeddingStage(db, embedding_function, batch_size=args.batch_size, label=CHROMA_PATH)
+    skipped = 0
+
+    for documents in iter_pdfs():
+        chunks = calculate_chunk_ids(split_documents(documents))
+
+        new_chunks = [
+            chunk for chunk in chunks
+            if chunk.metadata["id"] not in existing_ids
+        ]
+        skipped += len(chunks) - len(new_chunks)
+
+        for i, chunk in enumerate(new_chunks):
+            try:
+                chunk.metadata = sanitize_metadata(chunk.metadata)
+            except Exception as e:
+                print(f"Errore metadata chunk index {i}: {chunk.metadata} -> {e}")
+
+        stage.submit(new_chunks)
+
+    added = stage.close()
+    if added:
+        print(f"Aggiunti {added} nuovi chunk ({skipped} già presenti)")
     else:
         print("Nessun nuovo documento da aggiungere")
 
@@ -1,21 +1,186 @@
+import os
+import threading
+
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+
+from .get_embedding_function import get_embedding_function
+
+# File SQLite scritto da Chroma nella persist_directory
+CHROMA_SQLITE_FILE = "chroma.sqlite3"
+
+
+class RetrievalMemo:
+    """
+    Memo del contesto formattato (context_text, sources_text) per
+    (vector_dir, query, k): le query fisse degli step (step3, step7,
+    consider_evolution) vengono risolte una sola volta per run invece che
+    a ogni iterazione del loop di analyze.
+
+    Ogni voce conserva l'impronta dello store al momento del calcolo
+    (numero di chunk + mtime del file SQLite): se lo store cambia, ad
+    esempio dopo una nuova ingestion, la voce non è più valida.
+    """
+
+    def __init__(self):
+        self._entries: dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, fingerprint: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, fingerprint: tuple, value) -> None:
+        with self._lock:
+            self._entries[key] = (fingerprint, value)
+
+    def invalidate(self, vector_dir=None) -> None:
+        with self._lock:
+            if vector_dir is None:
+                self._entries.clear()
+                return
+            root = os.path.abspath(vector_dir)
+            for key in [key for key in self._entries if key[0] == root]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_RETRIEVAL_MEMO = RetrievalMemo()
+
+
+def get_retrieval_memo() -> RetrievalMemo:
+    return _RETRIEVAL_MEMO
+
 
 class KnowledgeBase:
     def __init__(self, vector_dir="chroma", k=6):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        # Carica il DB Chroma già persistente
+        self.vector_dir = vector_dir
+        # Provider di embedding condiviso nel processo: il modello è caricato una sola volta
+        self.embeddings = get_embedding_function()
+        self.k = k
+        self.store = None
+        self.open()
+
+    def open(self):
+        """
+        Carica il DB Chroma già persistente
+        """
         self.store = Chroma(
-            persist_directory=vector_dir,
+            persist_directory=self.vector_dir,
             embedding_function=self.embeddings
         )
-        self.k = k
 
-    def retrieve(self, query: str):
+    def close(self):
+        """
+        Rilascia il client Chroma; la KB viene riaperta al prossimo retrieve.
+        """
+        self.store = None
+
+    def refresh(self):
+        """
+        Riapre lo store, ad esempio dopo una nuova ingestion nella stessa cartella.
+        """
+        self.close()
+        self.open()
+        _RETRIEVAL_MEMO.invalidate(self.vector_dir)
+
+    def retrieve(self, query: str, k=None):
         """
         Restituisce i chunk più rilevanti come lista di Document
         """
-        docs = self.store.similarity_search(query, k=self.k)
+        if self.store is None:
+            self.open()
+        docs = self.store.similarity_search(query, k=k or self.k)
         return docs
+
+    def fingerprint(self) -> tuple:
+        """
+        Impronta dello store: cambia quando vengono aggiunti o riscritti chunk.
+        """
+        if self.store is None:
+            self.open()
+        sqlite_path = os.path.join(self.vector_dir, CHROMA_SQLITE_FILE)
+        mtime = os.path.getmtime(sqlite_path) if os.path.exists(sqlite_path) else None
+        return self.store._collection.count(), mtime
+
+    def retrieve_context(self, query: str, format_docs, k=None):
+        """
+        Come retrieve, ma restituisce direttamente format_docs(docs)
+        (es. utils.build_context_with_sources), memoizzato per (vector_dir, query, k).
+        """
+        k = k or self.k
+        key = (os.path.abspath(self.vector_dir), query, k, format_docs)
+        fingerprint = self.fingerprint()
+
+        value = _RETRIEVAL_MEMO.get(key, fingerprint)
+        if value is None:
+            value = format_docs(self.retrieve(query, k=k))
+            _RETRIEVAL_MEMO.put(key, fingerprint, value)
+        return value
+
+
+class KnowledgeBaseRegistry:
+    """
+    KnowledgeBase aperte, una per vector_dir.
+
+    La prima get() di una cartella apre lo store Chroma; le successive
+    (altri step, iterazioni del loop di analyze) riusano la stessa istanza,
+    quindi il costo di setup non cresce con il numero di iterazioni.
+    close() e refresh() agiscono su una cartella o su tutte.
+    """
+
+    def __init__(self):
+        self._bases: dict[str, KnowledgeBase] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def get(self, vector_dir="chroma", k=6) -> KnowledgeBase:
+        key = os.path.abspath(vector_dir)
+        with self._lock:
+            kb = self._bases.get(key)
+            if kb is None:
+                kb = KnowledgeBase(vector_dir=vector_dir, k=k)
+                self._bases[key] = kb
+                self.opened += 1
+            return kb
+
+    def _select(self, vector_dir=None) -> list[str]:
+        if vector_dir is None:
+            return list(self._bases)
+        key = os.path.abspath(vector_dir)
+        return [key] if key in self._bases else []
+
+    def close(self, vector_dir=None):
+        with self._lock:
+            for key in self._select(vector_dir):
+                self._bases.pop(key).close()
+
+    def refresh(self, vector_dir=None):
+        with self._lock:
+            for key in self._select(vector_dir):
+                self._bases[key].refresh()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": sorted(self._bases),
+                "opened": self.opened,
+                "retrieval_memo": _RETRIEVAL_MEMO.stats()
+            }
+
+
+# Registry condiviso dal processo (usato da TradeOffAgent se non ne riceve uno proprio)
+_DEFAULT_REGISTRY = KnowledgeBaseRegistry()
+
+
+def get_knowledge_base_registry() -> KnowledgeBaseRegistry:
+    return _DEFAULT_REGISTRY
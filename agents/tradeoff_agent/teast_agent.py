@@ -2,6 +2,8 @@ import asyncio
 from dotenv import load_dotenv
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from agents.tradeoff_agent import TradeOffAgent
+from agents.llm_cache import CachedChatCompletionClient
+from rag.get_embedding_function import embedding_provider_stats
 
 # python -m tests.test_agent
 async def main():
@@ -26,8 +28,12 @@ async def main():
         }
     )
 
-    # Crea l'agente
-    agent = TradeOffAgent(model_client=llm)
+    # Cache delle risposte del modello. La decisione di evoluzione non passa
+    # dalla cache: con prompt identici tra iterazioni il loop non terminerebbe.
+    llm = CachedChatCompletionClient(llm, bypass_steps={"evolution"})
+
+    # Crea l'agente: in streaming la risposta si ferma appena il YAML è completo
+    agent = TradeOffAgent(model_client=llm, streaming=True)
 
     # prendi l'input
     with open('input2.yaml') as f:
@@ -35,6 +41,12 @@ async def main():
 
     response = await agent.analyze(input_yaml)
 
+    print("LLM cache:", llm.stats())
+    print("Streaming:", agent.stream_reports)
+    print("Embedding provider:", embedding_provider_stats())
+    print("Knowledge bases:", agent.knowledge_bases.stats())
+    agent.close_knowledge_bases()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,17 @@
+# test/conftest.py
+# I moduli di agent/ si importano come agents.X (vedi core.py e teast_agent.py):
+# qui il package "agents" viene fatto puntare alla cartella agent/.
+import os
+import sys
+import types
+
+_TRADEOFF_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_AGENT_DIR = os.path.join(_TRADEOFF_DIR, "agent")
+
+if _TRADEOFF_DIR not in sys.path:
+    sys.path.insert(0, _TRADEOFF_DIR)
+
+if getattr(sys.modules.get("agents"), "__path__", None) != [_AGENT_DIR]:
+    _agents = types.ModuleType("agents")
+    _agents.__path__ = [_AGENT_DIR]
+    sys.modules["agents"] = _agents
@@ -0,0 +1,97 @@
+# test/test_component_graph.py
+# ComponentGraph confrontato con il networkx.DiGraph costruito come nel
+# build_component_graph precedente alla versione CSR.
+import random
+
+import networkx as nx
+import pytest
+
+from agents.component_graph import ComponentGraph
+from agents.graph_metrics import ComponentAdjacency, evaluate_metrics
+
+
+def reference_graph(components, connectors):
+    G = nx.DiGraph()
+    for comp in components:
+        G.add_node(comp['id'], **{
+            'type': comp['type'],
+            'responsibilities': comp['responsibilities'],
+            'interfaces': comp['interfaces']
+        })
+    for conn in connectors:
+        G.add_edge(conn['from'], conn['to'], **conn['interaction'])
+    return G
+
+
+def random_component_view(rng: random.Random):
+    """
+    Componenti (anche con id ripetuti) e connector con archi ripetuti,
+    self-loop e componenti non dichiarati.
+    """
+    declared = [f"C{i}" for i in range(rng.randint(0, 10))]
+    components = [
+        {
+            'id': rng.choice(declared),
+            'type': rng.choice(["service", "database", "gateway"]),
+            'responsibilities': [f"r{k}" for k in range(rng.randint(0, 3))],
+            'interfaces': [f"i{k}" for k in range(rng.randint(0, 2))]
+        }
+        for _ in range(len(declared) + rng.randint(0, 2) if declared else 0)
+    ]
+    ids = declared + ["Ext1", "Ext2"]
+    connectors = [
+        {
+            'from': rng.choice(ids),
+            'to': rng.choice(ids),
+            'interaction': {rng.choice(["protocol", "style", "sync"]): rng.choice(["http", "grpc", "async", True])}
+        }
+        for _ in range(rng.randint(0, 25))
+    ]
+    return components, connectors
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_component_graph_matches_networkx(seed):
+    components, connectors = random_component_view(random.Random(seed))
+
+    graph = ComponentGraph(components, connectors)
+    G = reference_graph(components, connectors)
+
+    assert graph.nodes() == list(G.nodes())
+    assert graph.nodes(data=True) == list(G.nodes(data=True))
+    assert graph.edges() == list(G.edges())
+    assert graph.edges(data=True) == list(G.edges(data=True))
+    assert graph.number_of_nodes() == G.number_of_nodes()
+    assert graph.number_of_edges() == G.number_of_edges()
+
+    converted = graph.to_networkx()
+    assert list(converted.nodes(data=True)) == list(G.nodes(data=True))
+    assert list(converted.edges(data=True)) == list(G.edges(data=True))
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_adjacency_metrics_match_networkx_graph(seed):
+    rng = random.Random(seed)
+    components, connectors = random_component_view(rng)
+    deployment_nodes = [
+        {'id': f"node{d}", 'deployed_components': [c['id'] for c in components if rng.random() < 0.5]}
+        for d in range(rng.randint(0, 3))
+    ]
+
+    graph = ComponentGraph(components, connectors)
+    G = reference_graph(components, connectors)
+
+    assert evaluate_metrics(graph.adjacency(), deployment_nodes) == \
+        evaluate_metrics(ComponentAdjacency.from_graph(G), deployment_nodes)
+
+
+def test_from_architecture_without_connectors():
+    arch = {'views': {'component_view': {'components': [
+        {'id': "A", 'type': "service", 'responsibilities': [], 'interfaces': []}
+    ]}}}
+
+    graph = ComponentGraph.from_architecture(arch)
+
+    assert graph.nodes() == ["A"]
+    assert graph.edges() == []
+    assert graph.adjacency().out_degree().tolist() == [0]
@@ -0,0 +1,117 @@
+# test/test_graph_metrics.py
+# evaluate_metrics confrontato con le funzioni a liste di utils (calculate_*),
+# assemblate come faceva step5_metric_based_evaluation prima della versione CSR.
+import random
+
+import networkx as nx
+import pytest
+
+import agents.utils as utils
+from agents.graph_metrics import ComponentAdjacency, evaluate_metrics
+
+
+def reference_metrics(graph, deployment_nodes):
+    nodes = [{'id': n, **data} for n, data in graph.nodes(data=True)]
+    edges = [{'from': u, 'to': v} for u, v in graph.edges()]
+
+    coupling = utils.calculate_coupling(nodes, edges)
+    fan_in = utils.calculate_fan_in(nodes, edges)
+    fan_out = utils.calculate_fan_out(nodes, edges)
+    cohesion = utils.calculate_cohesion(nodes)
+    complexity = utils.calculate_complexity(nodes, edges)
+    redundancy = utils.calculate_redundancy(nodes, deployment_nodes)
+
+    def per_component(values, aggregates):
+        return {k: v for k, v in values.items() if k not in aggregates}
+
+    return {
+        'component_count': utils.calculate_component_count(nodes),
+        'coupling': {
+            'per_component': per_component(coupling, ['average_coupling', 'normalized_coupling', 'max_coupling']),
+            'average_coupling': coupling['average_coupling'],
+            'normalized_coupling': coupling['normalized_coupling'],
+            'max_coupling': coupling['max_coupling']
+        },
+        'fan_in': {
+            'per_component': per_component(fan_in, ['fan_in_concentration', 'normalized_fan_in', 'max_fan_in']),
+            'normalized_fan_in': fan_in['normalized_fan_in'],
+            'fan_in_concentration': fan_in['fan_in_concentration'],
+            'max_fan_in': fan_in['max_fan_in']
+        },
+        'fan_out': {
+            'per_component': per_component(fan_out, ['fan_out_concentration', 'normalized_fan_out', 'max_fan_out']),
+            'normalized_fan_out': fan_out['normalized_fan_out'],
+            'fan_out_concentration': fan_out['fan_out_concentration'],
+            'max_fan_out': fan_out['max_fan_out']
+        },
+        'cohesion': {
+            'per_component': per_component(cohesion, ['average_cohesion', 'min_cohesion']),
+            'average_cohesion': cohesion['average_cohesion'],
+            'min_cohesion': cohesion['min_cohesion'],
+        },
+        'complexity': {
+            'tot_complexity': complexity['tot_complexity'],
+            'norm_complexity': complexity['norm_complexity']
+        },
+        'redundancy': {
+            'per_component': per_component(redundancy, ['normalized_avg_redundancy', 'normalized_max_redundancy']),
+            'normalized_avg_redundancy': redundancy['normalized_avg_redundancy'],
+            'normalized_max_redundancy': redundancy['normalized_max_redundancy']
+        }
+    }
+
+
+def random_architecture(rng: random.Random, with_responsibilities: bool):
+    """
+    DiGraph casuale (self-loop e archi ripetuti inclusi) e deployment view
+    con componenti duplicati nello stesso nodo e componenti sconosciuti.
+    """
+    n = rng.randint(0, 12)
+    graph = nx.DiGraph()
+    for i in range(n):
+        attributes = {}
+        if with_responsibilities:
+            attributes['responsibilities'] = [f"r{k}" for k in range(rng.randint(0, 4))]
+        graph.add_node(f"C{i}", **attributes)
+
+    ids = list(graph.nodes())
+    for _ in range(rng.randint(0, 3 * n) if n else 0):
+        graph.add_edge(rng.choice(ids), rng.choice(ids))
+
+    deployment_nodes = []
+    for d in range(rng.randint(0, 4)):
+        deployed = [rng.choice(ids + ["unknown"]) for _ in range(rng.randint(0, n + 1))] if ids else []
+        deployment_nodes.append({'id': f"node{d}", 'deployed_components': deployed})
+    return graph, deployment_nodes
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_evaluate_metrics_matches_list_implementation(seed):
+    rng = random.Random(seed)
+    graph, deployment_nodes = random_architecture(rng, with_responsibilities=False)
+
+    adjacency = ComponentAdjacency.from_graph(graph)
+
+    assert evaluate_metrics(adjacency, deployment_nodes) == reference_metrics(graph, deployment_nodes)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_evaluate_metrics_cohesion_from_responsibilities(seed):
+    rng = random.Random(seed)
+    graph, deployment_nodes = random_architecture(rng, with_responsibilities=True)
+
+    adjacency = ComponentAdjacency.from_graph(graph)
+    counts = [len(data['responsibilities']) for _, data in graph.nodes(data=True)]
+
+    assert evaluate_metrics(adjacency, deployment_nodes, counts) == reference_metrics(graph, deployment_nodes)
+
+
+def test_adjacency_degrees_match_networkx():
+    graph = nx.DiGraph([("A", "B"), ("A", "C"), ("C", "A"), ("B", "B")])
+    graph.add_node("D")
+
+    adjacency = ComponentAdjacency.from_graph(graph)
+
+    assert adjacency.out_degree().tolist() == [graph.out_degree(n) for n in graph.nodes()]
+    assert adjacency.in_degree().tolist() == [graph.in_degree(n) for n in graph.nodes()]
+    assert adjacency.edge_count == graph.number_of_edges()
@@ -0,0 +1,179 @@
+# test/test_pareto.py
+# Ranking a fronti e confronto a coppie confrontati con utils.dominates /
+# utils.compare_objectives e con i doppi cicli degli step 6 e 7 precedenti
+# alla versione numpy.
+import math
+import random
+
+import pytest
+
+import agents.utils as utils
+from agents.pareto import PairwiseComparison, dominance_info, rank_architectures
+
+
+def random_objectives(rng: random.Random):
+    """
+    Valori su una griglia grossolana: molte architetture pari su uno o più obiettivi.
+    """
+    n = rng.randint(0, 30)
+    return {
+        f"A{i}": {metric: rng.choice([0.0, 0.25, 0.5, 0.75, 1.0]) for metric in utils.OBJECTIVES}
+        for i in range(n)
+    }
+
+
+def reference_fronts(objectives):
+    remaining = list(objectives)
+    fronts = []
+    while remaining:
+        front = [
+            a for a in remaining
+            if not any(utils.dominates(objectives[b], objectives[a]) for b in remaining if b != a)
+        ]
+        fronts.append(front)
+        remaining = [a for a in remaining if a not in front]
+    return fronts
+
+
+def reference_dominance_info(objectives):
+    info = {}
+    for a_id, a_obj in objectives.items():
+        info[a_id] = {"dominates": {}, "dominated_by": {}}
+        for b_id, b_obj in objectives.items():
+            if a_id == b_id:
+                continue
+            if utils.dominates(b_obj, a_obj):
+                info[a_id]["dominated_by"][b_id] = utils.compare_objectives(a_obj, b_obj)
+            elif utils.dominates(a_obj, b_obj):
+                info[a_id]["dominates"][b_id] = utils.compare_objectives(a_obj, b_obj)
+    return info
+
+
+def reference_comparisons(objectives):
+    """
+    Record di comparing_pareto_front prima di PairwiseComparison.
+    """
+    records = []
+    arch_ids = list(objectives)
+    for i, arch_a in enumerate(arch_ids):
+        for arch_b in arch_ids[i + 1:]:
+            comparison = utils.compare_objectives(objectives[arch_a], objectives[arch_b])
+            records.append({
+                "id": len(records) + 1,
+                "arch_A": arch_a,
+                "arch_B": arch_b,
+                "PRO_A_attributes": utils.metrics_to_quality_attributes(comparison["better_on"]),
+                "PRO_A_metrics": comparison["better_on"],
+                "PRO_B_attributes": utils.metrics_to_quality_attributes(comparison["worse_on"]),
+                "PRO_B_metrics": comparison["worse_on"],
+                "NEUTRAL": utils.metrics_to_quality_attributes(comparison["equal_on"])
+            })
+    return records
+
+
+QA_FIELDS = ("PRO_A_attributes", "PRO_B_attributes", "NEUTRAL")
+QA_ORDER = list(dict.fromkeys(qa for qas in utils.METRIC_TO_QA.values() for qa in qas))
+
+
+def assert_same_record(record, expected):
+    """
+    metrics_to_quality_attributes passa da un set: i QA si confrontano come
+    insiemi, mentre PairwiseComparison li elenca nell'ordine di METRIC_TO_QA.
+    """
+    for field in QA_FIELDS:
+        assert set(record[field]) == set(expected[field])
+        assert record[field] == sorted(record[field], key=QA_ORDER.index)
+    assert {k: v for k, v in record.items() if k not in QA_FIELDS} == \
+        {k: v for k, v in expected.items() if k not in QA_FIELDS}
+
+
+def reference_crowding_distance(objectives, front):
+    distance = {a: 0.0 for a in front}
+    if len(front) <= 2:
+        return {a: math.inf for a in front}
+
+    for metric, direction in utils.OBJECTIVES.items():
+        def value(a):
+            return objectives[a][metric] if direction == "min" else -objectives[a][metric]
+
+        ordered = sorted(front, key=value)
+        span = value(ordered[-1]) - value(ordered[0])
+        distance[ordered[0]] = distance[ordered[-1]] = math.inf
+        for prev, current, nxt in zip(ordered, ordered[1:], ordered[2:]):
+            if span > 0:
+                distance[current] += (value(nxt) - value(prev)) / span
+    return distance
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_rank_architectures_matches_dominates(seed):
+    objectives = random_objectives(random.Random(seed))
+
+    ranking = rank_architectures(objectives, utils.OBJECTIVES)
+    arch_ids = ranking["arch_ids"]
+
+    assert arch_ids == list(objectives)
+    for i, a in enumerate(arch_ids):
+        for j, b in enumerate(arch_ids):
+            assert bool(ranking["dominance"][i, j]) == utils.dominates(objectives[a], objectives[b])
+
+    fronts = reference_fronts(objectives)
+    assert ranking["fronts"] == fronts
+    for k, front in enumerate(fronts, start=1):
+        for a in front:
+            assert ranking["rank"][arch_ids.index(a)] == k
+
+    for front in fronts:
+        expected = reference_crowding_distance(objectives, front)
+        for a in front:
+            assert ranking["crowding_distance"][arch_ids.index(a)] == pytest.approx(expected[a])
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_dominance_info_matches_pairwise_loop(seed):
+    objectives = random_objectives(random.Random(seed))
+
+    ranking = rank_architectures(objectives, utils.OBJECTIVES)
+
+    assert dominance_info(ranking, objectives, utils.compare_objectives) == reference_dominance_info(objectives)
+
+
+def test_unknown_direction_is_rejected():
+    with pytest.raises(ValueError):
+        rank_architectures({"A": {"x": 1.0}}, {"x": "minimize"})
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_pairwise_records_match_compare_objectives(seed):
+    objectives = random_objectives(random.Random(seed))
+
+    comparison = PairwiseComparison(objectives, utils.OBJECTIVES, utils.METRIC_TO_QA)
+    records = list(comparison.records())
+    expected = reference_comparisons(objectives)
+
+    assert len(records) == len(expected)
+    for record, reference in zip(records, expected):
+        assert_same_record(record, reference)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_pairwise_top_k_keeps_most_conflicting_pairs(seed):
+    rng = random.Random(seed)
+    objectives = random_objectives(rng)
+    expected = reference_comparisons(objectives)
+    top_k = rng.randint(0, len(expected) + 2)
+
+    comparison = PairwiseComparison(objectives, utils.OBJECTIVES, utils.METRIC_TO_QA)
+    records = list(comparison.records(top_k=top_k))
+
+    # conflitto: PRO su entrambi i lati prima, poi numero di metriche diverse
+    def conflict(record):
+        better, worse = len(record["PRO_A_metrics"]), len(record["PRO_B_metrics"])
+        return (min(better, worse), better + worse)
+
+    ranked = sorted(expected, key=lambda record: (-conflict(record)[0], -conflict(record)[1], record["id"]))
+    selected = sorted(ranked[:top_k], key=lambda record: record["id"])
+
+    assert [record["id"] for record in records] == [record["id"] for record in selected]
+    for record, reference in zip(records, selected):
+        assert_same_record(record, reference)